@@ -1,6 +1,10 @@
 import os
-from cffi import FFI
+
+from ggplib.util import log
 from ggplib import interface
+from ggplib.interface_build import is_stale
+
+from gurgeh import interface_build
 
 
 def back(path, depth):
@@ -9,56 +13,21 @@ def back(path, depth):
     return path
 
 
-def process_line(line):
-    # pre-process a line.  Skip any lines with comments.  Replace strings in remap.
-    if "//" in line:
-        return line
-
-    remap = {
-        "StateMachine*" : "void*",
-        "PlayerBase*" : "void*",
-        "boolean" : "int",
-    }
-
-    for k, v in remap.items():
-        if k in line:
-            line = line.replace(k, v)
-            line = line.rstrip()
-
-    return line
-
-
-def get_lines(filename):
-    # take subset of file (since it is c++, and want only the c portion
-    emit = False
-    for line in file(filename):
-        if "CFFI START INCLUDE" in line:
-            emit = True
-
-        elif "CFFI END INCLUDE" in line:
-            emit = False
-
-        if emit:
-            line = process_line(line)
-            if line:
-                yield line
-
-
 def get_lib():
-    # get the paths
-    ggplib_path = os.path.join(os.environ["GGPLIB_PATH"], "src", "cpp")
-    local_path = os.path.join(os.environ["GURGEH_PATH"], "src", "cpp")
+    ''' loads the prebuilt extension module (see gurgeh.interface_build), falling back to
+        ffi.verify() if it hasn't been built or interface.h is newer. '''
+    try:
+        from gurgeh import _interface
+    except ImportError:
+        _interface = None
 
-    print ggplib_path, local_path
+    if _interface is not None:
+        if not is_stale(_interface.__file__, interface_build.get_header()):
+            return _interface.ffi, _interface.lib
 
-    # get ffi object, and lib object
-    ffi = FFI()
-    ffi.cdef("\n".join(get_lines(os.path.join(local_path, "interface.h"))))
+        log.warning("gurgeh._interface is older than interface.h, using ffi.verify()")
 
-    return ffi, ffi.verify('#include <interface.h>\n',
-                           include_dirs=[local_path],
-                           library_dirs=[ggplib_path, local_path],
-                           libraries=["gurgehplayer_cpp"])
+    return interface_build.verify()
 
 
 _, lib = get_lib()
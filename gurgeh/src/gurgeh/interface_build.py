@@ -0,0 +1,60 @@
+''' Out of line (API mode) build of the cffi interface to libgurgehplayer_cpp.so, as per
+    ggplib.interface_build.  Run python -m gurgeh.interface_build once the c++ is built. '''
+
+import os
+
+from cffi import FFI
+
+from ggplib.interface_build import get_cdef
+
+d = os.path.dirname
+src_path = d(d(os.path.abspath(__file__)))
+
+MODULE_NAME = "gurgeh._interface"
+
+REMAP = {
+    "StateMachine*" : "void*",
+    "PlayerBase*" : "void*",
+    "boolean" : "int",
+}
+
+
+def get_paths():
+    ggplib_path = os.path.join(os.environ["GGPLIB_PATH"], "src", "cpp")
+    local_path = os.path.join(os.environ["GURGEH_PATH"], "src", "cpp")
+    return ggplib_path, local_path
+
+
+def get_header():
+    _, local_path = get_paths()
+    return os.path.join(local_path, "interface.h")
+
+
+def get_ffi():
+    ffi = FFI()
+    ffi.cdef(get_cdef(get_header(), remap=REMAP))
+    return ffi
+
+
+def verify():
+    ' development fallback, compiles (and caches) on the fly '
+    ggplib_path, local_path = get_paths()
+    ffi = get_ffi()
+    return ffi, ffi.verify('#include <interface.h>\n',
+                           include_dirs=[local_path],
+                           library_dirs=[ggplib_path, local_path],
+                           libraries=["gurgehplayer_cpp"])
+
+
+def get_builder():
+    ggplib_path, local_path = get_paths()
+    ffibuilder = get_ffi()
+    ffibuilder.set_source(MODULE_NAME, '#include <interface.h>\n',
+                          include_dirs=[local_path],
+                          library_dirs=[ggplib_path, local_path],
+                          libraries=["gurgehplayer_cpp"])
+    return ffibuilder
+
+
+if __name__ == "__main__":
+    get_builder().compile(tmpdir=src_path, verbose=True)
@@ -1,18 +1,22 @@
 import random
 
 from ggplib.player.proxy import ProxyPlayer
+from ggplib.interface import new_int_buffer
 
 from interface import create_gurgeh_cpp_player
 
 
 class MatchInfo(object):
-    def __init__(self, sm):
+    def __init__(self, sm, actions):
+        ' actions is the moves for each role (from the model), so the legals buffer never grows '
         self.sm = sm
         self.two_player_fixed_sum = True
         self.simultaneous_game_detected = False
 
         self.static_joint_move = self.sm.get_joint_move()
         self.static_basestate = self.sm.new_base_state()
+        self.static_legal_offsets = new_int_buffer(len(self.sm.get_roles()) + 1)
+        self.static_legal_indices = new_int_buffer(sum(len(a) for a in actions))
 
     def do_basic_depth_charge(self):
         ''' identifies types of moves '''
@@ -23,15 +27,19 @@ class MatchInfo(object):
             if self.sm.is_terminal():
                 break
 
+            # all the legals in one call
+            offsets, indices = self.sm.get_all_legals(self.static_legal_offsets,
+                                                      self.static_legal_indices)
+
             choice_counts_more_than_1 = 0
-            for idx, r in enumerate(range(role_count)):
-                ls = self.sm.get_legal_state(idx)
-                choice = ls.get_legal(random.randrange(0, ls.get_count()))
-                self.static_joint_move.set(idx, choice)
+            for idx in range(role_count):
+                start, end = int(offsets[idx]), int(offsets[idx + 1])
+                assert end > start
 
-                assert ls.get_count()
+                choice = int(indices[random.randrange(start, end)])
+                self.static_joint_move.set(idx, choice)
 
-                if ls.get_count() > 1:
+                if end - start > 1:
                     choice_counts_more_than_1 += 1
 
             if not self.simultaneous_game_detected and choice_counts_more_than_1 > 1:
@@ -73,7 +81,7 @@ class GurgehPlayer(ProxyPlayer):
 
     def meta_create_player(self):
         role_count = len(self.sm.get_roles())
-        info = MatchInfo(self.sm)
+        info = MatchInfo(self.sm, self.match.game_info.model.actions)
         if role_count > 1:
             for _ in range(5):
                 info.do_basic_depth_charge()
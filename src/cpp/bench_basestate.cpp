@@ -0,0 +1,261 @@
+// Micro benchmark of the diff loop in StateMachine::updateBases(), a byte and then a bit at a time
+// (as it was) vs a word at a time visiting the changed bits with ctz (as it is now).  Replays a
+// game like sequence of states: each ply sets one new base (a board cell) and swaps two others
+// (control).  Only needs basestate.h/basestate.cpp, not k273 or a propnet.
+//
+// Also times lookups of the same states in a masked map (BaseState::HashMapMasked, masking out
+// control), with HasherMasked/EqualsMasked a byte at a time (as they were) vs a word at a time.
+//
+//   $ ./bench_basestate.bin [num_bases] [plies] [repeats]
+//
+// defaults are for a 19x19 hex board (two bases per cell, plus control).
+
+#include "statemachine/basestate.h"
+
+#include <chrono>
+#include <vector>
+#include <unordered_map>
+#include <cstdio>
+#include <cstdlib>
+
+using namespace GGPLib;
+
+// stands in for StateMachine::propagate()
+static uint64_t visited = 0;
+
+static inline void visit(int index, bool value) {
+    visited += (index << 1) | value;
+}
+
+static BaseState* createBaseState(int num_bases) {
+    BaseState* bs = (BaseState*) malloc(BaseState::mallocSize(num_bases));
+    bs->init(num_bases);
+    return bs;
+}
+
+static void diffBytes(const BaseState* bs, const BaseState* current) {
+    const BaseState::ArrayType *pt_bs = bs->data;
+    const BaseState::ArrayType *pt_current = current->data;
+    for (int block=0; block<bs->byte_count; block++) {
+        BaseState::ArrayType xxor = *pt_bs ^ *pt_current;
+        const int base = block * BaseState::ARRAYTYPE_BITS;
+        for (int ii=0; ii<BaseState::ARRAYTYPE_BITS; ii++) {
+            const BaseState::ArrayType mask = (BaseState::ArrayType(1) << ii);
+            if (xxor & mask) {
+                visit(base + ii, *pt_bs & mask);
+            }
+        }
+
+        pt_bs++;
+        pt_current++;
+    }
+}
+
+static void diffWords(const BaseState* bs, const BaseState* current) {
+    for (int word=0; word<bs->word_count; word++) {
+        const BaseState::WordType value = bs->getWord(word);
+        BaseState::WordType xxor = value ^ current->getWord(word);
+
+        const int base = word * BaseState::WORDTYPE_BITS;
+        while (xxor) {
+            const int ii = __builtin_ctzll(xxor);
+            visit(base + ii, (value >> ii) & 1);
+            xxor &= xxor - 1;
+        }
+    }
+}
+
+#define mix(h) ({					\
+			(h) ^= (h) >> 23;		\
+			(h) *= 0x2127599bf4325c37ULL;	\
+			(h) ^= (h) >> 47; })
+
+struct HasherMaskedBytes {
+    HasherMaskedBytes(const BaseState::ArrayType* mask_buf) :
+        mask_buf(mask_buf) {
+    }
+
+    std::size_t operator() (const BaseState* key) const {
+        const int rem = key->byte_count % 8;
+        const uint64_t seed = 42 * 42 * 42 * 42;
+        const uint64_t m = 0x880355f21e6d1965ULL;
+        uint64_t h = seed ^ (key->byte_count * m);
+
+        const uint64_t* pos = (const uint64_t*) key->data;
+        const uint64_t* mask_pos = (const uint64_t*) this->mask_buf;
+        const uint64_t* end = pos + (key->byte_count / 8);
+
+        uint64_t v = 0;
+        while (pos != end) {
+            uint64_t v = *pos++;
+            v &= *mask_pos++;
+            h ^= mix(v);
+            h *= m;
+        }
+
+        v = 0;
+        const uint8_t *byte_pos = (const uint8_t*) pos;
+        const uint8_t* byte_mask_pos = (const uint8_t*) mask_pos;
+
+        switch (rem) {
+        case 7:
+            v ^= (uint64_t)byte_pos[6] << 48;
+            v &= (uint64_t)byte_mask_pos[6] << 48;
+        case 6:
+            v ^= (uint64_t)byte_pos[5] << 40;
+            v &= (uint64_t)byte_mask_pos[5] << 40;
+        case 5:
+            v ^= (uint64_t)byte_pos[4] << 32;
+            v &= (uint64_t)byte_mask_pos[4] << 32;
+        case 4:
+            v ^= (uint64_t)byte_pos[3] << 24;
+            v &= (uint64_t)byte_mask_pos[3] << 24;
+        case 3:
+            v ^= (uint64_t)byte_pos[2] << 16;
+            v &= (uint64_t)byte_mask_pos[2] << 16;
+        case 2:
+            v ^= (uint64_t)byte_pos[1] << 8;
+            v &= (uint64_t)byte_mask_pos[1] << 8;
+        case 1:
+            v ^= (uint64_t)byte_pos[0];
+            v &= (uint64_t)byte_mask_pos[0];
+            h ^= mix(v);
+            h *= m;
+        }
+
+        return mix(h);
+    }
+
+    const BaseState::ArrayType* mask_buf;
+};
+
+struct EqualsMaskedBytes {
+    EqualsMaskedBytes(const BaseState::ArrayType* mask_buf) :
+        mask_buf(mask_buf) {
+    }
+
+    bool operator() (const BaseState* a, const BaseState* b) const {
+        for (int ii=0; ii<a->byte_count; ii++) {
+            BaseState::ArrayType aa = a->data[ii] & this->mask_buf[ii];
+            BaseState::ArrayType bb = b->data[ii] & this->mask_buf[ii];
+
+            if (aa != bb) {
+                return false;
+            }
+        }
+
+        return true;
+    }
+
+    const BaseState::ArrayType* mask_buf;
+};
+
+template <typename H, typename E>
+static double timeMaskedMap(const std::vector <BaseState*>& states, const BaseState* mask,
+                            int repeats, uint64_t& found) {
+    std::unordered_map <const BaseState*, int, H, E> map(states.size(), H(mask->data), E(mask->data));
+    for (size_t ii=0; ii<states.size(); ii++) {
+        map[states[ii]] = ii;
+    }
+
+    auto start = std::chrono::steady_clock::now();
+    for (int r=0; r<repeats; r++) {
+        for (const BaseState* s : states) {
+            found += map.find(s)->second;
+        }
+    }
+
+    std::chrono::duration<double> taken = std::chrono::steady_clock::now() - start;
+    return taken.count();
+}
+
+template <typename F>
+static double timeIt(const std::vector <BaseState*>& states, int repeats, F diff) {
+    auto start = std::chrono::steady_clock::now();
+    for (int r=0; r<repeats; r++) {
+        for (size_t ii=1; ii<states.size(); ii++) {
+            diff(states[ii], states[ii - 1]);
+        }
+    }
+
+    std::chrono::duration<double> taken = std::chrono::steady_clock::now() - start;
+    return taken.count();
+}
+
+int main(int argc, char** argv) {
+    const int num_bases = argc > 1 ? atoi(argv[1]) : 19 * 19 * 2 + 3;
+    const int plies = argc > 2 ? atoi(argv[2]) : 200;
+    const int repeats = argc > 3 ? atoi(argv[3]) : 20000;
+
+    const int control_a = num_bases - 2;
+    const int control_b = num_bases - 1;
+
+    srand(42);
+    std::vector <BaseState*> states;
+    BaseState* bs = createBaseState(num_bases);
+    bs->set(control_a, true);
+    states.push_back(bs);
+
+    for (int ii=0; ii<plies; ii++) {
+        BaseState* next = createBaseState(num_bases);
+        next->assign(states.back());
+
+        // a cell not already taken
+        int cell;
+        do {
+            cell = rand() % (num_bases - 3);
+        } while (next->get(cell));
+
+        next->set(cell, true);
+        next->set(control_a, !next->get(control_a));
+        next->set(control_b, !next->get(control_b));
+        states.push_back(next);
+    }
+
+    const double bytes = timeIt(states, repeats, diffBytes);
+    const uint64_t bytes_visited = visited;
+
+    visited = 0;
+    const double words = timeIt(states, repeats, diffWords);
+    if (visited != bytes_visited) {
+        printf("MISMATCH %llu != %llu\n", (unsigned long long) visited,
+               (unsigned long long) bytes_visited);
+        return 1;
+    }
+
+    const double diffs = double(repeats) * plies;
+    printf("bases %d, plies %d, diffs %.0f\n", num_bases, plies, diffs);
+    printf("byte/bit diff   : %.3fs  %.1f ns/diff\n", bytes, bytes / diffs * 1e9);
+    printf("word/ctz diff   : %.3fs  %.1f ns/diff\n", words, words / diffs * 1e9);
+    printf("speedup         : %.2fx\n", bytes / words);
+
+    // mask out control
+    BaseState* mask = createBaseState(num_bases);
+    for (int ii=0; ii<num_bases - 3; ii++) {
+        mask->set(ii, true);
+    }
+
+    uint64_t bytes_found = 0, words_found = 0;
+    const double masked_bytes = timeMaskedMap<HasherMaskedBytes, EqualsMaskedBytes>(states, mask, repeats,
+                                                                                    bytes_found);
+    const double masked_words = timeMaskedMap<BaseState::HasherMasked, BaseState::EqualsMasked>(states, mask, repeats,
+                                                                                                 words_found);
+    if (words_found != bytes_found) {
+        printf("MISMATCH %llu != %llu\n", (unsigned long long) words_found,
+               (unsigned long long) bytes_found);
+        return 1;
+    }
+
+    const double lookups = double(repeats) * states.size();
+    printf("masked lookups  : %.0f\n", lookups);
+    printf("byte masked     : %.3fs  %.1f ns/lookup\n", masked_bytes, masked_bytes / lookups * 1e9);
+    printf("word masked     : %.3fs  %.1f ns/lookup\n", masked_words, masked_words / lookups * 1e9);
+    printf("speedup         : %.2fx\n", masked_bytes / masked_words);
+
+    free(mask);
+    for (BaseState* s : states) {
+        free(s);
+    }
+
+    return 0;
+}
@@ -68,9 +68,10 @@ Node* Player::createNode(const BaseState* bs) {
     this->node_allocated_memory += new_node->allocated_size;
 
     if (new_node->is_finalised) {
+        int scores[MAX_NUMBER_PLAYERS];
+        this->sm->getGoalValues(scores);
         for (int ii=0; ii<role_count; ii++) {
-            int score = this->sm->getGoalValue(ii);
-            new_node->setScore(ii, score / 100.0);
+            new_node->setScore(ii, scores[ii] / 100.0);
         }
     }
 
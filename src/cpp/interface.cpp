@@ -13,6 +13,9 @@
 #include "statemachine/combined.h"
 #include "statemachine/statemachine.h"
 #include "statemachine/propagate.h"
+#include "statemachine/compiled.h"
+#include "statemachine/bitsliced.h"
+#include "statemachine/lazy.h"
 #include "statemachine/legalstate.h"
 
 #include "statemachine/jointmove.h"
@@ -34,6 +37,13 @@
 #include <k273/exception.h>
 
 #include <string>
+#include <vector>
+#include <algorithm>
+
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 bool k273_initialised = false;
 
@@ -129,6 +139,11 @@ void BaseState__setRaw(void* _bs, const char* buf) {
     }
 }
 
+char* BaseState__data(void* _bs) {
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    return (char *) bs->data;
+}
+
 ///////////////////////////////////////////////////////////////////////////////
 
 void StateMachine__setInitialState(void* _sm, void* _bs) {
@@ -143,6 +158,113 @@ void* StateMachine__dupe(void* _sm) {
     return (void *) sm->dupe();
 }
 
+int StateMachine__setCompiled(void* _sm, const char* filename) {
+    try {
+        GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+        GGPLib::StateMachine* propnet_sm = dynamic_cast<GGPLib::StateMachine*> (sm);
+        if (propnet_sm == nullptr) {
+            return 0;
+        }
+
+        return propnet_sm->setCompiled(GGPLib::loadCompiledPropnet(filename));
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
+void* StateMachine__createLazy(void* _sm) {
+    try {
+        GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+        GGPLib::StateMachine* propnet_sm = dynamic_cast<GGPLib::StateMachine*> (sm);
+        if (propnet_sm == nullptr) {
+            return nullptr;
+        }
+
+        return (void *) GGPLib::LazyStateMachine::create(propnet_sm);
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+int StateMachine__setProfiling(void* _sm, int enabled) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    GGPLib::StateMachine* propnet_sm = dynamic_cast<GGPLib::StateMachine*> (sm);
+    if (propnet_sm == nullptr) {
+        return 0;
+    }
+
+    propnet_sm->setProfiling(enabled);
+    return 1;
+}
+
+int StateMachine__getProfileCounters(void* _sm, int which, long long* buf, int size) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    GGPLib::StateMachine* propnet_sm = dynamic_cast<GGPLib::StateMachine*> (sm);
+    if (propnet_sm == nullptr || propnet_sm->getProfile() == nullptr) {
+        return -1;
+    }
+
+    const GGPLib::PropagationProfile* profile = propnet_sm->getProfile();
+
+    std::vector <uint64_t> summary;
+    const std::vector <uint64_t>* counters = nullptr;
+    switch (which) {
+    case 0:
+        counters = &profile->visits;
+        break;
+    case 1:
+        counters = &profile->activations;
+        break;
+    case 2:
+        counters = &profile->depths;
+        break;
+    case 3:
+        counters = &profile->cascades;
+        break;
+    case 4:
+        summary = {profile->cascade_count, profile->total_visits,
+                   profile->max_depth, profile->max_cascade};
+        counters = &summary;
+        break;
+    default:
+        return -1;
+    }
+
+    const int total = counters->size();
+    for (int ii=0; ii<std::min(total, size); ii++) {
+        buf[ii] = (*counters)[ii];
+    }
+
+    return total;
+}
+
+static const GGPLib::MetaComponentInfo* getMeta(void* _sm, int component_id) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    GGPLib::StateMachine* propnet_sm = dynamic_cast<GGPLib::StateMachine*> (sm);
+    if (propnet_sm == nullptr ||
+        component_id < 0 || component_id >= propnet_sm->getNumComponents()) {
+        return nullptr;
+    }
+
+    return propnet_sm->getMeta(component_id);
+}
+
+const char* StateMachine__getComponentType(void* _sm, int component_id) {
+    const GGPLib::MetaComponentInfo* info = getMeta(_sm, component_id);
+    return info == nullptr ? "" : info->type.c_str();
+}
+
+const char* StateMachine__getComponentGdl(void* _sm, int component_id) {
+    const GGPLib::MetaComponentInfo* info = getMeta(_sm, component_id);
+    return info == nullptr ? "" : info->gdl.c_str();
+}
+
 void StateMachine__delete(void* _sm) {
     GGPLib::StateMachine* sm = static_cast<GGPLib::StateMachine*> (_sm);
     delete sm;
@@ -179,6 +301,20 @@ const char* StateMachine__legalToMove(void* _sm, int role_index, int choice) {
     return sm->legalToMove(role_index, choice);
 }
 
+int StateMachine__getAllLegals(void* _sm, int* offsets, int* indices, int size) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+
+    int total = 0;
+    for (int ii=0; ii<sm->getRoleCount(); ii++) {
+        offsets[ii] = total;
+        const GGPLib::LegalState* ls = sm->getLegalState(ii);
+        total += ls->copyLegals(indices + std::min(total, size), std::max(size - total, 0));
+    }
+
+    offsets[sm->getRoleCount()] = total;
+    return total;
+}
+
 void* StateMachine__getJointMove(void* _sm) {
     GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
     return (void *) sm->getJointMove();
@@ -201,6 +337,16 @@ int StateMachine__getGoalValue(void* _sm, int role_index) {
     return sm->getGoalValue(role_index);
 }
 
+void StateMachine__getGoalValues(void* _sm, int* values) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    sm->getGoalValues(values);
+}
+
+int StateMachine__setGoalCache(void* _sm, int size) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    return sm->setGoalCache(size);
+}
+
 void StateMachine__getCurrentState(void* _sm, void* _bs) {
     GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
     GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
@@ -214,6 +360,27 @@ void StateMachine__reset(void* _sm) {
     sm->reset();
 }
 
+int StateMachine__setZobristHashing(void* _sm, int enabled) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    return sm->setZobristHashing(enabled);
+}
+
+unsigned long long StateMachine__getCurrentHash(void* _sm) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    return sm->getCurrentHash();
+}
+
+unsigned long long StateMachine__getNextHash(void* _sm) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    return sm->getNextHash();
+}
+
+unsigned long long StateMachine__zobristHash(void* _sm, void* _bs) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    return sm->zobristHash(bs);
+}
+
 int LegalState__getCount(void* _ls) {
     GGPLib::LegalState* legal_state = static_cast<GGPLib::LegalState*> (_ls);
     return legal_state->getCount();
@@ -224,6 +391,16 @@ int LegalState__getLegal(void* _ls, int index) {
     return legal_state->getLegal(index);
 }
 
+int LegalState__contains(void* _ls, int value) {
+    GGPLib::LegalState* legal_state = static_cast<GGPLib::LegalState*> (_ls);
+    return legal_state->contains(value);
+}
+
+int LegalState__copyLegals(void* _ls, int* buf, int size) {
+    GGPLib::LegalState* legal_state = static_cast<GGPLib::LegalState*> (_ls);
+    return legal_state->copyLegals(buf, size);
+}
+
 int JointMove__get(void* _move, int role_index) {
     GGPLib::JointMove* joint_move = static_cast<GGPLib::JointMove*> (_move);
     return joint_move->get(role_index);
@@ -343,16 +520,78 @@ void DepthChargeTest__doRollouts(void* _dct, int seconds) {
     return dct->doRollouts(seconds);
 }
 
+void DepthChargeTest__doRolloutsThreaded(void* _dct, int seconds, int num_workers) {
+    GGPLib::DepthChargeTest* dct = static_cast<GGPLib::DepthChargeTest*> (_dct);
+    dct->doRolloutsThreaded(seconds, num_workers);
+}
+
+void DepthChargeTest__doBatchRollouts(void* _dct, void* _bs, int count, int* scores, int* depths) {
+    GGPLib::DepthChargeTest* dct = static_cast<GGPLib::DepthChargeTest*> (_dct);
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    dct->doBatchRollouts(bs, count, scores, depths);
+}
+
 int DepthChargeTest__getResult(void* _dct, int index) {
     GGPLib::DepthChargeTest* dct = static_cast<GGPLib::DepthChargeTest*> (_dct);
     return dct->getResult(index);
 }
 
+int DepthChargeTest__getNumWorkers(void* _dct) {
+    GGPLib::DepthChargeTest* dct = static_cast<GGPLib::DepthChargeTest*> (_dct);
+    return dct->getNumWorkers();
+}
+
+int DepthChargeTest__getWorkerResult(void* _dct, int worker, int index) {
+    GGPLib::DepthChargeTest* dct = static_cast<GGPLib::DepthChargeTest*> (_dct);
+    return dct->getWorkerResult(worker, index);
+}
+
 void DepthChargeTest__delete(void* _dct) {
     GGPLib::DepthChargeTest* dct = static_cast<GGPLib::DepthChargeTest*> (_dct);
     delete dct;
 }
 
+void* BitSlicedRollouts__create(void* _sm) {
+    try {
+        GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachineInterface*> (_sm);
+        GGPLib::StateMachine* propnet_sm = dynamic_cast<GGPLib::StateMachine*> (sm);
+        if (propnet_sm != nullptr) {
+            return (void *) GGPLib::BitSlicedRollouts::create(propnet_sm);
+        }
+
+        // rollouts on the goalless network, goals from the goal network
+        GGPLib::GoalLessStateMachine* goalless_sm = dynamic_cast<GGPLib::GoalLessStateMachine*> (sm);
+        if (goalless_sm != nullptr) {
+            return (void *) GGPLib::BitSlicedRollouts::create(goalless_sm->getGoallessStateMachine(),
+                                                              goalless_sm->getGoalStateMachine());
+        }
+
+        // combined statemachines are not supported
+        return nullptr;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+void BitSlicedRollouts__doBatchRollouts(void* _bsr, void* _bs, int count, int* scores, int* depths) {
+    GGPLib::BitSlicedRollouts* bsr = static_cast<GGPLib::BitSlicedRollouts*> (_bsr);
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    bsr->doBatchRollouts(bs, count, scores, depths);
+}
+
+int BitSlicedRollouts__getResult(void* _bsr, int index) {
+    GGPLib::BitSlicedRollouts* bsr = static_cast<GGPLib::BitSlicedRollouts*> (_bsr);
+    return bsr->getResult(index);
+}
+
+void BitSlicedRollouts__delete(void* _bsr) {
+    GGPLib::BitSlicedRollouts* bsr = static_cast<GGPLib::BitSlicedRollouts*> (_bsr);
+    delete bsr;
+}
+
 void Log_verbose(const char* msg) {
     K273::l_verbose("%s", msg);
 }
@@ -496,6 +735,358 @@ void* createCombinedStateMachineFromJSON(const char* msg, int size) {
     return nullptr;
 }
 
+///////////////////////////////////////////////////////////////////////////////
+// binary format, as written by ggplib/statemachine/binary.py.  Everything is a little endian
+// int32, with strings length prefixed and padded to 4 bytes.
+
+namespace {
+    const int BINARY_MAGIC = 0x4d534747;  // "GGSM"
+    const int BINARY_VERSION = 1;
+
+    enum BinaryKind : int {
+        BINARY_STANDARD = 1,
+        BINARY_GOALLESS = 2,
+        BINARY_COMBINED = 3
+    };
+
+    class BinaryReader {
+    public:
+        BinaryReader(const char* filename) :
+            filename(filename),
+            data(nullptr),
+            size(0),
+            pos(0) {
+
+            int fd = ::open(filename, O_RDONLY);
+            ASSERT_MSG(fd != -1, K273::fmtString("Failed to open %s", filename));
+
+            struct stat st;
+            ::fstat(fd, &st);
+            this->size = st.st_size;
+
+            void* addr = ::mmap(nullptr, this->size, PROT_READ, MAP_PRIVATE, fd, 0);
+            ::close(fd);
+            ASSERT_MSG(addr != MAP_FAILED, K273::fmtString("Failed to mmap %s", filename));
+
+            this->data = static_cast<const char*> (addr);
+        }
+
+        ~BinaryReader() {
+            ::munmap((void*) this->data, this->size);
+        }
+
+        void checkHeader(BinaryKind kind) {
+            ASSERT_MSG(this->readInt() == BINARY_MAGIC,
+                       K273::fmtString("%s is not a statemachine binary", this->filename.c_str()));
+            ASSERT_MSG(this->readInt() == BINARY_VERSION,
+                       K273::fmtString("%s has an unsupported version", this->filename.c_str()));
+            ASSERT_MSG(this->readInt() == kind,
+                       K273::fmtString("%s is the wrong kind of statemachine", this->filename.c_str()));
+        }
+
+        const int* readInts(int count) {
+            ASSERT (count >= 0 && this->pos + count * sizeof(int) <= this->size);
+            const int* res = reinterpret_cast<const int*> (this->data + this->pos);
+            this->pos += count * sizeof(int);
+            return res;
+        }
+
+        int readInt() {
+            return *this->readInts(1);
+        }
+
+        std::string readString() {
+            const int length = this->readInt();
+            const int padded = (length + 3) & ~3;
+            const char* res = reinterpret_cast<const char*> (this->readInts(padded / 4));
+            return std::string(res, length);
+        }
+
+    private:
+        std::string filename;
+        const char* data;
+        size_t size;
+        size_t pos;
+    };
+}
+
+static GGPLib::StateMachine* createStateMachine(BinaryReader& reader) {
+    const int* d = reader.readInts(6);
+    const int role_count = d[0];
+    const int num_bases = d[1];
+    const int num_components = d[3];
+    const int num_outputs = d[4];
+
+    GGPLib::StateMachine* sm = new GGPLib::StateMachine(role_count, num_bases, d[2],
+                                                        num_components, num_outputs, d[5]);
+
+    const int control_flows = reader.readInt();
+    const int terminal_index = reader.readInt();
+
+    for (int ii=0; ii<role_count; ii++) {
+        const int* r = reader.readInts(6);
+        std::string name = reader.readString();
+        sm->setRole(r[0], name.c_str(), r[1], r[2], r[3], r[4], r[5]);
+    }
+
+    const int* c = reader.readInts(8 * num_components);
+    for (int ii=0; ii<num_components; ii++, c += 8) {
+        sm->setComponent(c[0], c[1], c[2], c[3], c[4], c[5], c[6], c[7]);
+    }
+
+    sm->setOutputs(reader.readInts(num_outputs), num_outputs);
+
+    const int num_metas = reader.readInt();
+    for (int ii=0; ii<num_metas; ii++) {
+        const int* m = reader.readInts(2);
+        std::string type = reader.readString();
+        std::string gdl = reader.readString();
+        std::string move = reader.readString();
+        sm->setMetaInformation(m[0], type, gdl, move, m[1]);
+    }
+
+    sm->recordFinalise(control_flows, terminal_index);
+
+    // initial_state
+    GGPLib::BaseState* bs = sm->newBaseState();
+    const int* initial_state = reader.readInts(num_bases);
+    for (int ii=0; ii<num_bases; ii++) {
+        bs->set(ii, initial_state[ii]);
+    }
+
+    sm->setInitialState(bs);
+    free(bs);
+
+    sm->reset();
+    return sm;
+}
+
+void* createStateMachineFromBinary(const char* filename) {
+    try {
+        BinaryReader reader(filename);
+        reader.checkHeader(BINARY_STANDARD);
+
+        GGPLib::StateMachineInterface* sm = ::createStateMachine(reader);
+        K273::l_info("Built sm via binary %s", filename);
+        return (void *) sm;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+void* createGoallessStateMachineFromBinary(const char* filename) {
+    try {
+        BinaryReader reader(filename);
+        reader.checkHeader(BINARY_GOALLESS);
+
+        int role_count = reader.readInt();
+        GGPLib::StateMachine* goal_sm = ::createStateMachine(reader);
+        GGPLib::StateMachine* goalless_sm = ::createStateMachine(reader);
+
+        GGPLib::StateMachineInterface* sm = new GGPLib::GoalLessStateMachine(role_count,
+                                                                             goalless_sm,
+                                                                             goal_sm);
+        K273::l_info("Built goalless sm via binary %s", filename);
+        return (void *) sm;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+void* createCombinedStateMachineFromBinary(const char* filename) {
+    try {
+        BinaryReader reader(filename);
+        reader.checkHeader(BINARY_COMBINED);
+
+        int number_control_states = reader.readInt();
+        GGPLib::StateMachine* goal_sm = ::createStateMachine(reader);
+
+        GGPLib::CombinedStateMachine* combined = new GGPLib::CombinedStateMachine(number_control_states);
+        combined->setGoalStateMachine(goal_sm);
+
+        for (int ii=0; ii<number_control_states; ii++) {
+            const int* info = reader.readInts(2);
+            int idx = info[0];
+            int control_cid = info[1];
+            GGPLib::StateMachine* sm = ::createStateMachine(reader);
+            combined->setControlStateMachine(idx, control_cid, sm);
+        }
+
+        // has to be called after setting the controls
+        combined->reset();
+
+        K273::l_info("Built combined sm via binary %s", filename);
+        GGPLib::StateMachineInterface* sm = combined;
+        return (void *) sm;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+// direct building
+
+void* Builder__createStateMachine(int role_count, int num_bases, int num_transitions,
+                                  int num_components, int num_outputs, int topological_size) {
+    try {
+        GGPLib::StateMachine* sm = new GGPLib::StateMachine(role_count, num_bases, num_transitions,
+                                                            num_components, num_outputs, topological_size);
+        return (void *) sm;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+int Builder__setRole(void* _sm, int role_index, const char* name, int input_start_index,
+                     int legal_start_index, int goal_start_index, int num_inputs_legals, int num_goals) {
+    try {
+        GGPLib::StateMachine* sm = static_cast<GGPLib::StateMachine*> (_sm);
+        sm->setRole(role_index, name, input_start_index, legal_start_index,
+                    goal_start_index, num_inputs_legals, num_goals);
+        return 1;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
+int Builder__setComponents(void* _sm, int* c, int count) {
+    try {
+        GGPLib::StateMachine* sm = static_cast<GGPLib::StateMachine*> (_sm);
+        for (int ii=0; ii<count; ii++, c += 8) {
+            sm->setComponent(c[0], c[1], c[2], c[3], c[4], c[5], c[6], c[7]);
+        }
+
+        return 1;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
+int Builder__setOutputs(void* _sm, int* o, int count) {
+    try {
+        GGPLib::StateMachine* sm = static_cast<GGPLib::StateMachine*> (_sm);
+        for (int ii=0; ii<count; ii++, o += 2) {
+            sm->setOutput(o[0], o[1]);
+        }
+
+        return 1;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
+int Builder__setMetas(void* _sm, int* m, const char* strings, int count) {
+    try {
+        GGPLib::StateMachine* sm = static_cast<GGPLib::StateMachine*> (_sm);
+        for (int ii=0; ii<count; ii++, m += 2) {
+            std::string type = strings;
+            strings += type.size() + 1;
+            std::string gdl = strings;
+            strings += gdl.size() + 1;
+            std::string move = strings;
+            strings += move.size() + 1;
+
+            sm->setMetaInformation(m[0], type, gdl, move, m[1]);
+        }
+
+        return 1;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
+int Builder__finalise(void* _sm, int control_flows, int terminal_index, int* initial_state) {
+    try {
+        GGPLib::StateMachine* sm = static_cast<GGPLib::StateMachine*> (_sm);
+        sm->recordFinalise(control_flows, terminal_index);
+
+        GGPLib::BaseState* bs = sm->newBaseState();
+        for (int ii=0; ii<bs->size; ii++) {
+            bs->set(ii, initial_state[ii]);
+        }
+
+        sm->setInitialState(bs);
+        free(bs);
+
+        sm->reset();
+        K273::l_info("Built sm directly");
+        return 1;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
+void* Builder__createGoallessStateMachine(int role_count, void* goalless_sm, void* goal_sm) {
+    try {
+        GGPLib::StateMachineInterface* sm = new GGPLib::GoalLessStateMachine(role_count,
+                                                                             static_cast<GGPLib::StateMachine*> (goalless_sm),
+                                                                             static_cast<GGPLib::StateMachine*> (goal_sm));
+        return (void *) sm;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+void* Builder__createCombinedStateMachine(int num_controls, void* goal_sm) {
+    try {
+        GGPLib::CombinedStateMachine* combined = new GGPLib::CombinedStateMachine(num_controls);
+        combined->setGoalStateMachine(static_cast<GGPLib::StateMachine*> (goal_sm));
+
+        // reset() must not be called until all the controls are set
+        GGPLib::StateMachineInterface* sm = combined;
+        return (void *) sm;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return nullptr;
+}
+
+int Builder__setControlStateMachine(void* _combined, int idx, int control_cid, void* sm) {
+    try {
+        GGPLib::StateMachineInterface* combined = static_cast<GGPLib::StateMachineInterface*> (_combined);
+        static_cast<GGPLib::CombinedStateMachine*> (combined)->setControlStateMachine(idx, control_cid,
+                                                                                      static_cast<GGPLib::StateMachine*> (sm));
+        return 1;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
 static GGPLib::StateMachineInterface* getSMDraughts(int size, bool breakthrough_mode, bool killer_mode) {
     //K273::l_info("in getSMDraughts size: %d [%s;%s])", size,
     //             breakthrough_mode ? "breakthrough_mode" : "",
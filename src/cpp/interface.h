@@ -6,6 +6,7 @@
 #define JointMove void
 #define PlayerBase void
 #define DepthChargeTest void
+#define BitSlicedRollouts void
 
 #define boolean int
 
@@ -34,6 +35,9 @@ extern "C" {
     int BaseState__rawBytes(BaseState*);
     void BaseState__setRaw(BaseState*, const char* buf);
 
+    // pointer to the underlying data (no copy, owned by the BaseState)
+    char* BaseState__data(BaseState*);
+
     // StateMachine initialisation:
     void StateMachine__setInitialState(StateMachine*, BaseState* intial_state);
 
@@ -43,6 +47,27 @@ extern "C" {
     // Delete underlying statemachine
     void StateMachine__delete(StateMachine*);
 
+    // only for propnet statemachines (createStateMachineFromJSON() and friends)
+    boolean StateMachine__setCompiled(StateMachine*, const char* filename);
+
+    // propagation profiling, only for propnet statemachines (returns false otherwise).  Enabling
+    // clears the counters.
+    boolean StateMachine__setProfiling(StateMachine*, boolean enabled);
+
+    // which: 0 per component visits, 1 per component activations, 2 visits by propagation depth,
+    // 3 cascades by log2(size + 1), 4 summary (cascade_count, total_visits, max_depth,
+    // max_cascade).  Only size counters are written, returns the full number (or -1 if not
+    // profiling).
+    int StateMachine__getProfileCounters(StateMachine*, int which, long long* buf, int size);
+
+    // meta information for a component of a propnet statemachine (empty if not known)
+    const char* StateMachine__getComponentType(StateMachine*, int component_id);
+    const char* StateMachine__getComponentGdl(StateMachine*, int component_id);
+
+    // a statemachine which only propagates the legals/terminal/goals when queried, only for
+    // propnet statemachines (returns NULL otherwise, or if not supported for the propnet)
+    StateMachine* StateMachine__createLazy(StateMachine*);
+
 
     // StateMachine interface:
     void StateMachine__getInitialState(StateMachine*, BaseState*);
@@ -53,17 +78,36 @@ extern "C" {
 
     const char* StateMachine__legalToMove(StateMachine*, int role_index, int choice);
 
+    // all legals for all roles, packed as offsets (role_count + 1) and indices.  Only size indices
+    // are written, returns the total number of legals.
+    int StateMachine__getAllLegals(StateMachine*, int* offsets, int* indices, int size);
+
     JointMove* StateMachine__getJointMove(StateMachine*);
     boolean StateMachine__isTerminal(StateMachine*);
     void StateMachine__nextState(StateMachine*, JointMove* move, BaseState* bs);
     int StateMachine__getGoalValue(StateMachine*, int role_index);
 
+    // goal values for all roles, values must have room for role_count
+    void StateMachine__getGoalValues(StateMachine*, int* values);
+
+    // cache goal values by state (size 0 to remove).  Returns false if not supported.
+    boolean StateMachine__setGoalCache(StateMachine*, int size);
+
     void StateMachine__getCurrentState(StateMachine*, BaseState* bs);
 
     void StateMachine__reset(StateMachine*);
 
+    // zobrist hashing (returns false if not supported).  getCurrentHash()/getNextHash() are
+    // maintained by updateBases()/nextState() once enabled.
+    boolean StateMachine__setZobristHashing(StateMachine*, boolean enabled);
+    unsigned long long StateMachine__getCurrentHash(StateMachine*);
+    unsigned long long StateMachine__getNextHash(StateMachine*);
+    unsigned long long StateMachine__zobristHash(StateMachine*, BaseState* bs);
+
     int LegalState__getCount(LegalState*);
     int LegalState__getLegal(LegalState*, int index);
+    int LegalState__copyLegals(LegalState*, int* buf, int size);
+    boolean LegalState__contains(LegalState*, int value);
 
     int JointMove__get(JointMove*, int role_index);
     void JointMove__set(JointMove*, int role_index, int value);
@@ -95,9 +139,20 @@ extern "C" {
     // DepthChargeTest operations:
     DepthChargeTest* DepthChargeTest__create(StateMachine*);
     void DepthChargeTest__doRollouts(DepthChargeTest*, int seconds);
+    void DepthChargeTest__doBatchRollouts(DepthChargeTest*, BaseState* bs, int count, int* scores, int* depths);
+    void DepthChargeTest__doRolloutsThreaded(DepthChargeTest*, int seconds, int num_workers);
     int DepthChargeTest__getResult(DepthChargeTest*, int index);
+    int DepthChargeTest__getNumWorkers(DepthChargeTest*);
+    int DepthChargeTest__getWorkerResult(DepthChargeTest*, int worker, int index);
     void DepthChargeTest__delete(DepthChargeTest*);
 
+    // BitSlicedRollouts operations (returns NULL if not a propnet StateMachine, or if it can't be
+    // evaluated bitsliced):
+    BitSlicedRollouts* BitSlicedRollouts__create(StateMachine*);
+    void BitSlicedRollouts__doBatchRollouts(BitSlicedRollouts*, BaseState* bs, int count, int* scores, int* depths);
+    int BitSlicedRollouts__getResult(BitSlicedRollouts*, int index);
+    void BitSlicedRollouts__delete(BitSlicedRollouts*);
+
     void Log_verbose(const char*);
     void Log_debug(const char*);
     void Log_info(const char*);
@@ -109,6 +164,30 @@ extern "C" {
     StateMachine* createGoallessStateMachineFromJSON(const char* msg, int size);
     StateMachine* createCombinedStateMachineFromJSON(const char* msg, int size);
 
+    // same as above, but from the binary format written by ggplib.statemachine.binary (the file
+    // is mmapped)
+    StateMachine* createStateMachineFromBinary(const char* filename);
+    StateMachine* createGoallessStateMachineFromBinary(const char* filename);
+    StateMachine* createCombinedStateMachineFromBinary(const char* filename);
+
+    // building a statemachine directly (see ggplib.statemachine.builder.BuilderDirect).
+    // components are 8 ints each, outputs 2 ints each (output_index, component_id), and metas
+    // 2 ints each (component_id, goal_value) with strings as typename\0gdl\0move\0 for each.
+    // The create functions return NULL on failure, and the rest return 0 (the statemachine is
+    // then only good for deleting).
+    StateMachine* Builder__createStateMachine(int role_count, int num_bases, int num_transitions,
+                                              int num_components, int num_outputs, int topological_size);
+    int Builder__setRole(StateMachine*, int role_index, const char* name, int input_start_index,
+                         int legal_start_index, int goal_start_index, int num_inputs_legals, int num_goals);
+    int Builder__setComponents(StateMachine*, int* components, int count);
+    int Builder__setOutputs(StateMachine*, int* outputs, int count);
+    int Builder__setMetas(StateMachine*, int* metas, const char* strings, int count);
+    int Builder__finalise(StateMachine*, int control_flows, int terminal_index, int* initial_state);
+
+    StateMachine* Builder__createGoallessStateMachine(int role_count, StateMachine* goalless_sm, StateMachine* goal_sm);
+    StateMachine* Builder__createCombinedStateMachine(int num_controls, StateMachine* goal_sm);
+    int Builder__setControlStateMachine(StateMachine* combined, int idx, int control_cid, StateMachine* sm);
+
     StateMachine* getSMDraughts_10x10();
     StateMachine* getSMDraughtsBreakthrough_10x10();
     StateMachine* getSMDraughtsKiller_10x10();
@@ -129,3 +208,4 @@ extern "C" {
 #undef ComponentType
 #undef PlayerBase
 #undef DepthChargeTest
+#undef BitSlicedRollouts
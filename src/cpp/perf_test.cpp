@@ -9,6 +9,9 @@
 #include <k273/logging.h>
 #include <k273/exception.h>
 
+#include <thread>
+#include <algorithm>
+
 using namespace K273;
 using namespace GGPLib;
 
@@ -51,11 +54,93 @@ void DepthChargeTest::doRollouts(int seconds_to_run) {
         }
 
         // for heating the cpu side effect only
-        for (int ii=0; ii<this->sm->getRoleCount(); ii++) {
-            this->sm->getGoalValue(ii);
+        int scores[MAX_NUMBER_PLAYERS];
+        this->sm->getGoalValues(scores);
+
+        this->rollouts++;
+        this->num_state_changes += depth;
+    }
+}
+
+void DepthChargeTest::doRolloutsThreaded(int seconds_to_run, int num_workers) {
+    ASSERT (num_workers > 0);
+
+    std::vector <DepthChargeTest*> workers(num_workers, nullptr);
+    std::vector <std::thread> threads;
+
+    for (int ii=0; ii<num_workers; ii++) {
+        threads.emplace_back([this, &workers, ii, seconds_to_run]() {
+            // dupe and allocate in the thread itself, so memory is local to where it runs.  Seeded
+            // by thread index, rather than all workers starting from the same default seed.
+            const uint64_t seed = (ii + 1) * 0x9e3779b97f4a7c15ULL;
+            DepthChargeTest* worker = new DepthChargeTest(this->sm->dupe(), seed);
+
+            worker->doRollouts(seconds_to_run);
+            workers[ii] = worker;
+        });
+    }
+
+    for (std::thread& t : threads) {
+        t.join();
+    }
+
+    this->worker_results.clear();
+    this->msecs_taken = 0;
+    this->rollouts = 0;
+    this->num_state_changes = 0;
+
+    for (DepthChargeTest* worker : workers) {
+        this->worker_results.push_back(worker->msecs_taken);
+        this->worker_results.push_back(worker->rollouts);
+        this->worker_results.push_back(worker->num_state_changes);
+
+        // wall clock time is the slowest thread
+        this->msecs_taken = std::max(this->msecs_taken, worker->msecs_taken);
+        this->rollouts += worker->rollouts;
+        this->num_state_changes += worker->num_state_changes;
+
+        delete worker->sm;
+        delete worker;
+    }
+}
+
+void DepthChargeTest::doBatchRollouts(const BaseState* start_state, int count, int* scores, int* depths) {
+    const int role_count = this->sm->getRoleCount();
+
+    const double start_time = get_time();
+
+    for (int rollout=0; rollout<count; rollout++) {
+        this->sm->updateBases(start_state);
+
+        int depth = 0;
+
+        while (true) {
+            if (this->sm->isTerminal()) {
+                break;
+            }
+
+            // populate joint move
+            for (int ii=0; ii<role_count; ii++) {
+                const LegalState* ls = this->sm->getLegalState(ii);
+                int x = this->random.getWithMax(ls->getCount());
+                int choice = ls->getLegal(x);
+                this->joint_move->set(ii, choice);
+            }
+
+            this->sm->nextState(this->joint_move, this->next_state);
+            this->sm->updateBases(this->next_state);
+
+            depth++;
         }
 
+        this->sm->getGoalValues(scores);
+        scores += role_count;
+
+        *depths++ = depth;
+
         this->rollouts++;
         this->num_state_changes += depth;
     }
+
+    this->msecs_taken += 1000 * (get_time() - start_time);
 }
@@ -7,6 +7,8 @@
 
 #include <k273/util.h>
 
+#include <vector>
+
 namespace GGPLib {
 
     class DepthChargeTest {
@@ -21,6 +23,18 @@ namespace GGPLib {
             this->next_state = this->sm->newBaseState();
         }
 
+        // explicitly seeded, so that each worker of doRolloutsThreaded() plays different rollouts
+        DepthChargeTest(StateMachineInterface* sm, uint64_t seed) :
+            sm(sm),
+            msecs_taken(0),
+            rollouts(0),
+            num_state_changes(0),
+            random(seed) {
+
+            this->joint_move = this->sm->getJointMove();
+            this->next_state = this->sm->newBaseState();
+        }
+
         ~DepthChargeTest() {
             free (this->joint_move);
             free (this->next_state);
@@ -29,6 +43,14 @@ namespace GGPLib {
     public:
         void doRollouts(int second);
 
+        // runs doRollouts() on num_workers threads, each with its own dupe() of the statemachine.
+        // getResult() returns the aggregate, and getWorkerResult() the per thread results.
+        void doRolloutsThreaded(int seconds, int num_workers);
+
+        // runs count depth charges starting from start_state.  scores is filled with role_count
+        // goal values per rollout, and depths with the number of moves played per rollout.
+        void doBatchRollouts(const BaseState* start_state, int count, int* scores, int* depths);
+
         int getResult(int index) {
             if (index == 0) {
                 return this->msecs_taken;
@@ -45,6 +67,18 @@ namespace GGPLib {
             return -1;
         }
 
+        int getNumWorkers() const {
+            return this->worker_results.size() / 3;
+        }
+
+        int getWorkerResult(int worker, int index) const {
+            if (worker < 0 || worker >= this->getNumWorkers() || index < 0 || index > 2) {
+                return -1;
+            }
+
+            return this->worker_results[worker * 3 + index];
+        }
+
     private:
         StateMachineInterface* sm;
         JointMove* joint_move;
@@ -54,6 +88,9 @@ namespace GGPLib {
         int rollouts;
         int num_state_changes;
 
+        // msecs_taken, rollouts, num_state_changes per worker (from doRolloutsThreaded())
+        std::vector <int> worker_results;
+
         K273::Random random;
     };
 }
@@ -58,7 +58,7 @@ static Node* createNode(const BaseState* base_state,
 
     const int child_size = sizeof(NodeChild);
     int score_bytes = round_up_4(role_count * sizeof(Score));
-    int base_state_bytes = round_up_4(sizeof(BaseState) + base_state->byte_count);
+    int base_state_bytes = round_up_4(BaseState::mallocSize(base_state->size));
 
     // remember that the JointMove is inline, so we only need to count the indices
     int node_child_bytes = round_up_4(child_size + sizeof(JointMove::IndexType) * role_count);
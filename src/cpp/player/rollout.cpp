@@ -20,7 +20,7 @@ RolloutBase::RolloutBase(StateMachineInterface* sm) :
 
     this->initial_state = this->sm->newBaseState();
     this->joint_move_size = round_up_4(JointMove::mallocSize(this->sm->getRoleCount()));
-    this->basestate_size = round_up_4(sizeof(BaseState) + bs->byte_count);
+    this->basestate_size = round_up_4(BaseState::mallocSize(bs->size));
 
     this->moves = (char*) malloc(this->joint_move_size * RolloutBase::MAX_NUMBER_STATES);
     this->states = (char*) malloc(this->basestate_size * RolloutBase::MAX_NUMBER_STATES);
@@ -81,8 +81,6 @@ void DepthChargeRollout::doRollout(const BaseState* start_state, int game_depth)
         this->depth++;
     }
 
-    this->scores.clear();
-    for (int ii=0; ii<this->sm->getRoleCount(); ii++) {
-        this->scores.emplace_back(this->sm->getGoalValue(ii));
-    }
+    this->scores.resize(this->sm->getRoleCount());
+    this->sm->getGoalValues(this->scores.data());
 }
@@ -39,31 +39,15 @@ Code here is derived from the above - copy Richard Emslie 2015.
 			(h) ^= (h) >> 47; })
 
 std::size_t BaseState::Hasher::operator() (const BaseState* key) const {
+    // the padding is zero, so hashing the last (partial) word is the same as the fasthash tail
+    // of the remaining bytes
     const uint64_t seed = 42 * 42 * 42 * 42;
     const uint64_t    m = 0x880355f21e6d1965ULL;
-    const uint64_t *pos = (const uint64_t *)key->data;
-    const uint64_t *end = pos + (key->byte_count / 8);
-    const unsigned char *pos2;
     uint64_t h = seed ^ (key->byte_count * m);
     uint64_t v;
 
-    while (pos != end) {
-        v  = *pos++;
-        h ^= mix(v);
-        h *= m;
-    }
-
-    pos2 = (const unsigned char*)pos;
-    v = 0;
-
-    switch (key->byte_count & 7) {
-    case 7: v ^= (uint64_t)pos2[6] << 48;
-    case 6: v ^= (uint64_t)pos2[5] << 40;
-    case 5: v ^= (uint64_t)pos2[4] << 32;
-    case 4: v ^= (uint64_t)pos2[3] << 24;
-    case 3: v ^= (uint64_t)pos2[2] << 16;
-    case 2: v ^= (uint64_t)pos2[1] << 8;
-    case 1: v ^= (uint64_t)pos2[0];
+    for (int ii=0; ii<key->word_count; ii++) {
+        v = key->getWord(ii);
         h ^= mix(v);
         h *= m;
     }
@@ -72,59 +56,14 @@ std::size_t BaseState::Hasher::operator() (const BaseState* key) const {
 }
 
 std::size_t BaseState::HasherMasked::operator() (const BaseState* key) const {
-    const int rem = key->byte_count % 8;
-
-    // magics:
+    // as Hasher, with each word masked first
     const uint64_t seed = 42 * 42 * 42 * 42;
-    const uint64_t m = 0x880355f21e6d1965ULL;
+    const uint64_t    m = 0x880355f21e6d1965ULL;
     uint64_t h = seed ^ (key->byte_count * m);
+    uint64_t v;
 
-    // ptr to data/mask
-    const uint64_t* pos = (const uint64_t*) key->data;
-    const uint64_t* mask_pos = (const uint64_t*) this->mask_buf;
-
-    // only need one end
-    const uint64_t* end = pos + (key->byte_count / 8);
-
-    uint64_t v = 0;
-
-    // do 8 byte chunks
-    while (pos != end) {
-        uint64_t v = *pos++;
-
-        // perform mask here
-        v &= *mask_pos++;
-
-        h ^= mix(v);
-        h *= m;
-    }
-
-    v = 0;
-    const uint8_t *byte_pos = (const uint8_t*) pos;
-    const uint8_t* byte_mask_pos = (const uint8_t*) mask_pos;
-
-    switch (rem) {
-    case 7:
-        v ^= (uint64_t)byte_pos[6] << 48;
-        v &= (uint64_t)byte_mask_pos[6] << 48;
-    case 6:
-        v ^= (uint64_t)byte_pos[5] << 40;
-        v &= (uint64_t)byte_mask_pos[5] << 40;
-    case 5:
-        v ^= (uint64_t)byte_pos[4] << 32;
-        v &= (uint64_t)byte_mask_pos[4] << 32;
-    case 4:
-        v ^= (uint64_t)byte_pos[3] << 24;
-        v &= (uint64_t)byte_mask_pos[3] << 24;
-    case 3:
-        v ^= (uint64_t)byte_pos[2] << 16;
-        v &= (uint64_t)byte_mask_pos[2] << 16;
-    case 2:
-        v ^= (uint64_t)byte_pos[1] << 8;
-        v &= (uint64_t)byte_mask_pos[1] << 8;
-    case 1:
-        v ^= (uint64_t)byte_pos[0];
-        v &= (uint64_t)byte_mask_pos[0];
+    for (int ii=0; ii<key->word_count; ii++) {
+        v = key->getWord(ii) & BaseState::loadWord(this->mask_buf, ii);
         h ^= mix(v);
         h *= m;
     }
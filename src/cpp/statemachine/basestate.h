@@ -15,13 +15,20 @@ namespace GGPLib {
         static int const ARRAYTYPE_BYTES = 1;
         static int const ARRAYTYPE_BITS = 8;
 
-        static int mallocSize(int num_bases) {
-            int bytes_for_bases = num_bases / BaseState::ARRAYTYPE_BITS;
-            if (num_bases % ARRAYTYPE_BITS != 0) {
-                bytes_for_bases++;
-            }
+        // The bytes are padded out to whole 64 bit words (the padding is always zero), so that
+        // equals()/assign()/hashing and diffing in updateBases() can go a word at a time.  Base i
+        // is still bit (i % 8) of byte (i / 8), which is bit (i % 64) of word (i / 64) on little
+        // endian.
+        typedef uint64_t WordType;
+        static int const WORDTYPE_BYTES = 8;
+        static int const WORDTYPE_BITS = 64;
+
+        static int wordCount(int num_bases) {
+            return (num_bases + WORDTYPE_BITS - 1) / WORDTYPE_BITS;
+        }
 
-            return sizeof(BaseState) + bytes_for_bases;
+        static int mallocSize(int num_bases) {
+            return sizeof(BaseState) + BaseState::wordCount(num_bases) * WORDTYPE_BYTES;
         }
 
     public:
@@ -33,7 +40,25 @@ namespace GGPLib {
                 this->byte_count++;
             }
 
-            std::memset(this->data, 0, this->byte_count * ARRAYTYPE_BYTES);
+            this->word_count = BaseState::wordCount(size);
+
+            std::memset(this->data, 0, this->word_count * WORDTYPE_BYTES);
+        }
+
+        // basestates may be embedded at 4 byte alignment (see Node/RolloutBase), so words are
+        // accessed via memcpy (which compiles to a plain load/store)
+        WordType getWord(const int index) const {
+            return BaseState::loadWord(this->data, index);
+        }
+
+        static WordType loadWord(const ArrayType* buf, const int index) {
+            WordType w;
+            std::memcpy(&w, buf + index * WORDTYPE_BYTES, WORDTYPE_BYTES);
+            return w;
+        }
+
+        void setWord(const int index, const WordType w) {
+            std::memcpy(this->data + index * WORDTYPE_BYTES, &w, WORDTYPE_BYTES);
         }
 
         const bool get(const int index) const {
@@ -60,8 +85,8 @@ namespace GGPLib {
         }
 
         bool equals(const BaseState* other) const {
-            for (int ii=0; ii<this->byte_count; ii++) {
-                if (this->data[ii] != other->data[ii]) {
+            for (int ii=0; ii<this->word_count; ii++) {
+                if (this->getWord(ii) != other->getWord(ii)) {
                     return false;
                 }
             }
@@ -70,7 +95,7 @@ namespace GGPLib {
         }
 
         void assign(const BaseState* other) {
-            std::memcpy(this->data, other->data, this->byte_count * ARRAYTYPE_BYTES);
+            std::memcpy(this->data, other->data, this->word_count * WORDTYPE_BYTES);
         }
 
     public:
@@ -87,6 +112,9 @@ namespace GGPLib {
         };
 
 
+        // the masked versions work a word at a time too, so mask_buf must cover word_count words
+        // (as the data of a BaseState does).  The padding of the data is zero, so the mask of the
+        // padding does not matter.
         struct HasherMasked {
             HasherMasked(const ArrayType* mask_buf) :
                 mask_buf(mask_buf) {
@@ -104,11 +132,9 @@ namespace GGPLib {
             }
 
             bool operator() (const BaseState* a, const BaseState* b) const {
-                for (int ii=0; ii<a->byte_count; ii++) {
-                    ArrayType aa = a->data[ii] & this->mask_buf[ii];
-                    ArrayType bb = b->data[ii] & this->mask_buf[ii];
-
-                    if (aa != bb) {
+                for (int ii=0; ii<a->word_count; ii++) {
+                    const WordType mask = BaseState::loadWord(this->mask_buf, ii);
+                    if ((a->getWord(ii) ^ b->getWord(ii)) & mask) {
                         return false;
                     }
                 }
@@ -124,6 +150,8 @@ namespace GGPLib {
     public:
         short size;
         short byte_count;
+        short word_count;
+        short padding;
         ArrayType data[0];
 
     public:
@@ -0,0 +1,389 @@
+#include "bitsliced.h"
+
+#include "statemachine/metainfo.h"
+
+#include <k273/logging.h>
+#include <k273/exception.h>
+
+#include <cstring>
+#include <cstdlib>
+
+using namespace K273;
+using namespace std;
+using namespace GGPLib;
+
+///////////////////////////////////////////////////////////////////////////////
+
+static const BitSlicedRollouts::Lanes ALL_LANES = ~BitSlicedRollouts::Lanes(0);
+
+static BitSlicedRollouts::Lanes lanesUpTo(int count) {
+    if (count >= BitSlicedRollouts::NUM_LANES) {
+        return ALL_LANES;
+    }
+
+    return (BitSlicedRollouts::Lanes(1) << count) - 1;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+BitSlicedRollouts::BitSlicedRollouts(const StateMachine* sm, const StateMachine* goal_sm) :
+    role_count(sm->role_count),
+    num_bases(sm->num_bases),
+    num_components(sm->num_components),
+    terminal_index(sm->terminal_index),
+    transitions_index(sm->transitions_index),
+    goal_sm(nullptr),
+    goal_state(nullptr),
+    supported(true),
+    msecs_taken(0),
+    rollouts(0),
+    num_state_changes(0) {
+
+    ASSERT (sm->initialised);
+
+    if (goal_sm != nullptr) {
+        // the goal network shares the bases of the goalless one
+        ASSERT (goal_sm->initialised);
+        ASSERT (goal_sm->num_bases == this->num_bases && goal_sm->role_count == this->role_count);
+        this->goal_sm = static_cast<StateMachine*> (goal_sm->dupe());
+        this->goal_state = this->goal_sm->newBaseState();
+    }
+
+    int max_legals = 0;
+    for (int ii=0; ii<this->role_count; ii++) {
+        const RoleInfo* role_info = &sm->roles[ii];
+        Role* role = &this->roles[ii];
+        role->input_start_index = role_info->input_start_index;
+        role->legal_start_index = role_info->legal_start_index;
+        role->goal_start_index = role_info->goal_start_index;
+        role->num_inputs_legals = role_info->num_inputs_legals;
+        role->num_goals = role_info->num_goals;
+
+        max_legals = std::max(max_legals, role->num_inputs_legals);
+    }
+
+    this->goal_values.resize(this->num_components, -1);
+    for (int ii=0; ii<this->num_components; ii++) {
+        this->goal_values[ii] = sm->metas[ii].goal_value;
+    }
+
+    // reverse the outputs to get the inputs
+    std::vector <int> num_inputs(this->num_components, 0);
+    for (int ii=0; ii<this->num_components; ii++) {
+        const int* pt_output = sm->component_outputs + sm->components[ii].output_index;
+        for (; *pt_output != -1; pt_output++) {
+            num_inputs[*pt_output]++;
+        }
+    }
+
+    this->input_offsets.resize(this->num_components + 1, 0);
+    for (int ii=0; ii<this->num_components; ii++) {
+        this->input_offsets[ii + 1] = this->input_offsets[ii] + num_inputs[ii];
+    }
+
+    this->input_ids.resize(this->input_offsets[this->num_components]);
+    std::vector <int> filled(this->input_offsets.begin(), this->input_offsets.end() - 1);
+    for (int ii=0; ii<this->num_components; ii++) {
+        const int* pt_output = sm->component_outputs + sm->components[ii].output_index;
+        for (; *pt_output != -1; pt_output++) {
+            this->input_ids[filled[*pt_output]++] = ii;
+        }
+    }
+
+    this->required.resize(this->num_components);
+    this->inverts.resize(this->num_components);
+    this->constants.resize(this->num_components, 0);
+    for (int ii=0; ii<this->num_components; ii++) {
+        const Component* component = sm->components + ii;
+        this->required[ii] = component->required_count_true;
+        this->inverts[ii] = component->instruction == INVERT_N;
+
+        // the counts of components without inputs never change
+        if (num_inputs[ii] == 0 && sm->counts[ii] == 0) {
+            this->constants[ii] = ALL_LANES;
+        }
+    }
+
+    // the bases and inputs are set directly, everything else is evaluated in topological order
+    // (Kahn's algorithm).  Anything downstream of an input goes in input_order.
+    int first_non_entry = this->num_bases;
+    for (int ii=0; ii<this->role_count; ii++) {
+        first_non_entry += this->roles[ii].num_inputs_legals;
+    }
+
+    std::vector <bool> from_input(this->num_components, false);
+    for (int ii=this->num_bases; ii<first_non_entry; ii++) {
+        from_input[ii] = true;
+    }
+
+    std::vector <int> pending(num_inputs);
+    std::vector <int> ready;
+    for (int ii=0; ii<this->num_components; ii++) {
+        if (ii < first_non_entry || pending[ii] == 0) {
+            ready.push_back(ii);
+        }
+    }
+
+    int done = 0;
+    while (!ready.empty()) {
+        int cid = ready.back();
+        ready.pop_back();
+        done++;
+
+        if (cid >= first_non_entry) {
+            if (from_input[cid]) {
+                this->input_order.push_back(cid);
+            } else {
+                this->state_order.push_back(cid);
+            }
+        }
+
+        const int* pt_output = sm->component_outputs + sm->components[cid].output_index;
+        for (; *pt_output != -1; pt_output++) {
+            if (from_input[cid]) {
+                from_input[*pt_output] = true;
+            }
+
+            if (--pending[*pt_output] == 0) {
+                ready.push_back(*pt_output);
+            }
+        }
+    }
+
+    ASSERT_MSG (done == this->num_components, "propnet has a cycle");
+
+    // legals, terminal and goals are read before the moves are chosen
+    if (from_input[this->terminal_index]) {
+        this->supported = false;
+    }
+
+    for (int ii=0; ii<this->role_count; ii++) {
+        const Role* role = &this->roles[ii];
+        for (int jj=0; jj<role->num_goals && this->goal_sm == nullptr; jj++) {
+            if (from_input[role->goal_start_index + jj]) {
+                this->supported = false;
+            }
+        }
+
+        if (role->legal_start_index != -1) {
+            for (int jj=0; jj<role->num_inputs_legals; jj++) {
+                if (from_input[role->legal_start_index + jj]) {
+                    this->supported = false;
+                }
+            }
+        }
+    }
+
+    this->values.resize(this->num_components, 0);
+    this->lane_legals.resize(NUM_LANES * std::max(max_legals, 1));
+
+    K273::l_info("BitSlicedRollouts: %d state / %d input components, goal network %d, supported %d",
+                 (int) this->state_order.size(), (int) this->input_order.size(),
+                 (int) (this->goal_sm != nullptr), (int) this->supported);
+}
+
+BitSlicedRollouts::~BitSlicedRollouts() {
+    ::free(this->goal_state);
+    delete this->goal_sm;
+}
+
+BitSlicedRollouts* BitSlicedRollouts::create(const StateMachine* sm, const StateMachine* goal_sm) {
+    BitSlicedRollouts* rollouts = new BitSlicedRollouts(sm, goal_sm);
+    if (!rollouts->supported) {
+        delete rollouts;
+        return nullptr;
+    }
+
+    return rollouts;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+BitSlicedRollouts::Lanes BitSlicedRollouts::evaluate(int component_id) const {
+    const int* pt_input = this->input_ids.data() + this->input_offsets[component_id];
+    const int num_inputs = this->input_offsets[component_id + 1] - this->input_offsets[component_id];
+    const int required_count = this->required[component_id];
+
+    if (num_inputs == 0) {
+        return this->constants[component_id];
+    }
+
+    if (required_count == 0) {
+        return ALL_LANES;
+    }
+
+    if (required_count > num_inputs) {
+        return 0;
+    }
+
+    // or
+    if (required_count == 1) {
+        Lanes res = 0;
+        for (int ii=0; ii<num_inputs; ii++) {
+            res |= this->values[pt_input[ii]];
+        }
+
+        return res;
+    }
+
+    // and
+    if (required_count == num_inputs) {
+        Lanes res = ALL_LANES;
+        for (int ii=0; ii<num_inputs; ii++) {
+            res &= this->values[pt_input[ii]];
+        }
+
+        return res;
+    }
+
+    // general k of n - bitsliced counter (one word per bit of the count), then compare >= k
+    Lanes planes[17] = {0};
+    int num_planes = 0;
+    while ((1 << num_planes) <= num_inputs) {
+        num_planes++;
+    }
+
+    for (int ii=0; ii<num_inputs; ii++) {
+        Lanes carry = this->values[pt_input[ii]];
+        for (int jj=0; jj<num_planes && carry; jj++) {
+            Lanes next = planes[jj] & carry;
+            planes[jj] ^= carry;
+            carry = next;
+        }
+    }
+
+    Lanes greater = 0;
+    Lanes equal = ALL_LANES;
+    for (int jj=num_planes - 1; jj>=0; jj--) {
+        if (required_count & (1 << jj)) {
+            equal &= planes[jj];
+        } else {
+            greater |= equal & planes[jj];
+            equal &= ~planes[jj];
+        }
+    }
+
+    return greater | equal;
+}
+
+void BitSlicedRollouts::evaluateOrder(const std::vector <int>& order) {
+    for (int cid : order) {
+        Lanes v = this->evaluate(cid);
+        this->values[cid] = this->inverts[cid] ? ~v : v;
+    }
+}
+
+void BitSlicedRollouts::chooseMoves(Lanes active) {
+    for (int ii=0; ii<this->role_count; ii++) {
+        const Role* role = &this->roles[ii];
+
+        Lanes* inputs = this->values.data() + role->input_start_index;
+        memset(inputs, 0, sizeof(Lanes) * role->num_inputs_legals);
+
+        if (role->legal_start_index == -1) {
+            continue;
+        }
+
+        // distribute the legals to each lane
+        memset(this->lane_counts, 0, sizeof(this->lane_counts));
+        const Lanes* legals = this->values.data() + role->legal_start_index;
+        for (int jj=0; jj<role->num_inputs_legals; jj++) {
+            Lanes w = legals[jj] & active;
+            while (w) {
+                int lane = __builtin_ctzll(w);
+                this->lane_legals[lane * role->num_inputs_legals + this->lane_counts[lane]++] = jj;
+                w &= w - 1;
+            }
+        }
+
+        Lanes w = active;
+        while (w) {
+            int lane = __builtin_ctzll(w);
+            w &= w - 1;
+
+            const int count = this->lane_counts[lane];
+            if (count == 0) {
+                continue;
+            }
+
+            int choice = this->lane_legals[lane * role->num_inputs_legals + this->random.getWithMax(count)];
+            inputs[choice] |= Lanes(1) << lane;
+        }
+    }
+}
+
+void BitSlicedRollouts::goalValues(int lane, int* scores) {
+    if (this->goal_sm != nullptr) {
+        for (int ii=0; ii<this->num_bases; ii++) {
+            this->goal_state->set(ii, (this->values[ii] >> lane) & 1);
+        }
+
+        this->goal_sm->updateBases(this->goal_state);
+        this->goal_sm->getGoalValues(scores);
+        return;
+    }
+
+    for (int ii=0; ii<this->role_count; ii++) {
+        const Role* role = &this->roles[ii];
+        int goal_value = -1;
+        for (int jj=0; jj<role->num_goals; jj++) {
+            const int cid = role->goal_start_index + jj;
+            if (this->values[cid] & (Lanes(1) << lane)) {
+                goal_value = this->goal_values[cid];
+                break;
+            }
+        }
+
+        scores[ii] = goal_value;
+    }
+}
+
+void BitSlicedRollouts::doBatchRollouts(const BaseState* start_state, int count, int* scores, int* depths) {
+    const double start_time = get_time();
+
+    for (int batch=0; batch<count; batch += NUM_LANES) {
+        const int num_lanes = std::min(NUM_LANES, count - batch);
+        int* batch_scores = scores + batch * this->role_count;
+        int* batch_depths = depths + batch;
+
+        for (int ii=0; ii<this->num_bases; ii++) {
+            this->values[ii] = start_state->get(ii) ? ALL_LANES : 0;
+        }
+
+        Lanes active = lanesUpTo(num_lanes);
+        int depth = 0;
+
+        while (true) {
+            this->evaluateOrder(this->state_order);
+
+            Lanes finished = this->values[this->terminal_index] & active;
+            while (finished) {
+                int lane = __builtin_ctzll(finished);
+                finished &= finished - 1;
+
+                this->goalValues(lane, batch_scores + lane * this->role_count);
+                batch_depths[lane] = depth;
+                this->num_state_changes += depth;
+            }
+
+            active &= ~this->values[this->terminal_index];
+            if (active == 0) {
+                break;
+            }
+
+            this->chooseMoves(active);
+            this->evaluateOrder(this->input_order);
+
+            const Lanes* transitions = this->values.data() + this->transitions_index;
+            for (int ii=0; ii<this->num_bases; ii++) {
+                this->values[ii] = transitions[ii];
+            }
+
+            depth++;
+        }
+
+        this->rollouts += num_lanes;
+    }
+
+    this->msecs_taken += 1000 * (get_time() - start_time);
+}
@@ -0,0 +1,115 @@
+#pragma once
+
+#include "statemachine/basestate.h"
+#include "statemachine/propagate.h"
+
+#include <k273/util.h>
+
+#include <vector>
+#include <cstdint>
+
+namespace GGPLib {
+
+    // Evaluates a propnet over NUM_LANES independent states at once.  Each component's value is a
+    // word, with one bit per lane, so each gate becomes a word wide AND/OR/NOT.  Unlike the
+    // StateMachine, there is no incremental propagation - every component is evaluated each step
+    // (in topological order), which is a win when the propnet is small relative to the number of
+    // rollouts being done.
+    //
+    // For a GoalLessStateMachine, the rollouts are done on the goalless network and the goals are
+    // read from (a dupe of) the goal network, one terminal state at a time - same as
+    // GoalLessStateMachine::getGoalValues().  Combined statemachines are not supported.
+
+    class BitSlicedRollouts {
+    public:
+        typedef uint64_t Lanes;
+        static const int NUM_LANES = 64;
+
+    public:
+        BitSlicedRollouts(const StateMachine* sm, const StateMachine* goal_sm=nullptr);
+        ~BitSlicedRollouts();
+
+        // returns nullptr if sm can't be evaluated bitsliced (ie legals/terminal/goals depend on
+        // the inputs).  If goal_sm is given, the goals are taken from it rather than sm.
+        static BitSlicedRollouts* create(const StateMachine* sm, const StateMachine* goal_sm=nullptr);
+
+    public:
+        // same contract as DepthChargeTest::doBatchRollouts(), runs NUM_LANES rollouts at a time
+        void doBatchRollouts(const BaseState* start_state, int count, int* scores, int* depths);
+
+        int getResult(int index) const {
+            if (index == 0) {
+                return this->msecs_taken;
+            }
+
+            if (index == 1) {
+                return this->rollouts;
+            }
+
+            if (index == 2) {
+                return this->num_state_changes;
+            }
+
+            return -1;
+        }
+
+    private:
+        Lanes evaluate(int component_id) const;
+        void evaluateOrder(const std::vector <int>& order);
+        void chooseMoves(Lanes active);
+        void goalValues(int lane, int* scores);
+
+    private:
+        const int role_count;
+        const int num_bases;
+        const int num_components;
+
+        int terminal_index;
+        int transitions_index;
+
+        struct Role {
+            int input_start_index;
+            int legal_start_index;
+            int goal_start_index;
+            int num_inputs_legals;
+            int num_goals;
+        };
+
+        Role roles[MAX_NUMBER_PLAYERS];
+        std::vector <int> goal_values;
+
+        // goal network of a GoalLessStateMachine (owned dupe), and a state to load a lane into
+        StateMachine* goal_sm;
+        BaseState* goal_state;
+
+        // inputs of each component (the reverse of the propnet's outputs), indexed by
+        // input_offsets
+        std::vector <int> input_offsets;
+        std::vector <int> input_ids;
+        std::vector <uint16_t> required;
+        std::vector <bool> inverts;
+
+        // the value of components with no inputs
+        std::vector <Lanes> constants;
+
+        // the components that only depend on the bases, and those that depend on the inputs (both
+        // in topological order)
+        std::vector <int> state_order;
+        std::vector <int> input_order;
+
+        bool supported;
+
+        // value of each component, as seen by its outputs (ie already inverted)
+        std::vector <Lanes> values;
+
+        // per lane legals for chooseMoves(), NUM_LANES * max num_inputs_legals
+        std::vector <int> lane_legals;
+        int lane_counts[NUM_LANES];
+
+        int msecs_taken;
+        int rollouts;
+        int num_state_changes;
+
+        K273::Random random;
+    };
+}
@@ -14,11 +14,15 @@ using namespace GGPLib;
 CombinedStateMachine::CombinedStateMachine(int number_control_states) :
     number_control_states(number_control_states),
     goal_sm(nullptr),
+    goal_cache(nullptr),
     current(nullptr) {
-    this->controls = new ControlInfo[number_control_states];
+    // zeroed, so a partly built statemachine can be deleted
+    this->controls = new ControlInfo[number_control_states]();
 }
 
 CombinedStateMachine::~CombinedStateMachine() {
+    delete this->goal_cache;
+
     if (this->goal_sm != nullptr) {
         delete this->goal_sm;
     }
@@ -36,10 +40,37 @@ void CombinedStateMachine::setGoalStateMachine(StateMachine* goal_sm) {
 }
 
 void CombinedStateMachine::setControlStateMachine(int control_index, int control_cid, StateMachine* control_sm) {
+    ASSERT (control_index >= 0 && control_index < this->number_control_states);
+
     ControlInfo* info = this->controls + control_index;
     info->control_index = control_index;
     info->control_cid = control_cid;
     info->sm = control_sm;
+
+    // the bases are the first components, so control_cid is also the base index
+    const int word = control_cid / BaseState::WORDTYPE_BITS;
+    const int bit = control_cid % BaseState::WORDTYPE_BITS;
+
+    ControlDispatch* dispatch = nullptr;
+    for (ControlDispatch& d : this->dispatches) {
+        if (d.word == word) {
+            dispatch = &d;
+            break;
+        }
+    }
+
+    if (dispatch == nullptr) {
+        this->dispatches.emplace_back();
+        dispatch = &this->dispatches.back();
+        dispatch->word = word;
+        dispatch->mask = 0;
+        for (int ii=0; ii<BaseState::WORDTYPE_BITS; ii++) {
+            dispatch->by_bit[ii] = nullptr;
+        }
+    }
+
+    dispatch->mask |= BaseState::WordType(1) << bit;
+    dispatch->by_bit[bit] = info;
 }
 
 ///////////////////////////////////////////////////////////////////////////////
@@ -54,33 +85,58 @@ StateMachineInterface* CombinedStateMachine::dupe() const {
         ControlInfo* d_info = d->controls + ii;
         const ControlInfo* this_info = this->controls + ii;
 
-        d_info->control_index = this_info->control_index;
-        d_info->control_cid = this_info->control_cid;
-        d_info->sm = static_cast<StateMachine*> (this_info->sm->dupe());
+        d->setControlStateMachine(this_info->control_index, this_info->control_cid,
+                                  static_cast<StateMachine*> (this_info->sm->dupe()));
 
         if (this->current == this_info->sm) {
             d->current = d_info->sm;
         }
     }
 
+    // each dupe gets its own (empty) cache
+    if (this->goal_cache != nullptr) {
+        d->setGoalCache(this->goal_cache->getSize());
+    }
+
     return d;
 }
 
 ///////////////////////////////////////////////////////////////////////////////
 
-ControlInfo* CombinedStateMachine::getControl(const BaseState* bs) {
-    ControlInfo* new_control = nullptr;
+void CombinedStateMachine::getGoalValues(int* values) {
+    if (this->goal_sm == nullptr) {
+        this->current->getGoalValues(values);
+        return;
+    }
 
-    ControlInfo* control = this->controls;
-    for (int ii=0; ii<this->number_control_states; ii++, control++) {
-        if (bs->get(control->control_cid)) {
-            //ASSERT (new_control == nullptr);
-            new_control = control;
-        }
+    const BaseState* bs = this->current->getCurrentState();
+    if (this->goal_cache != nullptr && this->goal_cache->get(bs, values)) {
+        return;
     }
 
-    //ASSERT (new_control != nullptr);
-    return new_control;
+    // make goal sm have same state as goalless one
+    this->goal_sm->updateBases(bs);
+    this->goal_sm->getGoalValues(values);
+
+    if (this->goal_cache != nullptr) {
+        this->goal_cache->put(bs, values);
+    }
+}
+
+bool CombinedStateMachine::setGoalCache(int size) {
+    if (this->goal_sm == nullptr) {
+        return false;
+    }
+
+    delete this->goal_cache;
+    this->goal_cache = nullptr;
+    if (size > 0) {
+        this->goal_cache = new GoalCache(this->goal_sm->getRoleCount(),
+                                         this->goal_sm->getCurrentState()->size,
+                                         size);
+    }
+
+    return true;
 }
 
 void CombinedStateMachine::reset() {
@@ -89,7 +145,18 @@ void CombinedStateMachine::reset() {
         control->sm->reset();
     }
 
-    control = this->controls;
-    this->current = this->getControl(control->sm->getCurrentState())->sm;
+    control = this->getControl(this->controls->sm->getCurrentState());
+    ASSERT_MSG(control != nullptr, "no control base set in initial state");
+    this->current = control->sm;
 }
 
+
+bool CombinedStateMachine::setZobristHashing(bool enabled) {
+    bool ok = true;
+    ControlInfo* control = this->controls;
+    for (int ii=0; ii<this->number_control_states; ii++, control++) {
+        ok = control->sm->setZobristHashing(enabled) && ok;
+    }
+
+    return ok;
+}
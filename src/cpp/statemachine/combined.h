@@ -6,9 +6,12 @@
 
 #include "statemachine/statemachine.h"
 #include "statemachine/propagate.h"
+#include "statemachine/goalcache.h"
 
 #include <k273/exception.h>
 
+#include <vector>
+
 namespace GGPLib {
 
     struct ControlInfo {
@@ -17,6 +20,14 @@ namespace GGPLib {
         StateMachine* sm;
     };
 
+    // the control bases which fall in one word of the basestate.  The control bases are
+    // mutually exclusive, so the first set bit (if any) of the masked word is the control.
+    struct ControlDispatch {
+        int word;
+        BaseState::WordType mask;
+        ControlInfo* by_bit[BaseState::WORDTYPE_BITS];
+    };
+
     class CombinedStateMachine : public StateMachineInterface {
     public:
         CombinedStateMachine(int number_control_states);
@@ -46,7 +57,9 @@ namespace GGPLib {
         }
 
         void updateBases(const BaseState* bs) {
-            this->current = this->getControl(bs)->sm;
+            ControlInfo* control = this->getControl(bs);
+            ASSERT_MSG(control != nullptr, "no control base set in state");
+            this->current = control->sm;
             this->current->updateBases(bs);
         }
 
@@ -80,20 +93,54 @@ namespace GGPLib {
             }
         }
 
+        void getGoalValues(int* values);
+
+        // only if there is a separate goal statemachine
+        bool setGoalCache(int size);
+
         void reset();
 
         int getRoleCount() const {
             return this->goal_sm->getRoleCount();
         }
 
+        // the control statemachines all have the same bases (and so zobrist keys), and each keeps
+        // its hash in step with its own current state
+        bool setZobristHashing(bool enabled);
+
+        uint64_t getCurrentHash() const {
+            return this->current->getCurrentHash();
+        }
+
+        uint64_t getNextHash() const {
+            return this->current->getNextHash();
+        }
+
+        uint64_t zobristHash(const BaseState* bs) const {
+            return this->current->zobristHash(bs);
+        }
+
     private:
-        ControlInfo* getControl(const BaseState* bs);
+        ControlInfo* getControl(const BaseState* bs) {
+            for (const ControlDispatch& dispatch : this->dispatches) {
+                const BaseState::WordType bits = bs->getWord(dispatch.word) & dispatch.mask;
+                if (bits) {
+                    return dispatch.by_bit[__builtin_ctzll(bits)];
+                }
+            }
+
+            return nullptr;
+        }
 
     private:
         const int number_control_states;
         StateMachine* goal_sm;
+        GoalCache* goal_cache;
         ControlInfo* controls;
         StateMachine* current;
+
+        // usually just the one word
+        std::vector <ControlDispatch> dispatches;
     };
 
 }
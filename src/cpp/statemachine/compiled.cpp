@@ -0,0 +1,25 @@
+#include "statemachine/compiled.h"
+
+#include <k273/logging.h>
+
+#include <dlfcn.h>
+
+using namespace GGPLib;
+
+///////////////////////////////////////////////////////////////////////////////
+
+const CompiledPropnet* GGPLib::loadCompiledPropnet(const char* filename) {
+    void* handle = ::dlopen(filename, RTLD_NOW | RTLD_LOCAL);
+    if (handle == nullptr) {
+        K273::l_error("Failed to dlopen %s : %s", filename, ::dlerror());
+        return nullptr;
+    }
+
+    void* fn = ::dlsym(handle, COMPILED_PROPNET_SYMBOL);
+    if (fn == nullptr) {
+        K273::l_error("Failed to find %s in %s", COMPILED_PROPNET_SYMBOL, filename);
+        return nullptr;
+    }
+
+    return reinterpret_cast<GetCompiledPropnetFn> (fn)();
+}
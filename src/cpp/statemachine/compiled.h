@@ -0,0 +1,40 @@
+#pragma once
+
+#include "statemachine/basestate.h"
+#include "statemachine/legalstate.h"
+#include "statemachine/roleinfo.h"
+
+#include <cstdint>
+
+namespace GGPLib {
+
+    // Per instance state handed to propagation code generated for a specific propnet (see
+    // ggplib/statemachine/compiled.py).  The generated code has the topology baked in, so it only
+    // needs the mutable parts of a StateMachine.
+    struct CompiledContext {
+        uint16_t* counts;
+        BaseState* transition_state;
+        LegalState* legal_states[MAX_NUMBER_PLAYERS];
+    };
+
+    // propagates the outputs of component_id, which must be a base or an input
+    typedef void (*CompiledPropagateFn)(CompiledContext* ctx, int component_id);
+
+    struct CompiledPropnet {
+        int num_components;
+        int total_num_outputs;
+
+        // see StateMachine::topologyHash(), the generated code is only valid for the same topology
+        uint64_t topology_hash;
+
+        CompiledPropagateFn propagate_true;
+        CompiledPropagateFn propagate_false;
+    };
+
+    // the generated shared object exports this
+    typedef const CompiledPropnet* (*GetCompiledPropnetFn)();
+    const char* const COMPILED_PROPNET_SYMBOL = "ggplib_compiled_propnet";
+
+    // dlopens filename (it is never unloaded).  returns nullptr on failure.
+    const CompiledPropnet* loadCompiledPropnet(const char* filename);
+}
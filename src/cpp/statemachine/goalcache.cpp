@@ -0,0 +1,66 @@
+#include "goalcache.h"
+
+#include <k273/exception.h>
+
+#include <cstdlib>
+
+using namespace GGPLib;
+
+///////////////////////////////////////////////////////////////////////////////
+
+GoalCache::GoalCache(int role_count, int num_bases, int size) :
+    role_count(role_count),
+    basestate_size(BaseState::mallocSize(num_bases)),
+    size(1),
+    hits(0),
+    misses(0) {
+
+    ASSERT (size > 0);
+    while (this->size < size) {
+        this->size *= 2;
+    }
+
+    this->states = static_cast<char*> (malloc(this->size * this->basestate_size));
+    this->values = new int[this->size * this->role_count];
+    this->used = new bool[this->size];
+
+    for (int ii=0; ii<this->size; ii++) {
+        this->getState(ii)->init(num_bases);
+        this->used[ii] = false;
+    }
+}
+
+GoalCache::~GoalCache() {
+    free(this->states);
+    delete[] this->values;
+    delete[] this->used;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+bool GoalCache::get(const BaseState* bs, int* values) {
+    const int slot = bs->hashCode() & (this->size - 1);
+    if (this->used[slot] && this->getState(slot)->equals(bs)) {
+        const int* pt_values = this->values + slot * this->role_count;
+        for (int ii=0; ii<this->role_count; ii++) {
+            values[ii] = pt_values[ii];
+        }
+
+        this->hits++;
+        return true;
+    }
+
+    this->misses++;
+    return false;
+}
+
+void GoalCache::put(const BaseState* bs, const int* values) {
+    const int slot = bs->hashCode() & (this->size - 1);
+    this->getState(slot)->assign(bs);
+    this->used[slot] = true;
+
+    int* pt_values = this->values + slot * this->role_count;
+    for (int ii=0; ii<this->role_count; ii++) {
+        pt_values[ii] = values[ii];
+    }
+}
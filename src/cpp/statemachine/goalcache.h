@@ -0,0 +1,54 @@
+#pragma once
+
+#include "statemachine/basestate.h"
+
+#include <cstddef>
+
+namespace GGPLib {
+
+    // Bounded cache of the goal values of (terminal) states, so that a repeated position doesn't
+    // need to sync the goal network.  Direct mapped on the state's hash code, a new entry simply
+    // replaces whatever was in its slot.
+
+    class GoalCache {
+    public:
+        // size is rounded up to a power of 2
+        GoalCache(int role_count, int num_bases, int size);
+        ~GoalCache();
+
+    public:
+        // returns true and fills in values if bs is in the cache
+        bool get(const BaseState* bs, int* values);
+        void put(const BaseState* bs, const int* values);
+
+        int getSize() const {
+            return this->size;
+        }
+
+        long getHits() const {
+            return this->hits;
+        }
+
+        long getMisses() const {
+            return this->misses;
+        }
+
+    private:
+        BaseState* getState(int slot) {
+            return reinterpret_cast <BaseState*> (this->states + slot * this->basestate_size);
+        }
+
+    private:
+        const int role_count;
+        const int basestate_size;
+        int size;
+
+        char* states;
+        int* values;
+        bool* used;
+
+        long hits;
+        long misses;
+    };
+
+}
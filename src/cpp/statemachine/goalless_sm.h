@@ -6,6 +6,7 @@
 
 #include "statemachine/statemachine.h"
 #include "statemachine/propagate.h"
+#include "statemachine/goalcache.h"
 
 #include <k273/logging.h>
 
@@ -15,10 +16,12 @@ namespace GGPLib {
         GoalLessStateMachine(int role_count, StateMachine* goalless_sm, StateMachine* goal_sm) :
             role_count(role_count),
             goalless_sm(goalless_sm),
-            goal_sm(goal_sm) {
+            goal_sm(goal_sm),
+            goal_cache(nullptr) {
         }
 
         virtual ~GoalLessStateMachine() {
+            delete this->goal_cache;
             delete this->goal_sm;
             delete this->goalless_sm;
         }
@@ -26,9 +29,16 @@ namespace GGPLib {
     public:
         StateMachineInterface* dupe() const {
             K273::l_debug("Duping GoalLessStateMachine");
-            return new GoalLessStateMachine(this->role_count,
-                                            static_cast<StateMachine*> (this->goalless_sm->dupe()),
-                                            static_cast<StateMachine*> (this->goal_sm->dupe()));
+            GoalLessStateMachine* d = new GoalLessStateMachine(this->role_count,
+                                                               static_cast<StateMachine*> (this->goalless_sm->dupe()),
+                                                               static_cast<StateMachine*> (this->goal_sm->dupe()));
+
+            // each dupe gets its own (empty) cache
+            if (this->goal_cache != nullptr) {
+                d->setGoalCache(this->goal_cache->getSize());
+            }
+
+            return d;
         }
 
     public:
@@ -77,6 +87,32 @@ namespace GGPLib {
             return this->goal_sm->getGoalValue(role_index);
         }
 
+        void getGoalValues(int* values) {
+            const BaseState* bs = this->goalless_sm->getCurrentState();
+            if (this->goal_cache != nullptr && this->goal_cache->get(bs, values)) {
+                return;
+            }
+
+            this->goal_sm->updateBases(bs);
+            this->goal_sm->getGoalValues(values);
+
+            if (this->goal_cache != nullptr) {
+                this->goal_cache->put(bs, values);
+            }
+        }
+
+        bool setGoalCache(int size) {
+            delete this->goal_cache;
+            this->goal_cache = nullptr;
+            if (size > 0) {
+                this->goal_cache = new GoalCache(this->role_count,
+                                                 this->goalless_sm->getCurrentState()->size,
+                                                 size);
+            }
+
+            return true;
+        }
+
         void reset() {
             this->goalless_sm->reset();
         }
@@ -85,9 +121,34 @@ namespace GGPLib {
             return this->role_count;
         }
 
+        bool setZobristHashing(bool enabled) {
+            return this->goalless_sm->setZobristHashing(enabled);
+        }
+
+        uint64_t getCurrentHash() const {
+            return this->goalless_sm->getCurrentHash();
+        }
+
+        uint64_t getNextHash() const {
+            return this->goalless_sm->getNextHash();
+        }
+
+        uint64_t zobristHash(const BaseState* bs) const {
+            return this->goalless_sm->zobristHash(bs);
+        }
+
+        const StateMachine* getGoallessStateMachine() const {
+            return this->goalless_sm;
+        }
+
+        const StateMachine* getGoalStateMachine() const {
+            return this->goal_sm;
+        }
+
     private:
         const int role_count;
         StateMachine* goalless_sm;
         StateMachine* goal_sm;
+        GoalCache* goal_cache;
     };
 }
@@ -0,0 +1,215 @@
+#include "lazy.h"
+
+#include <k273/logging.h>
+#include <k273/exception.h>
+
+using namespace std;
+using namespace GGPLib;
+
+///////////////////////////////////////////////////////////////////////////////
+
+// marks the seeds and everything they depend on
+static vector <bool> cone(const vector <vector <int>>& inputs, const vector <int>& seeds) {
+    vector <bool> keep(inputs.size(), false);
+    vector <int> todo(seeds);
+    while (!todo.empty()) {
+        int cid = todo.back();
+        todo.pop_back();
+        if (keep[cid]) {
+            continue;
+        }
+
+        keep[cid] = true;
+        for (int i : inputs[cid]) {
+            todo.push_back(i);
+        }
+    }
+
+    return keep;
+}
+
+static bool anyInRange(const vector <bool>& keep, int start, int end) {
+    for (int ii=start; ii<end; ii++) {
+        if (keep[ii]) {
+            return true;
+        }
+    }
+
+    return false;
+}
+
+LazyStateMachine* LazyStateMachine::create(const StateMachine* sm) {
+    ASSERT (sm->initialised);
+    if (sm->num_transitions == 0) {
+        return nullptr;
+    }
+
+    // reverse the outputs to get the inputs
+    vector <vector <int>> inputs(sm->num_components);
+    for (int ii=0; ii<sm->num_components; ii++) {
+        const int* pt_output = sm->component_outputs + sm->components[ii].output_index;
+        for (; *pt_output != -1; pt_output++) {
+            inputs[*pt_output].push_back(ii);
+        }
+    }
+
+    // bases, then inputs by role (see recordFinalise())
+    const int inputs_start = sm->num_bases;
+    int inputs_end = inputs_start;
+    for (int ii=0; ii<sm->role_count; ii++) {
+        inputs_end += sm->roles[ii].num_inputs_legals;
+    }
+
+    vector <int> seeds;
+    for (int ii=0; ii<sm->num_transitions; ii++) {
+        seeds.push_back(sm->transitions_index + ii);
+    }
+
+    vector <bool> transitions_keep = cone(inputs, seeds);
+
+    vector <bool> terminal_keep = cone(inputs, {sm->terminal_index});
+
+    seeds.clear();
+    for (int ii=0; ii<sm->role_count; ii++) {
+        const RoleInfo* role_info = &sm->roles[ii];
+        for (int jj=0; jj<role_info->num_goals; jj++) {
+            seeds.push_back(role_info->goal_start_index + jj);
+        }
+    }
+
+    vector <bool> goals_keep = cone(inputs, seeds);
+
+    vector <vector <bool>> legals_keep;
+    for (int ii=0; ii<sm->role_count; ii++) {
+        const RoleInfo* role_info = &sm->roles[ii];
+        seeds.clear();
+        if (role_info->legal_start_index != -1) {
+            for (int jj=0; jj<role_info->num_inputs_legals; jj++) {
+                seeds.push_back(role_info->legal_start_index + jj);
+            }
+        }
+
+        legals_keep.push_back(cone(inputs, seeds));
+    }
+
+    // the legals/terminal/goals are read before the moves are known
+    bool supported = !anyInRange(terminal_keep, inputs_start, inputs_end) &&
+                     !anyInRange(goals_keep, inputs_start, inputs_end);
+    for (const vector <bool>& keep : legals_keep) {
+        supported = supported && !anyInRange(keep, inputs_start, inputs_end);
+    }
+
+    if (!supported) {
+        K273::l_warning("LazyStateMachine::create() - legals/terminal/goals depend on the inputs");
+        return nullptr;
+    }
+
+    vector <StateMachine*> legal_sms;
+    vector <bool> legals_constant;
+    for (const vector <bool>& keep : legals_keep) {
+        legal_sms.push_back(sm->dupeRestricted(keep));
+        legals_constant.push_back(!anyInRange(keep, 0, sm->num_bases));
+    }
+
+    return new LazyStateMachine(sm->role_count,
+                                sm->dupeRestricted(transitions_keep),
+                                sm->dupeRestricted(terminal_keep),
+                                sm->dupeRestricted(goals_keep),
+                                legal_sms, legals_constant);
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+LazyStateMachine::LazyStateMachine(int role_count, StateMachine* transitions_sm,
+                                   StateMachine* terminal_sm, StateMachine* goals_sm,
+                                   const vector <StateMachine*>& legal_sms,
+                                   const vector <bool>& legals_constant) :
+    role_count(role_count),
+    transitions_sm(transitions_sm),
+    terminal_sm(terminal_sm),
+    goals_sm(goals_sm),
+    legal_sms(legal_sms),
+    legals_constant(legals_constant),
+    transitions_dirty(false),
+    terminal_dirty(false),
+    goals_dirty(false) {
+
+    ASSERT (role_count <= MAX_NUMBER_PLAYERS);
+    for (int ii=0; ii<role_count; ii++) {
+        this->legals_dirty[ii] = false;
+    }
+
+    // all the cones start off in sync with this state
+    this->current_state = this->transitions_sm->newBaseState();
+    this->current_state->assign(this->transitions_sm->getCurrentState());
+}
+
+LazyStateMachine::~LazyStateMachine() {
+    free(this->current_state);
+
+    delete this->transitions_sm;
+    delete this->terminal_sm;
+    delete this->goals_sm;
+    for (StateMachine* sm : this->legal_sms) {
+        delete sm;
+    }
+}
+
+StateMachineInterface* LazyStateMachine::dupe() const {
+    vector <StateMachine*> legal_sms;
+    for (StateMachine* sm : this->legal_sms) {
+        legal_sms.push_back(static_cast<StateMachine*> (sm->dupe()));
+    }
+
+    LazyStateMachine* d = new LazyStateMachine(this->role_count,
+                                               static_cast<StateMachine*> (this->transitions_sm->dupe()),
+                                               static_cast<StateMachine*> (this->terminal_sm->dupe()),
+                                               static_cast<StateMachine*> (this->goals_sm->dupe()),
+                                               legal_sms, this->legals_constant);
+
+    // the cones may be behind
+    d->current_state->assign(this->current_state);
+    d->setAllDirty();
+    return d;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+void LazyStateMachine::setAllDirty() {
+    this->transitions_dirty = true;
+    this->terminal_dirty = true;
+    this->goals_dirty = true;
+    for (int ii=0; ii<this->role_count; ii++) {
+        this->legals_dirty[ii] = !this->legals_constant[ii];
+    }
+}
+
+void LazyStateMachine::setInitialState(const BaseState* bs) {
+    this->transitions_sm->setInitialState(bs);
+    this->terminal_sm->setInitialState(bs);
+    this->goals_sm->setInitialState(bs);
+    for (StateMachine* sm : this->legal_sms) {
+        sm->setInitialState(bs);
+    }
+}
+
+void LazyStateMachine::updateBases(const BaseState* bs) {
+    this->current_state->assign(bs);
+    this->setAllDirty();
+}
+
+void LazyStateMachine::reset() {
+    // the transitions cone needs to retract the last move, the rest catch up when queried
+    this->transitions_sm->reset();
+    this->transitions_dirty = false;
+
+    const BaseState* initial_state = this->transitions_sm->getInitialState();
+    if (!this->current_state->equals(initial_state)) {
+        this->current_state->assign(initial_state);
+        this->terminal_dirty = true;
+        this->goals_dirty = true;
+        for (int ii=0; ii<this->role_count; ii++) {
+            this->legals_dirty[ii] = !this->legals_constant[ii];
+        }
+    }
+}
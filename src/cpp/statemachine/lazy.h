@@ -0,0 +1,139 @@
+#pragma once
+
+#include "statemachine/roleinfo.h"
+#include "statemachine/basestate.h"
+#include "statemachine/legalstate.h"
+#include "statemachine/jointmove.h"
+
+#include "statemachine/statemachine.h"
+#include "statemachine/propagate.h"
+
+#include <vector>
+
+namespace GGPLib {
+
+    // Splits a propnet StateMachine into the cones of its transitions, terminal, goals and each
+    // role's legals (each a dupeRestricted() of the original, which only propagates the
+    // components its cone depends on).  updateBases() only records the state.  Each cone is
+    // brought up to date the first time it is queried after that, so a rollout only pays for
+    // what it reads.  Legals which don't depend on any base (ie a role that can only ever noop)
+    // are never propagated at all.
+
+    class LazyStateMachine : public StateMachineInterface {
+    public:
+        // returns nullptr if the legals/terminal/goals depend on the inputs
+        static LazyStateMachine* create(const StateMachine* sm);
+
+    private:
+        LazyStateMachine(int role_count, StateMachine* transitions_sm, StateMachine* terminal_sm,
+                         StateMachine* goals_sm, const std::vector <StateMachine*>& legal_sms,
+                         const std::vector <bool>& legals_constant);
+
+    public:
+        virtual ~LazyStateMachine();
+
+        StateMachineInterface* dupe() const;
+
+    public:
+        BaseState* newBaseState() const {
+            return this->transitions_sm->newBaseState();
+        }
+
+        const BaseState* getCurrentState() const {
+            return this->current_state;
+        }
+
+        void setInitialState(const BaseState* bs);
+
+        const BaseState* getInitialState() const {
+            return this->transitions_sm->getInitialState();
+        }
+
+        void updateBases(const BaseState* bs);
+
+        LegalState* getLegalState(int role_index) {
+            this->sync(this->legal_sms[role_index], this->legals_dirty[role_index]);
+            return this->legal_sms[role_index]->getLegalState(role_index);
+        }
+
+        const char* legalToMove(int role_index, int choice) const {
+            return this->legal_sms[role_index]->legalToMove(role_index, choice);
+        }
+
+        JointMove* getJointMove() {
+            return this->transitions_sm->getJointMove();
+        }
+
+        bool isTerminal() const {
+            this->sync(this->terminal_sm, this->terminal_dirty);
+            return this->terminal_sm->isTerminal();
+        }
+
+        void nextState(const JointMove* move, BaseState* bs) {
+            this->sync(this->transitions_sm, this->transitions_dirty);
+            this->transitions_sm->nextState(move, bs);
+        }
+
+        int getGoalValue(int role_index) {
+            this->sync(this->goals_sm, this->goals_dirty);
+            return this->goals_sm->getGoalValue(role_index);
+        }
+
+        void getGoalValues(int* values) {
+            this->sync(this->goals_sm, this->goals_dirty);
+            this->goals_sm->getGoalValues(values);
+        }
+
+        void reset();
+
+        int getRoleCount() const {
+            return this->role_count;
+        }
+
+        // hashing follows the transitions cone
+        bool setZobristHashing(bool enabled) {
+            return this->transitions_sm->setZobristHashing(enabled);
+        }
+
+        uint64_t getCurrentHash() const {
+            this->sync(this->transitions_sm, this->transitions_dirty);
+            return this->transitions_sm->getCurrentHash();
+        }
+
+        uint64_t getNextHash() const {
+            return this->transitions_sm->getNextHash();
+        }
+
+        uint64_t zobristHash(const BaseState* bs) const {
+            return this->transitions_sm->zobristHash(bs);
+        }
+
+    private:
+        void sync(StateMachine* sm, bool& dirty) const {
+            if (dirty) {
+                sm->updateBases(this->current_state);
+                dirty = false;
+            }
+        }
+
+        void setAllDirty();
+
+    private:
+        const int role_count;
+
+        StateMachine* transitions_sm;
+        StateMachine* terminal_sm;
+        StateMachine* goals_sm;
+        std::vector <StateMachine*> legal_sms;
+        std::vector <bool> legals_constant;
+
+        BaseState* current_state;
+
+        // set when current_state has changed since the cone was last updated
+        mutable bool transitions_dirty;
+        mutable bool terminal_dirty;
+        mutable bool goals_dirty;
+        bool legals_dirty[MAX_NUMBER_PLAYERS];
+    };
+
+}
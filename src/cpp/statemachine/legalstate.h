@@ -1,5 +1,8 @@
 #pragma once
 
+#include <cstring>
+#include <algorithm>
+
 namespace GGPLib {
     class LegalState {
 
@@ -33,6 +36,9 @@ namespace GGPLib {
 
                 this->indices = (int *) malloc(cap * sizeof(int));
                 this->positions = (int *) malloc(cap * sizeof(int));
+
+                // so contains() never reads garbage
+                std::memset(this->positions, 0, cap * sizeof(int));
             }
 
             this->capacity = cap;
@@ -46,6 +52,18 @@ namespace GGPLib {
             return *(this->indices + at);
         }
 
+        // is value (< capacity) currently legal
+        bool contains(int value) const {
+            const int pos = *(this->positions + value);
+            return pos < this->count && *(this->indices + pos) == value;
+        }
+
+        // copies up to size legals into buf, returns the count (which may be more than size)
+        int copyLegals(int* buf, int size) const {
+            std::memcpy(buf, this->indices, std::min(this->count, size) * sizeof(int));
+            return this->count;
+        }
+
         void remove(int value) {
             int tail_pos = this->count - 1;
             int pos = *(this->positions + value);
@@ -15,29 +15,99 @@ using namespace GGPLib;
 
 ///////////////////////////////////////////////////////////////////////////////
 
+PropnetTopology::PropnetTopology(int num_components, int total_num_outputs) {
+    this->components = new Component[num_components];
+    this->component_outputs = new int[total_num_outputs];
+    this->metas = new MetaComponentInfo[num_components];
+}
+
+PropnetTopology::~PropnetTopology() {
+    delete[] this->metas;
+    delete[] this->component_outputs;
+    delete[] this->components;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+PropagationProfile::PropagationProfile(int num_components) :
+    visits(num_components),
+    activations(num_components),
+    depths(DEPTH_BUCKETS),
+    cascades(CASCADE_BUCKETS) {
+    this->clear();
+}
+
+void PropagationProfile::clear() {
+    std::fill(this->visits.begin(), this->visits.end(), 0);
+    std::fill(this->activations.begin(), this->activations.end(), 0);
+    std::fill(this->depths.begin(), this->depths.end(), 0);
+    std::fill(this->cascades.begin(), this->cascades.end(), 0);
+
+    this->cascade_count = 0;
+    this->total_visits = 0;
+    this->max_depth = 0;
+    this->max_cascade = 0;
+    this->cascade_size = 0;
+}
+
+void PropagationProfile::endCascade() {
+    int bucket = 0;
+    for (uint64_t sz = this->cascade_size + 1; sz > 1; sz >>= 1) {
+        bucket++;
+    }
+
+    this->cascades[std::min(bucket, CASCADE_BUCKETS - 1)]++;
+    this->cascade_count++;
+    this->total_visits += this->cascade_size;
+    this->max_cascade = std::max(this->max_cascade, this->cascade_size);
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
 StateMachine::StateMachine(int role_count, int num_bases, int num_transitions,
                            int num_components, int total_num_outputs, int topological_size) :
+    StateMachine(role_count, num_bases, num_transitions, num_components, total_num_outputs,
+                 topological_size, std::make_shared <PropnetTopology>(num_components, total_num_outputs)) {
+}
+
+StateMachine::StateMachine(int role_count, int num_bases, int num_transitions,
+                           int num_components, int total_num_outputs, int topological_size,
+                           std::shared_ptr <PropnetTopology> topology) :
     role_count(role_count),
     num_bases(num_bases),
     num_transitions(num_transitions),
     num_components(num_components),
     total_num_outputs(total_num_outputs),
     topological_size(topological_size),
-    initialised(false) {
+    initialised(false),
+    topology(topology) {
 
     // we can either have no transitions, or the same number as bases
     ASSERT (num_transitions == 0 || num_transitions == num_bases);
 
-    this->components = new Component[num_components];
-    this->component_outputs = new Component*[total_num_outputs];
+    this->metas = this->topology->metas;
+    this->components = this->topology->components;
+    this->component_outputs = this->topology->component_outputs;
 
-    this->metas = new MetaComponentInfo[num_components];
+    this->counts = new uint16_t[num_components];
 
     this->current_state = this->newBaseState();
     this->initial_state = this->newBaseState();
     this->transition_state = this->newBaseState();
 
     this->preserve_last_move = this->getJointMove();
+
+    this->compiled = nullptr;
+    this->compiled_ctx.counts = this->counts;
+    this->compiled_ctx.transition_state = this->transition_state;
+    for (int ii=0; ii<MAX_NUMBER_PLAYERS; ii++) {
+        this->compiled_ctx.legal_states[ii] = &this->roles[ii].legal_state;
+    }
+
+    this->profile = nullptr;
+
+    this->current_hash = 0;
+    this->next_hash = 0;
 }
 
 StateMachine::~StateMachine() {
@@ -46,14 +116,52 @@ StateMachine::~StateMachine() {
     free(this->initial_state);
     free(this->current_state);
     free(this->preserve_last_move);
-    delete[] this->metas;
-    delete[] this->component_outputs;
-    delete[] this->components;
+    delete[] this->counts;
+    delete this->profile;
+
+    // topology is deleted with the last StateMachine referencing it
 }
 
 ///////////////////////////////////////////////////////////////////////////////
 
 StateMachineInterface* StateMachine::dupe() const {
+    // the topology is shared, only the counts and states are copied
+    StateMachine* d = this->dupeWithTopology(this->topology);
+    d->compiled = this->compiled;
+    return d;
+}
+
+StateMachine* StateMachine::dupeRestricted(const std::vector <bool>& keep) const {
+    ASSERT (this->initialised);
+    ASSERT ((int) keep.size() == this->num_components);
+
+    auto topology = std::make_shared <PropnetTopology>(this->num_components, this->total_num_outputs);
+    memcpy(topology->components, this->components, sizeof(Component) * this->num_components);
+    memcpy(topology->component_outputs, this->component_outputs, sizeof(int) * this->total_num_outputs);
+    for (int ii=0; ii<this->num_components; ii++) {
+        topology->metas[ii] = this->metas[ii];
+    }
+
+    // the outputs are filtered in place (output_index is unchanged, the lists just get shorter)
+    for (int ii=0; ii<this->num_components; ii++) {
+        const int* pt_output = this->component_outputs + this->components[ii].output_index;
+        int* pt_restricted = topology->component_outputs + this->components[ii].output_index;
+        if (keep[ii]) {
+            for (; *pt_output != -1; pt_output++) {
+                if (keep[*pt_output]) {
+                    *pt_restricted++ = *pt_output;
+                }
+            }
+        }
+
+        *pt_restricted = -1;
+    }
+
+    // the generated propagation would still propagate everything
+    return this->dupeWithTopology(topology);
+}
+
+StateMachine* StateMachine::dupeWithTopology(std::shared_ptr <PropnetTopology> topology) const {
     ASSERT (this->initialised);
 
     StateMachine* d = new StateMachine(this->role_count,
@@ -61,7 +169,8 @@ StateMachineInterface* StateMachine::dupe() const {
                                        this->num_transitions,
                                        this->num_components,
                                        this->total_num_outputs,
-                                       this->topological_size);
+                                       this->topological_size,
+                                       topology);
 
     d->current_state->assign(this->current_state);
     d->initial_state->assign(this->initial_state);
@@ -93,31 +202,12 @@ StateMachineInterface* StateMachine::dupe() const {
         }
     }
 
-    // copy metas:
-    for (int ii=0; ii<this->num_components; ii++) {
-        MetaComponentInfo* d_meta = d->metas + ii;
-        const MetaComponentInfo* this_meta = this->metas + ii;
+    memcpy(d->counts, this->counts, sizeof(uint16_t) * this->num_components);
 
-        d_meta->component_id = this_meta->component_id;
-        d_meta->type = this_meta->type;
-        d_meta->gdl = this_meta->gdl;
-        d_meta->move = this_meta->move;
-        d_meta->goal_value = this_meta->goal_value;
-    }
-
-    memcpy(d->components, this->components, sizeof(Component) * this->num_components);
-
-    // copy the outputs...
-    for (int ii=0; ii<this->total_num_outputs; ii++) {
-        Component** d_output = d->component_outputs + ii;
-        Component** this_output = this->component_outputs + ii;
-
-        if (*this_output == nullptr) {
-            *d_output = nullptr;
-        } else {
-            int component_id = *this_output - this->components;
-            *d_output = d->components + component_id;
-        }
+    if (!this->zobrist_keys.empty()) {
+        d->zobrist_keys = this->zobrist_keys;
+        d->current_hash = this->current_hash;
+        d->next_hash = this->next_hash;
     }
 
     d->initialised = true;
@@ -145,13 +235,14 @@ void StateMachine::setComponent(int component_id, int required_count_false, int
     //K273::l_info("setting component %d with output index %d and number_outputs %d init:%d incr: %d topological_order %d",
     //             component_id, output_index, number_outputs, initial_count, incr, topological_order);
 
+    ASSERT (!this->initialised);
     ASSERT (component_id < this->num_components);
-    Component* component = this->components + component_id;
+    Component* component = this->topology->components + component_id;
     ASSERT (sizeof(Component) == 8);
     memset(component, 0, sizeof(Component));
 
     // set 0 -> true
-    component->count = ((uint16_t) initial_count) - ((uint16_t) required_count_true);
+    this->counts[component_id] = ((uint16_t) initial_count) - ((uint16_t) required_count_true);
 
     if (number_outputs == 0) {
         component->instruction = NOUGHT;
@@ -166,17 +257,24 @@ void StateMachine::setComponent(int component_id, int required_count_false, int
 
     // role_index set later
 
+    ASSERT (required_count_true >= 0 && required_count_true < 0xffff);
+    component->required_count_true = required_count_true;
     component->output_index = output_index;
 }
 
 void StateMachine::setOutput(int output_index, int component_id) {
-    Component** output = this->component_outputs + output_index;
+    ASSERT (!this->initialised);
     ASSERT (component_id >= -1 && component_id < num_components);
-    if (component_id == -1) {
-        *output = nullptr;
-    } else {
-        *output = this->components + component_id;
-    }
+
+    // -1 terminates
+    this->topology->component_outputs[output_index] = component_id;
+}
+
+void StateMachine::setOutputs(const int* component_ids, int count) {
+    // bulk version of setOutput(), for all the outputs in one go
+    ASSERT (!this->initialised);
+    ASSERT (count == this->total_num_outputs);
+    memcpy(this->topology->component_outputs, component_ids, sizeof(int) * count);
 }
 
 void StateMachine::recordFinalise(int control_flows, int terminal_index) {
@@ -236,15 +334,13 @@ void StateMachine::recordFinalise(int control_flows, int terminal_index) {
     ASSERT (total == this->num_components);
 
     // assign to current state
-    Component* base = this->components;
-    for (int ii=0; ii<this->num_bases; ii++, base++) {
-        this->current_state->set(ii, base->count == 0);
+    for (int ii=0; ii<this->num_bases; ii++) {
+        this->current_state->set(ii, this->counts[ii] == 0);
     }
 
     // assign to transitions state
-    Component* transition = this->components + this->transitions_index;
-    for (int ii=0; ii<this->num_transitions; ii++, transition++) {
-        this->transition_state->set(ii, transition->count == 0);
+    for (int ii=0; ii<this->num_transitions; ii++) {
+        this->transition_state->set(ii, this->counts[this->transitions_index + ii] == 0);
     }
 
     // sync up legals one time - after we are on trigger alert!
@@ -252,9 +348,9 @@ void StateMachine::recordFinalise(int control_flows, int terminal_index) {
         RoleInfo* role_info = this->roles + ii;
         ASSERT (role_info->legal_state.getCount() == 0);
         if (role_info->legal_start_index != -1) {
-            Component* legal = this->components + role_info->legal_start_index;
+            const uint16_t* legal = this->counts + role_info->legal_start_index;
             for (int jj=0; jj<role_info->num_inputs_legals; jj++, legal++) {
-                if (legal->count == 0) {
+                if (*legal == 0) {
                     role_info->legal_state.insert(jj);
                 }
             }
@@ -263,7 +359,7 @@ void StateMachine::recordFinalise(int control_flows, int terminal_index) {
 
     // Set up instruction for trigger types
     for (int ii=0; ii<this->num_components; ii++) {
-        Component* component = this->components + ii;
+        Component* component = this->topology->components + ii;
 
         component->role_index = 0;
         if (ii >= this->transitions_index && ii < this->transitions_index + this->num_bases) {
@@ -295,7 +391,8 @@ void StateMachine::recordFinalise(int control_flows, int terminal_index) {
 
 void StateMachine::setMetaInformation(int component_id, const string& component_type,
                                       const string& gdl, const string& move, int goal_value) {
-    MetaComponentInfo* info = this->metas + component_id;
+    ASSERT (!this->initialised);
+    MetaComponentInfo* info = this->topology->metas + component_id;
     info->component_id = component_id;
     info->type = component_type;
     info->gdl = gdl;
@@ -303,6 +400,97 @@ void StateMachine::setMetaInformation(int component_id, const string& component_
     info->goal_value = goal_value;
 }
 
+bool StateMachine::setCompiled(const CompiledPropnet* compiled) {
+    if (compiled == nullptr ||
+        compiled->num_components != this->num_components ||
+        compiled->total_num_outputs != this->total_num_outputs ||
+        compiled->topology_hash != this->topologyHash()) {
+        K273::l_error("StateMachine::setCompiled() - compiled propnet does not match");
+        return false;
+    }
+
+    this->compiled = compiled;
+    return true;
+}
+
+uint64_t StateMachine::topologyHash() const {
+    uint64_t hash = 14695981039346656037ULL;
+    auto add = [&hash](uint32_t value) {
+        hash ^= value;
+        hash *= 1099511628211ULL;
+    };
+
+    for (int ii=0; ii<this->num_components; ii++) {
+        const Component* component = this->components + ii;
+        add(component->instruction);
+        add(component->role_index);
+
+        const int* pt_output = this->component_outputs + component->output_index;
+        for (; *pt_output != -1; pt_output++) {
+            add(*pt_output);
+        }
+
+        add((uint32_t) -1);
+    }
+
+    return hash;
+}
+
+void StateMachine::setProfiling(bool enabled) {
+    if (!enabled) {
+        delete this->profile;
+        this->profile = nullptr;
+        return;
+    }
+
+    if (this->profile == nullptr) {
+        this->profile = new PropagationProfile(this->num_components);
+    } else {
+        this->profile->clear();
+    }
+}
+
+bool StateMachine::setZobristHashing(bool enabled) {
+    if (!enabled) {
+        this->zobrist_keys.clear();
+        this->current_hash = this->next_hash = 0;
+        return true;
+    }
+
+    if (this->zobrist_keys.empty()) {
+        // splitmix64.  Rounded up to whole words, so the diff loops in updateBases()/nextState()
+        // can index them by word and bit.
+        const int num_keys = this->current_state->word_count * BaseState::WORDTYPE_BITS;
+        uint64_t seed = 0x9e3779b97f4a7c15ULL;
+        this->zobrist_keys.resize(num_keys);
+        for (int ii=0; ii<num_keys; ii++) {
+            uint64_t z = (seed += 0x9e3779b97f4a7c15ULL);
+            z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+            z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+            this->zobrist_keys[ii] = z ^ (z >> 31);
+        }
+    }
+
+    this->current_hash = this->zobristHash(this->current_state);
+    this->next_hash = this->zobristHash(this->transition_state);
+    return true;
+}
+
+uint64_t StateMachine::zobristHash(const BaseState* bs) const {
+    if (this->zobrist_keys.empty()) {
+        return 0;
+    }
+
+    uint64_t hash = 0;
+    for (int ii=0; ii<this->num_bases; ii++) {
+        if (bs->get(ii)) {
+            hash ^= this->zobrist_keys[ii];
+        }
+    }
+
+    return hash;
+}
+
 void StateMachine::setInitialState(const BaseState* bs) {
     this->initial_state->assign(bs);
 }
@@ -322,23 +510,37 @@ const BaseState* StateMachine::getCurrentState() const {
 }
 
 void StateMachine::updateBases(const BaseState* bs) {
-    const BaseState::ArrayType *pt_bs = bs->data;
-    BaseState::ArrayType *pt_current = this->current_state->data;
-    for (int block=0; block<bs->byte_count; block++) {
-        BaseState::ArrayType xxor = *pt_bs ^ *pt_current;
-        Component* base = this->components + block * BaseState::ARRAYTYPE_BITS;
-        for (int ii=0; ii<BaseState::ARRAYTYPE_BITS; ii++) {
-            const BaseState::ArrayType mask = (BaseState::ArrayType(1) << ii);
-            if (xxor & mask) {
-                this->propagate(base + ii, *pt_bs & mask);
+    if (unlikely(this->profile != nullptr)) {
+        this->profile->beginCascade();
+    }
+
+    // skip unchanged words, and visit the changed bits directly (updating the hash on the way)
+    const bool hashing = !this->zobrist_keys.empty();
+    const uint64_t* keys = this->zobrist_keys.data();
+    uint64_t hash = this->current_hash;
+
+    for (int word=0; word<bs->word_count; word++) {
+        const BaseState::WordType value = bs->getWord(word);
+        BaseState::WordType xxor = value ^ this->current_state->getWord(word);
+
+        const int base = word * BaseState::WORDTYPE_BITS;
+        while (xxor) {
+            const int ii = __builtin_ctzll(xxor);
+            this->propagate(base + ii, (value >> ii) & 1);
+            if (hashing) {
+                hash ^= keys[base + ii];
             }
-        }
 
-        pt_bs++;
-        pt_current++;
+            xxor &= xxor - 1;
+        }
     }
 
+    this->current_hash = hash;
     this->current_state->assign(bs);
+
+    if (unlikely(this->profile != nullptr)) {
+        this->profile->endCascade();
+    }
 }
 
 LegalState* StateMachine::getLegalState(int role_index) {
@@ -361,8 +563,7 @@ JointMove* StateMachine::getJointMove() {
 }
 
 bool StateMachine::isTerminal() const {
-    Component* terminal = this->components + this->terminal_index;
-    if (terminal->count == 0) {
+    if (this->counts[this->terminal_index] == 0) {
         return true;
     }
 
@@ -373,6 +574,10 @@ void StateMachine::nextState(const JointMove* move, BaseState* bs) {
     // Constraint: state of network should be correct wrt bases
     // IMPORTANT - this does not update the bases at the end.
 
+    if (unlikely(this->profile != nullptr)) {
+        this->profile->beginCascade();
+    }
+
     // propagate inputs
     for (int ii=0; ii<this->role_count; ii++) {
         int last = this->preserve_last_move->get(ii);
@@ -384,22 +589,39 @@ void StateMachine::nextState(const JointMove* move, BaseState* bs) {
             RoleInfo* role_info = &this->roles[ii];
             int input_start_index = role_info->input_start_index;
 
-            Component* input = this->components + (input_start_index + cur);
-            Component** pt_output = this->component_outputs + input->output_index;
-
-            this->forwardPropagateValueP(pt_output);
-            //this->propagate(input, true);
+            this->propagate(input_start_index + cur, true);
             if (last != -1) {
-                input = this->components + (input_start_index + last);
-                pt_output = this->component_outputs + input->output_index;
-                this->forwardPropagateValueN(pt_output);
-                //this->propagate(input, false);
+                this->propagate(input_start_index + last, false);
             }
         }
     }
 
     // read from transitions into base state
-    bs->assign(this->transition_state);
+    if (this->zobrist_keys.empty()) {
+        bs->assign(this->transition_state);
+
+    } else {
+        // copy a word at a time, hashing the bits that differ from the current state on the way
+        const uint64_t* keys = this->zobrist_keys.data();
+        uint64_t hash = this->current_hash;
+
+        for (int word=0; word<bs->word_count; word++, keys += BaseState::WORDTYPE_BITS) {
+            const BaseState::WordType value = this->transition_state->getWord(word);
+            bs->setWord(word, value);
+
+            BaseState::WordType xxor = value ^ this->current_state->getWord(word);
+            while (xxor) {
+                hash ^= keys[__builtin_ctzll(xxor)];
+                xxor &= xxor - 1;
+            }
+        }
+
+        this->next_hash = hash;
+    }
+
+    if (unlikely(this->profile != nullptr)) {
+        this->profile->endCascade();
+    }
 
     // OLD CODE WITHOUT PRESERVE:
     //     // propagate inputs
@@ -431,11 +653,11 @@ void StateMachine::nextState(const JointMove* move, BaseState* bs) {
 
 int StateMachine::getGoalValue(int role_index) {
     RoleInfo* role_info = &this->roles[role_index];
-    Component* goal = this->components + role_info->goal_start_index;
+    const uint16_t* goal = this->counts + role_info->goal_start_index;
     for (int ii=0; ii<role_info->num_goals; ii++, goal++) {
-        if (goal->count == 0) {
+        if (*goal == 0) {
             // get the meta
-            MetaComponentInfo* info = this->metas + role_info->goal_start_index + ii;
+            const MetaComponentInfo* info = this->metas + role_info->goal_start_index + ii;
             return info->goal_value;
         }
     }
@@ -443,58 +665,141 @@ int StateMachine::getGoalValue(int role_index) {
     return -1;
 }
 
+void StateMachine::getGoalValues(int* values) {
+    for (int ii=0; ii<this->role_count; ii++) {
+        values[ii] = this->getGoalValue(ii);
+    }
+}
+
 void StateMachine::reset() {
     this->updateBases(this->initial_state);
+
+    // retracting the last move is counted as a cascade of its own
+    if (unlikely(this->profile != nullptr)) {
+        this->profile->beginCascade();
+    }
+
     for (int ii=0; ii<this->role_count; ii++) {
         int last = this->preserve_last_move->get(ii);
         if (last != -1) {
             RoleInfo* role_info = &this->roles[ii];
             int input_start_index = role_info->input_start_index;
 
-            Component* input = this->components + (input_start_index + last);
-            Component** pt_output = this->component_outputs + input->output_index;
-            this->forwardPropagateValueN(pt_output);
+            this->propagate(input_start_index + last, false);
         }
 
         this->preserve_last_move->set(ii, -1);
     }
-}
 
-void StateMachine::triggerPropagateLegalP(Component* component) {
-    int component_id = component - this->components;
-    RoleInfo* role = &this->roles[component->role_index];
+    if (unlikely(this->profile != nullptr)) {
+        this->profile->endCascade();
+    }
+}
 
+void StateMachine::triggerPropagateLegalP(int component_id) {
+    RoleInfo* role = &this->roles[this->components[component_id].role_index];
     role->legal_state.insert(component_id - role->legal_start_index);
 }
 
-void StateMachine::triggerPropagateTransitionP(Component* component) {
-    int component_id = component - this->components;
+void StateMachine::triggerPropagateTransitionP(int component_id) {
     this->transition_state->set(component_id - this->transitions_index, true);
 }
 
-void StateMachine::triggerPropagateLegalN(Component* component) {
-    int component_id = component - this->components;
-    RoleInfo* role = &this->roles[component->role_index];
-
+void StateMachine::triggerPropagateLegalN(int component_id) {
+    RoleInfo* role = &this->roles[this->components[component_id].role_index];
     role->legal_state.remove(component_id - role->legal_start_index);
 }
 
 
-void StateMachine::triggerPropagateTransitionN(Component* component) {
-    int component_id = component - this->components;
+void StateMachine::triggerPropagateTransitionN(int component_id) {
     this->transition_state->set(component_id - this->transitions_index, false);
 }
 
-void StateMachine::forwardPropagateValueP(Component** pt_output) {
+void StateMachine::forwardPropagateValueP(const int* pt_output) {
     // CONSTRAINT: only called if propagation is required
-    while (*pt_output != nullptr) {
-        this->forwardPropagateValueP1(pt_output++);
+    while (*pt_output != -1) {
+        this->forwardPropagateValueP1(*pt_output++);
     }
 }
 
-void StateMachine::forwardPropagateValueN(Component** pt_output) {
+void StateMachine::forwardPropagateValueN(const int* pt_output) {
     // CONSTRAINT: only called if propagation is required
-    while (*pt_output != nullptr) {
-        this->forwardPropagateValueN1(pt_output++);
+    while (*pt_output != -1) {
+        this->forwardPropagateValueN1(*pt_output++);
+    }
+}
+
+///////////////////////////////////////////////////////////////////////////////
+// profiled propagation.  Mirrors forwardPropagateValueP1/N1() above (and works on the same
+// counts), but counts into profile.  Depth is 0 for the components directly fed by the
+// component which changed.
+
+void StateMachine::profiledPropagate(int component_id, bool value) {
+    const int* pt_output = this->component_outputs + this->components[component_id].output_index;
+    if (value) {
+        this->profiledPropagateValueP(pt_output, 0);
+    } else {
+        this->profiledPropagateValueN(pt_output, 0);
+    }
+}
+
+void StateMachine::profiledPropagateValueP(const int* pt_output, int depth) {
+    while (*pt_output != -1) {
+        const int component_id = *pt_output++;
+        this->profile->visit(component_id, depth);
+
+        uint16_t count = ++this->counts[component_id];
+        if (count == 0) {
+            this->profile->activations[component_id]++;
+
+            const Component* component = this->components + component_id;
+            switch (component->instruction) {
+            case Instruction::SAME_N:
+                this->profiledPropagateValueP(this->component_outputs + component->output_index, depth + 1);
+                break;
+            case Instruction::TRIGGER_LEGAL:
+                this->triggerPropagateLegalP(component_id);
+                break;
+            case Instruction::TRIGGER_TRANSITION:
+                this->triggerPropagateTransitionP(component_id);
+                break;
+            case Instruction::INVERT_N:
+                this->profiledPropagateValueN(this->component_outputs + component->output_index, depth + 1);
+                break;
+            default:
+                break;
+            }
+        }
+    }
+}
+
+void StateMachine::profiledPropagateValueN(const int* pt_output, int depth) {
+    while (*pt_output != -1) {
+        const int component_id = *pt_output++;
+        this->profile->visit(component_id, depth);
+
+        if (this->counts[component_id] == 0) {
+            this->profile->activations[component_id]++;
+
+            const Component* component = this->components + component_id;
+            switch (component->instruction) {
+            case Instruction::SAME_N:
+                this->profiledPropagateValueN(this->component_outputs + component->output_index, depth + 1);
+                break;
+            case Instruction::TRIGGER_LEGAL:
+                this->triggerPropagateLegalN(component_id);
+                break;
+            case Instruction::TRIGGER_TRANSITION:
+                this->triggerPropagateTransitionN(component_id);
+                break;
+            case Instruction::INVERT_N:
+                this->profiledPropagateValueP(this->component_outputs + component->output_index, depth + 1);
+                break;
+            default:
+                break;
+            }
+        }
+
+        this->counts[component_id]--;
     }
 }
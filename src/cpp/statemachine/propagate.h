@@ -6,10 +6,15 @@
 #include "statemachine/metainfo.h"
 #include "statemachine/roleinfo.h"
 #include "statemachine/jointmove.h"
+#include "statemachine/compiled.h"
 
 #include <k273/util.h>
 #include <k273/exception.h>
 
+#include <memory>
+#include <algorithm>
+#include <vector>
+
 namespace GGPLib {
     enum Instruction : uint8_t {
             SAME_N = 0,
@@ -24,20 +29,101 @@ namespace GGPLib {
         uint8_t role_index;
 
         Instruction instruction;
-        uint16_t count;
+
+        // number of true inputs for this to be true (used by bitsliced evaluation)
+        uint16_t required_count_true;
 
         uint32_t output_index;
     };
 
+    // The read only part of the propnet.  Written to only while building (ie before
+    // recordFinalise()), and then shared between a StateMachine and all its dupes.  The only
+    // mutable per instance part of the propnet is the counts.
+    struct PropnetTopology {
+        PropnetTopology(int num_components, int total_num_outputs);
+        ~PropnetTopology();
+
+        Component* components;
+
+        // component ids, each component's outputs are terminated with -1
+        int* component_outputs;
+
+        MetaComponentInfo* metas;
+    };
+
+    // Counters collected while profiling (see StateMachine::setProfiling()).  A cascade is all
+    // the propagation from one call to updateBases()/nextState().
+    struct PropagationProfile {
+        // depth is clamped to the last bucket, cascade sizes are bucketed by log2
+        static const int DEPTH_BUCKETS = 64;
+        static const int CASCADE_BUCKETS = 32;
+
+        PropagationProfile(int num_components);
+        void clear();
+
+        void beginCascade() {
+            this->cascade_size = 0;
+        }
+
+        void endCascade();
+
+        void visit(int component_id, int depth) {
+            this->visits[component_id]++;
+            this->depths[std::min(depth, DEPTH_BUCKETS - 1)]++;
+            this->max_depth = std::max(this->max_depth, (uint64_t) depth);
+            this->cascade_size++;
+        }
+
+        // per component: number of times an input changed / number of times its value changed
+        std::vector <uint64_t> visits;
+        std::vector <uint64_t> activations;
+
+        // number of visits at each propagation depth
+        std::vector <uint64_t> depths;
+
+        // number of cascades, bucketed by log2(size + 1)
+        std::vector <uint64_t> cascades;
+
+        uint64_t cascade_count;
+        uint64_t total_visits;
+        uint64_t max_depth;
+        uint64_t max_cascade;
+
+        uint64_t cascade_size;
+    };
+
+    class BitSlicedRollouts;
+    class LazyStateMachine;
+
     class StateMachine : public StateMachineInterface {
+        // walks the topology to build its own word wide evaluation
+        friend class BitSlicedRollouts;
+
+        // splits the propnet into cones, see dupeRestricted()
+        friend class LazyStateMachine;
+
     public:
         StateMachine(int role_count, int num_bases, int num_transitions,
                      int num_components, int num_outputs, int topological_size);
         virtual ~StateMachine();
 
+    private:
+        StateMachine(int role_count, int num_bases, int num_transitions,
+                     int num_components, int num_outputs, int topological_size,
+                     std::shared_ptr <PropnetTopology> topology);
+
     public:
         StateMachineInterface* dupe() const;
 
+    private:
+        // copy of this statemachine, using topology
+        StateMachine* dupeWithTopology(std::shared_ptr <PropnetTopology> topology) const;
+
+        // copy of this statemachine (with its own topology), where only the components marked in
+        // keep propagate.  keep must include all the inputs of any component it includes.  The
+        // counts of everything else are left as is, and never change.
+        StateMachine* dupeRestricted(const std::vector <bool>& keep) const;
+
     public:
         // this is factory/build stuff:
 
@@ -45,11 +131,51 @@ namespace GGPLib {
         void setComponent(int component_id, int required_count_false, int required_count_true,
                           int output_index, int number_outputs, int initial_count, int incr, int topological_order);
         void setOutput(int output_index, int component_id);
+        void setOutputs(const int* component_ids, int count);
         void recordFinalise(int control_flows, int terminal_index);
 
         void setMetaInformation(int component_id, const std::string& component_type,
                                 const std::string& gdl, const std::string& move, int goal_value);
 
+        // switch propagation to generated code for this propnet (shared with dupes).  Returns
+        // false if compiled doesn't match.
+        bool setCompiled(const CompiledPropnet* compiled);
+
+        // FNV-1a (a 32 bit word at a time) over each component's instruction, role index and
+        // outputs (terminated by -1).  Must match Topology.hash() in ggplib/statemachine/compiled.py.
+        uint64_t topologyHash() const;
+
+        // turns on/off collection of propagation counters (off by default, and not copied by
+        // dupe()).  Turning it on clears any previous counters.  While profiling, propagation
+        // always goes via the (slower) profiled interpreter, even if compiled is set.
+        void setProfiling(bool enabled);
+        const PropagationProfile* getProfile() const {
+            return this->profile;
+        }
+
+        const MetaComponentInfo* getMeta(int component_id) const {
+            ASSERT (component_id >= 0 && component_id < this->num_components);
+            return this->metas + component_id;
+        }
+
+        int getNumComponents() const {
+            return this->num_components;
+        }
+
+        // zobrist hashing (see StateMachineInterface).  The keys are generated from a fixed seed,
+        // so hashes are the same across dupes and processes.
+        bool setZobristHashing(bool enabled);
+
+        uint64_t getCurrentHash() const {
+            return this->current_hash;
+        }
+
+        uint64_t getNextHash() const {
+            return this->next_hash;
+        }
+
+        uint64_t zobristHash(const BaseState* bs) const;
+
     public:
         // this is the interface implementation:
 
@@ -68,6 +194,7 @@ namespace GGPLib {
         bool isTerminal() const;
         void nextState(const JointMove* move, BaseState* bs);
         int getGoalValue(int role_index);
+        void getGoalValues(int* values);
 
         void reset();
         int getRoleCount() const {
@@ -75,8 +202,23 @@ namespace GGPLib {
         }
 
     private:
-        void propagate(Component* component, bool value) {
-           Component** pt_output = this->component_outputs + component->output_index;
+        void propagate(int component_id, bool value) {
+           if (unlikely(this->profile != nullptr)) {
+               this->profiledPropagate(component_id, value);
+               return;
+           }
+
+           if (this->compiled != nullptr) {
+               if (value) {
+                   this->compiled->propagate_true(&this->compiled_ctx, component_id);
+               } else {
+                   this->compiled->propagate_false(&this->compiled_ctx, component_id);
+               }
+
+               return;
+           }
+
+           const int* pt_output = this->component_outputs + this->components[component_id].output_index;
            if (value) {
                this->forwardPropagateValueP(pt_output);
            } else {
@@ -84,20 +226,20 @@ namespace GGPLib {
            }
         }
 
-        void forwardPropagateValueP1(Component** pt_output) {
+        void forwardPropagateValueP1(int component_id) {
             // CONSTRAINT: only called if propagation is required
-            Component* component = *pt_output;
-            component->count++;
-            if (unlikely(component->count == 0)) {
+            uint16_t count = ++this->counts[component_id];
+            if (unlikely(count == 0)) {
+                const Component* component = this->components + component_id;
                 switch (component->instruction) {
                 case Instruction::SAME_N:
                     this->forwardPropagateValueP(this->component_outputs + component->output_index);
                     break;
                 case Instruction::TRIGGER_LEGAL:
-                    this->triggerPropagateLegalP(component);
+                    this->triggerPropagateLegalP(component_id);
                     break;
                 case Instruction::TRIGGER_TRANSITION:
-                    this->triggerPropagateTransitionP(component);
+                    this->triggerPropagateTransitionP(component_id);
                     break;
                 case Instruction::INVERT_N:
                     this->forwardPropagateValueN(this->component_outputs + component->output_index);
@@ -108,20 +250,19 @@ namespace GGPLib {
             }
         }
 
-        void forwardPropagateValueN1(Component** pt_output) {
+        void forwardPropagateValueN1(int component_id) {
             // CONSTRAINT: only called if propagation is required
-            Component* component = *pt_output;
-
-            if (unlikely(component->count == 0)) {
+            if (unlikely(this->counts[component_id] == 0)) {
+                const Component* component = this->components + component_id;
                 switch (component->instruction) {
                 case Instruction::SAME_N:
                     this->forwardPropagateValueN(this->component_outputs + component->output_index);
                     break;
                 case Instruction::TRIGGER_LEGAL:
-                    this->triggerPropagateLegalN(component);
+                    this->triggerPropagateLegalN(component_id);
                     break;
                 case Instruction::TRIGGER_TRANSITION:
-                    this->triggerPropagateTransitionN(component);
+                    this->triggerPropagateTransitionN(component_id);
                     break;
                 case Instruction::INVERT_N:
                     this->forwardPropagateValueP(this->component_outputs + component->output_index);
@@ -131,17 +272,22 @@ namespace GGPLib {
                 }
             }
 
-            component->count--;
+            this->counts[component_id]--;
         }
 
         // important: DONT inline these
-        void triggerPropagateLegalP(Component* component);
-        void triggerPropagateLegalN(Component* component);
-        void triggerPropagateTransitionP(Component* component);
-        void triggerPropagateTransitionN(Component* component);
+        void triggerPropagateLegalP(int component_id);
+        void triggerPropagateLegalN(int component_id);
+        void triggerPropagateTransitionP(int component_id);
+        void triggerPropagateTransitionN(int component_id);
 
-        void forwardPropagateValueP(Component** pt_output);
-        void forwardPropagateValueN(Component** pt_output);
+        void forwardPropagateValueP(const int* pt_output);
+        void forwardPropagateValueN(const int* pt_output);
+
+        // same as the above, but counting into profile
+        void profiledPropagate(int component_id, bool value);
+        void profiledPropagateValueP(const int* pt_output, int depth);
+        void profiledPropagateValueN(const int* pt_output, int depth);
 
     private:
         const int role_count;
@@ -163,9 +309,26 @@ namespace GGPLib {
 
         // XXX test/replace this with a vector
         RoleInfo roles[MAX_NUMBER_PLAYERS];
-        MetaComponentInfo* metas;
 
-        Component* components;
-        Component** component_outputs;
+        // shared with dupes (the pointers below are into topology, and are cached for speed)
+        std::shared_ptr <PropnetTopology> topology;
+        const MetaComponentInfo* metas;
+        const Component* components;
+        const int* component_outputs;
+
+        // per instance
+        uint16_t* counts;
+
+        // optional generated propagation, counts/transition_state/legals are shared with it
+        const CompiledPropnet* compiled;
+        CompiledContext compiled_ctx;
+
+        // optional, per instance
+        PropagationProfile* profile;
+
+        // optional zobrist hashing, empty keys if disabled
+        std::vector <uint64_t> zobrist_keys;
+        uint64_t current_hash;
+        uint64_t next_hash;
     };
 }
@@ -39,5 +39,44 @@ namespace GGPLib {
 
         virtual void reset() = 0;
         virtual int getRoleCount() const = 0;
+
+    public:
+        // the goal values of all the roles at once (values must have room for getRoleCount()),
+        // so that statemachines with a separate goal network only sync it once
+        virtual void getGoalValues(int* values) {
+            for (int ii=0; ii<this->getRoleCount(); ii++) {
+                values[ii] = this->getGoalValue(ii);
+            }
+        }
+
+        // optional cache of getGoalValues() keyed on the current state (see GoalCache), for
+        // statemachines with a separate goal network.  size of 0 removes the cache.  Returns
+        // false if not supported.
+        virtual bool setGoalCache(int size) {
+            return false;
+        }
+
+    public:
+        // optional 64 bit zobrist hashing of states (not supported by default).  When enabled, the
+        // hash of the current state is maintained incrementally by updateBases(), and nextState()
+        // computes the hash of the state it writes.  Returns false if not supported.
+        virtual bool setZobristHashing(bool enabled) {
+            return false;
+        }
+
+        // the zobrist hash of the current state, 0 if not enabled
+        virtual uint64_t getCurrentHash() const {
+            return 0;
+        }
+
+        // the zobrist hash of the state written by the last nextState(), 0 if not enabled
+        virtual uint64_t getNextHash() const {
+            return 0;
+        }
+
+        // computes the zobrist hash of bs from scratch, 0 if not enabled
+        virtual uint64_t zobristHash(const BaseState* bs) const {
+            return 0;
+        }
     };
 }
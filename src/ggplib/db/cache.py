@@ -0,0 +1,101 @@
+''' Cache of the builds for games not in the database (see lookup.by_gdl()).
+
+    Each game is a directory of games/_cache, named by the hash of its gdl (normalised, so
+    whitespace and comments don't matter).  It holds the same as a game in the database would
+    (sm_info.json and the statemachine descriptions, see builder.build_sm()) along with the
+    propnet file, so the propnet isn't converted again either.
+
+    Least recently used entries are evicted once the cache is over MAX_CACHE_BYTES. '''
+
+import os
+import shutil
+import hashlib
+
+from ggplib.util import log
+from ggplib.util.symbols import tokenize
+
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+CACHE_DIRECTORY = "_cache"
+
+
+def normalise(gdl_str):
+    ' strips comments and whitespace '
+    lines = []
+    for line in gdl_str.splitlines():
+        line = line.split(";")[0].strip()
+        if line:
+            lines.append(line)
+
+    return " ".join(tokenize(" ".join(lines)))
+
+
+def gdl_hash(gdl_str):
+    return hashlib.sha1(normalise(gdl_str)).hexdigest()
+
+
+def directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, fn))
+            except OSError:
+                pass
+    return total
+
+
+class BuildCache:
+    def __init__(self, games_store, max_bytes=MAX_CACHE_BYTES):
+        self.store = games_store.get_directory(CACHE_DIRECTORY, create=True)
+        self.max_bytes = max_bytes
+
+    def get_store(self, gdl_str):
+        ' the DirectoryStore for gdl_str (created if need be), marked as most recently used '
+        name = gdl_hash(gdl_str)
+        the_game_store = self.store.get_directory(name, create=True)
+
+        # the directory mtime is the last time it was used
+        os.utime(the_game_store.path, None)
+        return the_game_store
+
+    def remove(self, gdl_str):
+        name = gdl_hash(gdl_str)
+        shutil.rmtree(os.path.join(self.store.path, name), ignore_errors=True)
+        self.store.cached.pop(name, None)
+
+    def is_built(self, the_game_store):
+        return the_game_store.file_exists("sm_info.json")
+
+    def entries(self):
+        ' (last used, size, name), least recently used first '
+        result = []
+        for name in self.store.listdir():
+            path = os.path.join(self.store.path, name)
+            if os.path.isdir(path):
+                result.append((os.path.getmtime(path), directory_size(path), name))
+        result.sort()
+        return result
+
+    def evict(self, keep=None):
+        ''' removes the least recently used entries until under max_bytes.  keep is a DirectoryStore
+            not to remove (the one being used).  Returns the number removed. '''
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        count = 0
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+
+            path = os.path.join(self.store.path, name)
+            if keep is not None and os.path.abspath(path) == keep.path:
+                continue
+
+            log.info("Evicting %s from build cache (%d bytes)" % (name, size))
+            shutil.rmtree(path, ignore_errors=True)
+            self.store.cached.pop(name, None)
+            total -= size
+            count += 1
+
+        return count
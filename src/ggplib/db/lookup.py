@@ -1,9 +1,10 @@
 import sys
+import threading
 import traceback
 
 from ggplib.util import log
 from ggplib.statemachine import builder
-from ggplib.db import signature
+from ggplib.db import signature, cache
 
 
 class GameInfo(object):
@@ -53,8 +54,23 @@ class TempGameInfo(object):
         self.sm = sm
         self.model = model
 
+        # bumped each time a faster statemachine is swapped in (see swap_sm() and
+        # Match.maybe_swap_sm())
+        self.sm_generation = 0
+        self.lock = threading.Lock()
+
     def get_sm(self):
-        return self.sm.dupe()
+        with self.lock:
+            return self.sm.dupe()
+
+    def swap_sm(self, sm):
+        ' takes ownership of sm, from builder.StateMachineUpgrade '
+        from ggplib import interface
+        with self.lock:
+            old_sm, self.sm = self.sm, sm
+            self.sm_generation += 1
+
+        interface.dealloc_statemachine(old_sm)
 
 
 class GameInfoBypass(GameInfo):
@@ -271,6 +287,57 @@ def get_all_game_names():
     return get_database().all_games
 
 
+# games not in the database return the standard statemachine straight away, and swap in a faster
+# one when built (see builder.build_sm_tiered())
+TIERED_BUILD = True
+
+# and their builds are cached (see ggplib.db.cache)
+USE_BUILD_CACHE = True
+
+the_build_cache = None
+
+
+def get_build_cache():
+    global the_build_cache
+    if the_build_cache is None:
+        the_build_cache = cache.BuildCache(get_database(verbose=False).games_store)
+    return the_build_cache
+
+
+def build_not_in_database(gdl_str):
+    the_game_store = None
+    if USE_BUILD_CACHE:
+        try:
+            build_cache = get_build_cache()
+            the_game_store = build_cache.get_store(gdl_str)
+            if build_cache.is_built(the_game_store):
+                log.info("Found game in build cache: %s" % the_game_store)
+                model, sm = builder.build_sm(gdl_str, the_game_store=the_game_store)
+                return TempGameInfo("unknown", gdl_str, sm, model)
+
+            build_cache.evict(keep=the_game_store)
+
+        except Exception as exc:
+            log.error("Build cache failed: %s" % exc)
+            log.error(traceback.format_exc())
+            the_game_store = None
+
+    if not TIERED_BUILD:
+        model, sm = builder.build_sm(gdl_str,
+                                     the_game_store=the_game_store,
+                                     add_to_game_store=the_game_store is not None,
+                                     store_propnet=True)
+        return TempGameInfo("unknown", gdl_str, sm, model)
+
+    model, sm, upgrade = builder.build_sm_tiered(gdl_str, the_game_store=the_game_store)
+    info = TempGameInfo("unknown", gdl_str, sm, model)
+    upgrade.start(info.swap_sm)
+
+    # for the curious (and tests)
+    info.upgrade = upgrade
+    return info
+
+
 # XXX build_sm not used.
 def by_name(name, build_sm=True):
     try:
@@ -309,6 +376,4 @@ def by_gdl(gdl):
         # creates temporary files
         log.error("Lookup failed: %s" % exc)
 
-        model, sm = builder.build_sm(gdl)
-        info = TempGameInfo("unknown", gdl, sm, model)
-        return None, info
+        return None, build_not_in_database(gdl_str)
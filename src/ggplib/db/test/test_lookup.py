@@ -1,3 +1,4 @@
+import os
 import pdb
 import sys
 import traceback
@@ -10,6 +11,7 @@ from ggplib.db import lookup, signature
 from ggplib.db.helper import get_gdl_for_game, lookup_all_games
 
 from ggplib import interface
+from ggplib.propnet import getpropnet
 from ggplib.statemachine.depthcharges import depth_charges
 
 
@@ -66,7 +68,11 @@ def test_with_database():
 
 
 
-def test_not_in_database():
+def test_not_in_database(monkeypatch):
+    # always the tiered build, and not from the build cache (see test_build_cache())
+    monkeypatch.setattr(lookup, "TIERED_BUILD", True)
+    monkeypatch.setattr(lookup, "USE_BUILD_CACHE", False)
+
     some_simple_game = """
   (role white)
   (role black)
@@ -101,6 +107,94 @@ def test_not_in_database():
     rollouts_per_second = (rollouts / float(msecs_taken)) * 1000
     log.info("c++ rollouts per second %.2f" % rollouts_per_second)
 
+    # the faster statemachine is swapped in once built (and sm still works)
+    assert info.upgrade.join(60)
+    assert info.upgrade.preferred is not None
+    assert info.sm_generation == 1
+
+    # built in a temporary directory, which is removed afterwards
+    assert not os.path.exists(info.upgrade.the_game_store.path)
+
+    new_sm = info.get_sm()
+    assert new_sm.get_initial_state() == sm.get_initial_state()
+    interface.depth_charge(new_sm, 1)
+
+    for s in sm, new_sm:
+        interface.dealloc_statemachine(s)
+
+
+def test_build_cache(monkeypatch):
+    from ggplib.db import cache
+    from ggplib.db.store import DirectoryStore
+    assert (cache.gdl_hash("(role white) ; white\n  (role  black)\n") ==
+            cache.gdl_hash("(role white)\n(role black)"))
+
+    some_simple_game = """
+  (role white)
+  (role black)
+
+  (init o1)
+
+  (legal white a)
+  (legal white b)
+  (legal black a)
+
+  (<= (next o2) (does white a) (true o1))
+  (<= (next o3) (does white b) (true o1))
+
+  (<= (goal white 0) (true o1))
+  (<= (goal white 20) (true o2))
+  (<= (goal white 80) (true o3))
+
+  (<= (goal black 0) (true o1))
+  (<= (goal black 80) (true o2))
+  (<= (goal black 20) (true o3))
+
+  (<= terminal (true o2))
+  (<= terminal (true o3))
+    """
+
+    build_cache = lookup.get_build_cache()
+    build_cache.remove(some_simple_game)
+
+    # as left by a build that died before writing sm_info.json
+    the_game_store = build_cache.get_store(some_simple_game)
+    for fn in ("goalless_sm.json", "goalless_sm.bin", "combined_sm.json", "combined_sm.bin"):
+        the_game_store.save_contents(fn, "partial")
+    assert not build_cache.is_built(the_game_store)
+
+    _, info = lookup.by_gdl(some_simple_game)
+    if lookup.TIERED_BUILD:
+        assert info.upgrade.join(60)
+
+    the_game_store = build_cache.get_store(some_simple_game)
+    assert the_game_store.file_exists("propnet.bin" if getpropnet.USE_BINARY else "propnet.py")
+    assert build_cache.is_built(the_game_store)
+
+    # second time around comes straight from the cache - no conversion, and nothing written
+    def mtimes():
+        return dict((fn, os.stat(os.path.join(the_game_store.path, fn)).st_mtime)
+                    for fn in the_game_store.listdir("*"))
+
+    def must_not_be_called(*args, **kwds):
+        assert False, "cached game was converted/written again"
+
+    before = mtimes()
+    monkeypatch.setattr(getpropnet, "run_convert", must_not_be_called)
+    monkeypatch.setattr(DirectoryStore, "save_contents", must_not_be_called)
+
+    _, cached_info = lookup.by_gdl(some_simple_game)
+    assert not hasattr(cached_info, "upgrade")
+    assert mtimes() == before
+    monkeypatch.undo()
+
+    sm, cached_sm = info.get_sm(), cached_info.get_sm()
+    assert sm.get_initial_state() == cached_sm.get_initial_state()
+    for s in sm, cached_sm:
+        interface.dealloc_statemachine(s)
+
+    build_cache.remove(some_simple_game)
+
 
 # this could be potentially super slow first time around
 @pytest.mark.slow
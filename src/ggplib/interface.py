@@ -1,75 +1,94 @@
 import os
-from cffi import FFI
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from ggplib.util import log
+from ggplib import interface_build
 
 # get the path
-d = os.path.dirname
-ggplib_local_path = os.path.join(d(d(os.path.abspath(__file__))), "cpp")
+ggplib_local_path = interface_build.ggplib_local_path
 
 
 def get_lib():
+    ''' loads the prebuilt extension module (see ggplib.interface_build), falling back to
+        ffi.verify() if it hasn't been built or interface.h is newer. '''
+    try:
+        from ggplib import _interface
+    except ImportError:
+        _interface = None
+
+    if _interface is not None:
+        header = os.path.join(ggplib_local_path, "interface.h")
+        if not interface_build.is_stale(_interface.__file__, header):
+            return _interface.ffi, _interface.lib
 
-    def process_line(line):
-        # pre-process a line.  Skip any lines with comments.  Replace strings in remap.
-        if "//" in line:
-            return line
-        remap = {
-            "StateMachine*" : "void*",
-            "BaseState*" : "void*",
-            "LegalState*" : "void*",
-            "JointMove*" : "void*",
-            "boolean" : "int",
-            "PlayerBase*" : "void*",
-            "DepthChargeTest*" : "void*",
-        }
-
-        for k, v in remap.items():
-            if k in line:
-                line = line.replace(k, v)
-                line = line.rstrip()
-        return line
-
-    def get_lines(filename):
-        # take subset of file (since it is c++, and want only the c portion
-        emit = False
-        for line in open(filename):
-            if "CFFI START INCLUDE" in line:
-                emit = True
-            elif "CFFI END INCLUDE" in line:
-                emit = False
-            if emit:
-                line = process_line(line)
-                if line:
-                    yield line
-
-    # get ffi object, and lib object
-    ffi = FFI()
-    ffi.cdef("\n".join(get_lines(os.path.join(ggplib_local_path, "interface.h"))))
-    return ffi, ffi.verify('#include <interface.h>\n',
-                           include_dirs=[ggplib_local_path],
-                           library_dirs=[ggplib_local_path],
-                           libraries=["ggplib_cpp"])
+        log.warning("ggplib._interface is older than interface.h, using ffi.verify()")
+
+    return interface_build.verify()
 
 
 ffi, lib = get_lib()
 
 
+###############################################################################
+# buffers shared with c++ (zero copy)
+###############################################################################
+
+def new_int_buffer(*shape):
+    ' int32 buffer - a numpy array if available, otherwise a flat array.array '
+    if np is not None:
+        return np.zeros(shape, dtype=np.int32)
+
+    size = 1
+    for s in shape:
+        size *= s
+    return array('i', [0] * size)
+
+
+def int_ptr(buf):
+    ' buf must support the buffer protocol and be contiguous int32 '
+    return ffi.cast("int *", ffi.from_buffer(buf))
+
+
+def int_buffer_len(buf):
+    ' number of int32s in buf '
+    return len(ffi.from_buffer(buf)) // ffi.sizeof("int")
+
+
 ###############################################################################
 # wrappers of c++ classes
 ###############################################################################
 
+def _reverse_bits(b):
+    return int('{:08b}'.format(b)[::-1], 2)
+
+
+# to_string()/from_string() format has the bits of each byte reversed
+_REVERSE_BITS_TABLE = bytes(bytearray(_reverse_bits(b) for b in range(256)))
+
+
 class BaseState:
     def __init__(self, c_base_state):
         self.c_base_state = c_base_state
         self.length = lib.BaseState__len(self.c_base_state)
         self.num_bytes = lib.BaseState__rawBytes(self.c_base_state)
 
+        # direct access to the c++ memory.  Base i is bit (i % 8) of byte (i / 8).
+        self.data = ffi.cast("unsigned char *", lib.BaseState__data(self.c_base_state))
+        self.buffer = ffi.buffer(self.data, self.num_bytes)
+
     def get(self, index):
-        return lib.BaseState__get(self.c_base_state, index)
+        return (self.data[index >> 3] >> (index & 7)) & 1
 
     def set(self, index, value):
-        return lib.BaseState__set(self.c_base_state, index, value)
+        if value:
+            self.data[index >> 3] |= 1 << (index & 7)
+        else:
+            self.data[index >> 3] &= ~(1 << (index & 7)) & 0xff
 
     def hash_code(self):
         return lib.BaseState__hashCode(self.c_base_state)
@@ -86,19 +105,53 @@ class BaseState:
     def __eq__(self, other):
         return self.equals(other)
 
+    def as_memoryview(self):
+        ' writable view of the underlying bytes (valid until the basestate is deallocated) '
+        return memoryview(self.buffer)
+
+    def as_array(self):
+        ' writable numpy uint8 view of the underlying bytes (valid until the basestate is deallocated) '
+        if np is None:
+            raise RuntimeError("as_array() requires numpy")
+        return np.frombuffer(self.buffer, dtype=np.uint8)
+
+    def unpack(self):
+        ' returns all the bases, as a numpy bool array (or list of 0/1s if no numpy) '
+        if np is not None:
+            # np.unpackbits() is big endian within a byte (bitorder= needs a numpy without python 2)
+            bits = np.unpackbits(self.as_array()).reshape(-1, 8)[:, ::-1].ravel()
+            return bits[:self.length].astype(bool)
+
+        return [(b >> ii) & 1 for b in bytearray(self.buffer) for ii in range(8)][:self.length]
+
+    def pack(self, values):
+        ' sets all the bases from a sequence/numpy array of bools '
+        assert len(values) == self.length
+        if np is not None:
+            bits = np.zeros(self.num_bytes * 8, dtype=bool)
+            bits[:self.length] = np.asarray(values, dtype=bool)
+            self.as_array()[:] = np.packbits(bits.reshape(-1, 8)[:, ::-1].ravel())
+            return
+
+        buf = bytearray(self.num_bytes)
+        for ii, v in enumerate(values):
+            if v:
+                buf[ii >> 3] |= 1 << (ii & 7)
+        self.buffer[:] = bytes(buf)
+
     def to_list(self):
         ' helper '
-        return [self.get(i) for i in range(self.length)]
+        return [int(v) for v in self.unpack()]
 
     def from_list(self, state):
         ' helper '
-        [self.set(i, v) for i, v in enumerate(state)]
+        self.pack(state)
 
     def to_string(self):
-        return ffi.unpack(lib.BaseState__raw(self.c_base_state), self.num_bytes)
+        return bytes(self.buffer).translate(_REVERSE_BITS_TABLE)
 
     def from_string(self, raw_str):
-        lib.BaseState__setRaw(self.c_base_state, raw_str)
+        self.buffer[:] = raw_str[:self.num_bytes].translate(_REVERSE_BITS_TABLE)
 
 
 def dealloc_basestate(s):
@@ -118,9 +171,20 @@ class LegalState:
     def get_legal(self, index):
         return lib.LegalState__getLegal(self.c_legal_state, index)
 
+    def contains(self, value):
+        ' is value (a legal index, as per get_legal()) currently legal '
+        return bool(lib.LegalState__contains(self.c_legal_state, value))
+
+    def copy_legals(self, buf):
+        ' copies the legals into the int32 buffer buf (in one call).  Returns the number of legals. '
+        return lib.LegalState__copyLegals(self.c_legal_state, int_ptr(buf), int_buffer_len(buf))
+
     def to_list(self):
         ' helper '
-        return [self.get_legal(i) for i in range(self.get_count())]
+        count = self.get_count()
+        buf = ffi.new("int[]", count)
+        lib.LegalState__copyLegals(self.c_legal_state, buf, count)
+        return list(buf)
 
 
 ###############################################################################
@@ -148,6 +212,12 @@ class StateMachine:
         self.c_statemachine = c_statemachine
         self._roles = roles
 
+        # grown on demand in get_all_legals()
+        self._legals_capacity = 64
+
+        # built on demand in get_move_lookup()
+        self._move_lookup = None
+
         # initial state has to be set here on c_statemachine
         self.reset()
 
@@ -173,10 +243,42 @@ class StateMachine:
     def get_legal_state(self, role_index):
         return LegalState(lib.StateMachine__getLegalState(self.c_statemachine, role_index))
 
+    def get_all_legals(self, offsets=None, indices=None):
+        ''' returns the legals of every role (in one call), packed as int32 buffers (offsets,
+            indices).  The legals for role_index are indices[offsets[role_index]:offsets[role_index + 1]].
+            If indices is passed in, it must be big enough to hold all the legals. '''
+
+        if offsets is None:
+            offsets = new_int_buffer(len(self._roles) + 1)
+        assert int_buffer_len(offsets) >= len(self._roles) + 1
+
+        allocated = indices is None
+        if allocated:
+            indices = new_int_buffer(self._legals_capacity)
+
+        size = int_buffer_len(indices)
+        total = lib.StateMachine__getAllLegals(self.c_statemachine, int_ptr(offsets), int_ptr(indices), size)
+
+        if total > size:
+            assert allocated, "indices buffer too small, requires %d" % total
+            self._legals_capacity = total
+            return self.get_all_legals(offsets=offsets)
+
+        return offsets, indices
+
     def legal_to_move(self, role_index, choice):
         c_charstar = lib.StateMachine__legalToMove(self.c_statemachine, role_index, choice)
         return ffi.string(c_charstar)
 
+    def get_move_lookup(self, actions):
+        ''' returns a dict per role of move -> legal index (the reverse of legal_to_move()).  actions
+            are StateMachineModel.actions, which give the number of legals of each role.  Built
+            once (from the metas of the statemachine). '''
+        if self._move_lookup is None:
+            self._move_lookup = [dict((self.legal_to_move(ri, ii), ii) for ii in range(len(role_actions)))
+                                 for ri, role_actions in enumerate(actions)]
+        return self._move_lookup
+
     def is_terminal(self):
         return lib.StateMachine__isTerminal(self.c_statemachine)
 
@@ -192,28 +294,135 @@ class StateMachine:
     def get_goal_value(self, role_index):
         return lib.StateMachine__getGoalValue(self.c_statemachine, role_index)
 
+    def get_goal_values(self, values=None):
+        ''' returns the goal values of every role (in one call), as an int32 buffer.  If values is
+            passed in, it must have room for all the roles. '''
+        if values is None:
+            values = new_int_buffer(len(self._roles))
+        assert int_buffer_len(values) >= len(self._roles)
+
+        lib.StateMachine__getGoalValues(self.c_statemachine, int_ptr(values))
+        return values
+
+    def set_goal_cache(self, size):
+        ''' caches the goal values of up to size states (0 removes the cache).  Only for
+            statemachines with a separate goal statemachine, returns False if not supported. '''
+        return bool(lib.StateMachine__setGoalCache(self.c_statemachine, size))
+
     def get_current_state(self, bs=None):
         if bs is None:
             bs = self.new_base_state()
         lib.StateMachine__getCurrentState(self.c_statemachine, bs.c_base_state)
         return bs
 
+    def set_zobrist_hashing(self, enabled=True):
+        ''' turns on/off incremental 64 bit zobrist hashing.  Returns False if not supported. '''
+        return bool(lib.StateMachine__setZobristHashing(self.c_statemachine, enabled))
+
+    def get_current_hash(self):
+        ' zobrist hash of the current state (maintained by update_bases()) '
+        return lib.StateMachine__getCurrentHash(self.c_statemachine)
+
+    def get_next_hash(self):
+        ' zobrist hash of the state written by the last next_state() '
+        return lib.StateMachine__getNextHash(self.c_statemachine)
+
+    def zobrist_hash(self, base_state):
+        ' zobrist hash of base_state, computed from scratch '
+        return lib.StateMachine__zobristHash(self.c_statemachine, base_state.c_base_state)
+
+    def set_profiling(self, enabled=True):
+        ''' turns on/off the propagation counters (propnet statemachines only).  Enabling clears
+            the counters.  Returns False if not supported. '''
+        return bool(lib.StateMachine__setProfiling(self.c_statemachine, enabled))
+
+    def get_profile(self):
+        ''' returns the propagation counters as a PropagationProfile, or None if not profiling '''
+        counters = []
+        for which in range(len(PropagationProfile.COUNTERS)):
+            size = lib.StateMachine__getProfileCounters(self.c_statemachine, which, ffi.NULL, 0)
+            if size < 0:
+                return None
+
+            buf = ffi.new("long long[]", size)
+            lib.StateMachine__getProfileCounters(self.c_statemachine, which, buf, size)
+            if np is not None:
+                counters.append(np.frombuffer(ffi.buffer(buf), dtype=np.int64).copy())
+            else:
+                counters.append(list(buf))
+
+        return PropagationProfile(*counters)
+
+    def get_component_info(self, component_id):
+        ' returns (type, gdl) from the metas of a propnet statemachine '
+        return (ffi.string(lib.StateMachine__getComponentType(self.c_statemachine, component_id)),
+                ffi.string(lib.StateMachine__getComponentGdl(self.c_statemachine, component_id)))
+
+
+class PropagationProfile(object):
+    ''' counters from StateMachine.get_profile().  A cascade is all the propagation done by one
+        update_bases()/next_state() (and the retraction of the last move in reset()).
+
+          visits      : per component, the number of times one of its inputs changed
+          activations : per component, the number of times its value changed
+          depths      : number of visits at each propagation depth (the last is everything deeper)
+          cascades    : number of cascades bucketed by log2(size + 1), where size is visits '''
+
+    COUNTERS = "visits activations depths cascades summary".split()
+
+    def __init__(self, visits, activations, depths, cascades, summary):
+        self.visits = visits
+        self.activations = activations
+        self.depths = depths
+        self.cascades = cascades
+        (self.cascade_count, self.total_visits,
+         self.max_depth, self.max_cascade) = [int(x) for x in summary]
+
+    def hottest(self, count=20):
+        ' returns [(visits, activations, component_id), ...] for the most visited components '
+        hot = sorted(((int(v), int(a), cid)
+                      for cid, (v, a) in enumerate(zip(self.visits, self.activations)) if v),
+                     reverse=True)
+        return hot[:count]
+
 
 ###############################################################################
 
+def _wrap_statemachine(c_statemachine, roles):
+    ' the c++ creates return NULL on failure (bad description/file) '
+    if c_statemachine == ffi.NULL:
+        return None
+    return StateMachine(c_statemachine, roles)
+
+
 def create_statemachine(buf, roles):
     c_statemachine = lib.createStateMachineFromJSON(buf, len(buf))
-    return StateMachine(c_statemachine, roles)
+    return _wrap_statemachine(c_statemachine, roles)
 
 
 def create_goalless_statemachine(buf, roles):
     c_statemachine = lib.createGoallessStateMachineFromJSON(buf, len(buf))
-    return StateMachine(c_statemachine, roles)
+    return _wrap_statemachine(c_statemachine, roles)
 
 
 def create_combined_statemachine(buf, roles):
     c_statemachine = lib.createCombinedStateMachineFromJSON(buf, len(buf))
-    return StateMachine(c_statemachine, roles)
+    return _wrap_statemachine(c_statemachine, roles)
+
+
+def create_statemachine_from_binary(filename, roles):
+    c_statemachine = lib.createStateMachineFromBinary(filename)
+    return _wrap_statemachine(c_statemachine, roles)
+
+
+def create_goalless_statemachine_from_binary(filename, roles):
+    c_statemachine = lib.createGoallessStateMachineFromBinary(filename)
+    return _wrap_statemachine(c_statemachine, roles)
+
+
+def create_combined_statemachine_from_binary(filename, roles):
+    c_statemachine = lib.createCombinedStateMachineFromBinary(filename)
+    return _wrap_statemachine(c_statemachine, roles)
 
 
 def dealloc_statemachine(sm):
@@ -288,16 +497,94 @@ class Logging:
 
 ###############################################################################
 
-def depth_charge(sm, seconds):
+def depth_charge(sm, seconds, num_workers=0):
+    ''' returns (msecs_taken, rollouts, num_state_changes).  If num_workers is set, runs on
+        num_workers threads each with its own dupe() of sm and returns the aggregate, with a 4th
+        element - the list of (msecs_taken, rollouts, num_state_changes) per thread. '''
     c_obj = lib.DepthChargeTest__create(sm.c_statemachine)
-    lib.DepthChargeTest__doRollouts(c_obj, seconds)
+    if num_workers:
+        lib.DepthChargeTest__doRolloutsThreaded(c_obj, seconds, num_workers)
+    else:
+        lib.DepthChargeTest__doRollouts(c_obj, seconds)
+
     msecs = lib.DepthChargeTest__getResult(c_obj, 0)
     rollouts = lib.DepthChargeTest__getResult(c_obj, 1)
     num_state_changes = lib.DepthChargeTest__getResult(c_obj, 2)
 
+    result = msecs, rollouts, num_state_changes
+    if num_workers:
+        workers = [tuple(lib.DepthChargeTest__getWorkerResult(c_obj, ii, jj) for jj in range(3))
+                   for ii in range(lib.DepthChargeTest__getNumWorkers(c_obj))]
+        result += (workers,)
+
     lib.DepthChargeTest__delete(c_obj)
+    return result
 
-    return msecs, rollouts, num_state_changes
+
+class BatchRollouts:
+    ''' runs depth charges in c++ from a given state, filling caller provided buffers.  Keeps the
+        underlying c++ object (and its random number generator) around between calls.
+
+        With bitsliced=True, propnet statemachines evaluate 64 rollouts at once (one per bit of a
+        word, see statemachine/bitsliced.h).  Standard and goalless statemachines are supported
+        (the latter does the rollouts on the goalless network, and the goals on the goal network).
+        Falls back to one rollout at a time for combined statemachines, or if sm does not
+        support it. '''
+
+    def __init__(self, sm, bitsliced=False):
+        self.role_count = len(sm.get_roles())
+
+        self.bitsliced = False
+        if bitsliced:
+            self.c_obj = lib.BitSlicedRollouts__create(sm.c_statemachine)
+            if self.c_obj != ffi.NULL:
+                self.bitsliced = True
+            else:
+                log.warning("BatchRollouts: bitsliced not supported for statemachine")
+
+        if not self.bitsliced:
+            self.c_obj = lib.DepthChargeTest__create(sm.c_statemachine)
+
+    def run(self, base_state, count, scores=None, depths=None):
+        ''' fills scores (count * role_count goal values) and depths (count moves played).  If
+            scores/depths are not passed in, they are allocated via new_int_buffer().  Returns
+            (scores, depths). '''
+        if scores is None:
+            scores = new_int_buffer(count, self.role_count)
+
+        if depths is None:
+            depths = new_int_buffer(count)
+
+        assert len(ffi.from_buffer(scores)) >= count * self.role_count * ffi.sizeof("int")
+        assert len(ffi.from_buffer(depths)) >= count * ffi.sizeof("int")
+
+        fn = (lib.BitSlicedRollouts__doBatchRollouts if self.bitsliced
+              else lib.DepthChargeTest__doBatchRollouts)
+        fn(self.c_obj, base_state.c_base_state, count, int_ptr(scores), int_ptr(depths))
+        return scores, depths
+
+    def get_result(self):
+        ''' returns msecs_taken, rollouts, num_state_changes - accumulated over all calls to
+            run() '''
+        fn = lib.BitSlicedRollouts__getResult if self.bitsliced else lib.DepthChargeTest__getResult
+        return tuple(fn(self.c_obj, ii) for ii in range(3))
+
+
+def dealloc_batch_rollouts(batch):
+    if batch.bitsliced:
+        lib.BitSlicedRollouts__delete(batch.c_obj)
+    else:
+        lib.DepthChargeTest__delete(batch.c_obj)
+    batch.c_obj = None
+
+
+def depth_charge_batch(sm, base_state, count, scores=None, depths=None, bitsliced=False):
+    ''' one shot version of BatchRollouts.run() '''
+    batch = BatchRollouts(sm, bitsliced=bitsliced)
+    try:
+        return batch.run(base_state, count, scores=scores, depths=depths)
+    finally:
+        dealloc_batch_rollouts(batch)
 
 
 ###############################################################################
@@ -325,6 +612,25 @@ class CppStateMachines(object):
         c_statemachine = c_fn(sz)
         return StateMachine(c_statemachine, roles)
 
+    def get_compiled(self, sm, filename):
+        ''' returns a dupe of the propnet statemachine sm, which propagates using the shared object
+            filename (see ggplib.statemachine.compiled).  sm must be a standard statemachine (not
+            goalless/combined). '''
+        compiled_sm = sm.dupe()
+        ok = lib.StateMachine__setCompiled(compiled_sm.c_statemachine, filename)
+        if not ok:
+            dealloc_statemachine(compiled_sm)
+        assert ok, "Failed to load compiled statemachine %s (or not a standard statemachine)" % filename
+        return compiled_sm
+
+    def get_lazy(self, sm):
+        ''' returns a new statemachine for the propnet statemachine sm, which only propagates the
+            legals/terminal/goals when they are queried.  Returns None if not supported. '''
+        c_statemachine = lib.StateMachine__createLazy(sm.c_statemachine)
+        if c_statemachine == ffi.NULL:
+            return None
+        return StateMachine(c_statemachine, sm.get_roles())
+
 
 ###############################################################################
 
@@ -0,0 +1,93 @@
+''' Out of line (API mode) build of the cffi interface to libggplib_cpp.so.
+
+    Run once after building the c++ library (make cffi in src/cpp, or python -m
+    ggplib.interface_build).  This creates the extension module ggplib._interface, which
+    ggplib.interface then imports directly - no parsing of interface.h, and no compiler, at
+    import time.  If the extension hasn't been built (or interface.h has changed since),
+    ggplib.interface falls back to ffi.verify() (see verify()). '''
+
+import os
+
+from cffi import FFI
+
+d = os.path.dirname
+src_path = d(d(os.path.abspath(__file__)))
+ggplib_local_path = os.path.join(src_path, "cpp")
+
+MODULE_NAME = "ggplib._interface"
+
+# the c++ types are all opaque to python
+REMAP = {
+    "StateMachine*" : "void*",
+    "BaseState*" : "void*",
+    "LegalState*" : "void*",
+    "JointMove*" : "void*",
+    "boolean" : "int",
+    "PlayerBase*" : "void*",
+    "DepthChargeTest*" : "void*",
+    "BitSlicedRollouts*" : "void*",
+}
+
+
+def process_line(line, remap):
+    # pre-process a line.  Skip any lines with comments.  Replace strings in remap.
+    if "//" in line:
+        return line
+
+    for k, v in remap.items():
+        if k in line:
+            line = line.replace(k, v)
+            line = line.rstrip()
+    return line
+
+
+def get_cdef(filename, remap=REMAP):
+    ' the c portion of the header filename (between CFFI START/END INCLUDE), for ffi.cdef() '
+
+    def get_lines():
+        emit = False
+        for line in open(filename):
+            if "CFFI START INCLUDE" in line:
+                emit = True
+            elif "CFFI END INCLUDE" in line:
+                emit = False
+            if emit:
+                line = process_line(line, remap)
+                if line:
+                    yield line
+
+    return "\n".join(get_lines())
+
+
+def is_stale(module_filename, header_filename):
+    ' has the header changed since the extension module was built '
+    return os.path.getmtime(header_filename) > os.path.getmtime(module_filename)
+
+
+def get_ffi():
+    ffi = FFI()
+    ffi.cdef(get_cdef(os.path.join(ggplib_local_path, "interface.h")))
+    return ffi
+
+
+def verify():
+    ' development fallback, compiles (and caches) on the fly '
+    ffi = get_ffi()
+    return ffi, ffi.verify('#include <interface.h>\n',
+                           include_dirs=[ggplib_local_path],
+                           library_dirs=[ggplib_local_path],
+                           libraries=["ggplib_cpp"])
+
+
+def get_builder():
+    ffibuilder = get_ffi()
+    ffibuilder.set_source(MODULE_NAME, '#include <interface.h>\n',
+                          include_dirs=[ggplib_local_path],
+                          library_dirs=[ggplib_local_path],
+                          libraries=["ggplib_cpp"])
+    return ffibuilder
+
+
+if __name__ == "__main__":
+    # writes src/ggplib/_interface.so
+    get_builder().compile(tmpdir=src_path, verbose=True)
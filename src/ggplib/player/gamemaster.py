@@ -25,6 +25,9 @@ class GameMaster(object):
         self.joint_move = self.sm.get_joint_move()
         self.next_basestate = self.sm.new_base_state()
 
+        # move -> legal index, per role
+        self.move_lookup = self.sm.get_move_lookup(game_info.model.actions)
+
         # XXX we really shouldn't need to do this... why not just use model??? XXX
         def get_base_tuple(i):
             return tuple(self.symbol_factory.to_symbols(game_info.model.bases[i]))[0]
@@ -140,16 +143,10 @@ class GameMaster(object):
             new_last_move.append(move)
 
             # check the move is in the legals
-            ls = self.sm.get_legal_state(role_index)
-            choices = [ls.get_legal(ii) for ii in range(ls.get_count())]
-
-            for choice in choices:
-                choice_move = self.sm.legal_to_move(role_index, choice)
-
-                if choice_move == move:
-                    self.joint_move.set(role_index, choice)
-                    actions.append(move)
-                    break
+            choice = self.move_lookup[role_index].get(move)
+            if choice is not None and self.sm.get_legal_state(role_index).contains(choice):
+                self.joint_move.set(role_index, choice)
+                actions.append(move)
 
         assert len(actions) == len(self.matches)
         if self.verbose:
@@ -168,8 +165,9 @@ class GameMaster(object):
             log.verbose("Played to depth %d" % self.get_game_depth())
             log.verbose("Last move %s" % (last_move,))
 
+        goal_values = self.sm.get_goal_values()
         for ri, role in enumerate(self.sm.get_roles()):
-            score = self.sm.get_goal_value(ri)
+            score = int(goal_values[ri])
             self.scores[role] = score
             if self.verbose:
                 log.verbose("Final score for %s : %s " % (role, score))
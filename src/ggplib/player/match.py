@@ -20,15 +20,26 @@ class CriticalError(Exception):
 
 ###################################################################################################
 
-def replace_symbols(s, from_, to_):
-    ''' given a string s, will replace each symbol from_ -> to_. '''
-    symbols = tokenize(str(s))
-    new_symbols = []
-    for sym in symbols:
-        if sym == from_:
-            sym = to_
-        new_symbols.append(sym)
-    return " ".join(new_symbols).replace('( ', '(').replace(' )', ')')
+class SymbolTranslator(object):
+    ''' a symbol mapping (from -> to), compiled into one translation table applied to the tokens
+        of a move.  Moves repeat a lot, so translations are memoized. '''
+
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+        self.translated = {}
+
+    def __call__(self, s):
+        s = str(s)
+        try:
+            return self.translated[s]
+        except KeyError:
+            pass
+
+        mapping = self.mapping
+        new_symbols = [mapping.get(sym, sym) for sym in tokenize(s)]
+        result = " ".join(new_symbols).replace('( ', '(').replace(' )', ')')
+        self.translated[s] = result
+        return result
 
 
 ###################################################################################################
@@ -43,6 +54,13 @@ class Match:
 
         self.gdl_symbol_mapping = gdl_symbol_mapping
 
+        # gamemaster moves -> our moves, and back
+        if gdl_symbol_mapping:
+            self.to_our_symbols = SymbolTranslator(gdl_symbol_mapping)
+            self.to_gamemaster_symbols = SymbolTranslator((v, k) for k, v in gdl_symbol_mapping.items())
+        else:
+            self.to_our_symbols = self.to_gamemaster_symbols = None
+
         self.no_cleanup = no_cleanup
 
         self.match_id = match_id
@@ -67,6 +85,7 @@ class Match:
 
         # set in do_start
         self.sm = None
+        self.sm_generation = 0
         self.game_depth = 0
 
     def fast_reset(self, match_id, player, role):
@@ -94,8 +113,12 @@ class Match:
             log.debug("Match.do_start(), time = %.1f" % (end_time - enter_time))
 
         if self.sm is None:
+            self.sm_generation = getattr(self.game_info, "sm_generation", 0)
             self.sm = self.game_info.get_sm()
 
+        # move -> legal index, per role
+        self.move_lookup = self.sm.get_move_lookup(self.game_info.model.actions)
+
         self.sm.reset()
         if self.verbose:
             log.debug("Got state machine %s for game '%s' and match_id: %s" % (self.sm,
@@ -163,38 +186,28 @@ class Match:
         # get the previous state - incase our statemachine is out of sync
         self.sm.update_bases(self.get_current_state())
 
-        # fish tediously for move in available legals
+        # look up the moves, and check they are legal
         our_move = None
         preserve_move = []
         for role_index, gamemaster_move in enumerate(moves):
             move = gamemaster_move
             # map the gamemaster move
-            if self.gdl_symbol_mapping:
-                for k, v in self.gdl_symbol_mapping.items():
-                    move = replace_symbols(move, k, v)
+            if self.to_our_symbols is not None:
+                move = self.to_our_symbols(move)
 
                 if self.verbose:
                     log.debug("remapped move from '%s' -> '%s'" % (gamemaster_move, move))
 
             preserve_move.append(move)
 
-            # find the move
-            found = False
-
-            ls = self.sm.get_legal_state(role_index)
-            choices = [ls.get_legal(ii) for ii in range(ls.get_count())]
-            for choice in choices:
-                choice_move = self.sm.legal_to_move(role_index, choice)
-                if choice_move == str(move):
-                    found = True
-
-                    if role_index == self.our_role_index:
-                        our_move = choice_move
+            choice = self.move_lookup[role_index].get(str(move))
+            found = choice is not None and self.sm.get_legal_state(role_index).contains(choice)
+            assert found, move
 
-                    self.joint_move.set(role_index, choice)
-                    break
+            if role_index == self.our_role_index:
+                our_move = str(move)
 
-            assert found, move
+            self.joint_move.set(role_index, choice)
 
         assert our_move is not None
 
@@ -219,11 +232,31 @@ class Match:
         # in case player needs to cleanup some state
         self.player.on_apply_move(self.joint_move)
 
+    def maybe_swap_sm(self):
+        ''' picks up a faster statemachine from game_info, if one has been built since do_start()
+            (see lookup.TempGameInfo).  Only between moves.  The player keeps whatever it has. '''
+        generation = getattr(self.game_info, "sm_generation", 0)
+        if self.sm is None or generation == self.sm_generation:
+            return False
+
+        old_sm, self.sm = self.sm, self.game_info.get_sm()
+        self.sm_generation = generation
+        if self.verbose:
+            log.info("Swapped in statemachine %s (generation %d)" % (self.sm, generation))
+
+        self.move_lookup = self.sm.get_move_lookup(self.game_info.model.actions)
+
+        interface.dealloc_jointmove(self.joint_move)
+        self.joint_move = self.sm.get_joint_move()
+
+        self.sm.update_bases(self.get_current_state())
+        interface.dealloc_statemachine(old_sm)
+        return True
+
     def legal_to_gamemaster_move(self, index):
         m = self.sm.legal_to_move(self.our_role_index, index)
-        if self.gdl_symbol_mapping:
-            for k, v in self.gdl_symbol_mapping.items():
-                m = replace_symbols(m, v, k)
+        if self.to_gamemaster_symbols is not None:
+            m = self.to_gamemaster_symbols(m)
         return m
 
     def do_play(self, move):
@@ -231,6 +264,8 @@ class Match:
         if self.verbose:
             log.debug("do_play: %s" % (move,))
 
+        self.maybe_swap_sm()
+
         if move is not None:
             self.apply_move(move)
 
@@ -260,7 +295,7 @@ class Match:
 
         # check the move remaps and is a legal choice
         move = self.legal_to_gamemaster_move(legal_choice)
-        legal_moves = [self.legal_to_gamemaster_move(ls.get_legal(ii)) for ii in range(ls.get_count())]
+        legal_moves = [self.legal_to_gamemaster_move(ii) for ii in ls.to_list()]
         if move not in legal_moves:
             msg = "Choice was %s not in legal choices %s" % (move, legal_moves)
             log.critical(msg)
@@ -37,7 +37,7 @@ class MCSPlayer(MatchPlayer):
     sm = None
     joint_move = None
     depth_charge_state = None
-    depth_charge_joint_move = None
+    batch_rollouts = None
 
     def on_meta_gaming(self, finish_time):
         log.info("%s meta Gaming: match: %s" % (self.name, self.match.match_id))
@@ -45,17 +45,21 @@ class MCSPlayer(MatchPlayer):
 
         # get and cache fast move and legals
         self.joint_move = self.sm.get_joint_move()
-        self.depth_charge_joint_move = self.sm.get_joint_move()
         self.depth_charge_state = self.sm.new_base_state()
         self.role_count = len(self.sm.get_roles())
 
+        # depth charges are run in c++, results written straight into these buffers
+        self.batch_rollouts = interface.BatchRollouts(self.sm)
+        self.depth_charge_scores = interface.new_int_buffer(self.role_count)
+        self.depth_charge_depths = interface.new_int_buffer(1)
+
         # store the node so we can return info on move
         self.root = None
 
     def cleanup(self):
-        if self.depth_charge_joint_move:
-            interface.dealloc_jointmove(self.depth_charge_joint_move)
-            self.depth_charge_joint_move = None
+        if self.batch_rollouts:
+            interface.dealloc_batch_rollouts(self.batch_rollouts)
+            self.batch_rollouts = None
 
         if self.depth_charge_state:
             interface.dealloc_basestate(self.depth_charge_state)
@@ -70,25 +74,10 @@ class MCSPlayer(MatchPlayer):
             self.sm = None
 
     def do_depth_charge(self):
-        # performs the simplest depth charge, returning our score
-        self.sm.update_bases(self.depth_charge_state)
-
-        while True:
-            if self.sm.is_terminal():
-                break
-
-            # randomly assign move for each player
-            for idx, r in enumerate(self.sm.get_roles()):
-                ls = self.sm.get_legal_state(idx)
-                choice = ls.get_legal(random.randrange(0, ls.get_count()))
-                self.depth_charge_joint_move.set(idx, choice)
-
-            # play move
-            self.sm.next_state(self.depth_charge_joint_move, self.depth_charge_state)
-            self.sm.update_bases(self.depth_charge_state)
-
-        # we are only intereted in our score
-        return [self.sm.get_goal_value(ii) for ii in range(self.role_count)]
+        # performs the simplest depth charge, returning the scores
+        self.batch_rollouts.run(self.depth_charge_state, 1,
+                                self.depth_charge_scores, self.depth_charge_depths)
+        return [int(s) for s in self.depth_charge_scores]
 
     def select_move(self, choices, visits, all_scores):
         # here we build up a list of possible candidates, and then return one of them randomly.
@@ -128,8 +117,7 @@ class MCSPlayer(MatchPlayer):
 
         self.root = {}
 
-        ls = self.sm.get_legal_state(self.match.our_role_index)
-        our_choices = [ls.get_legal(ii) for ii in range(ls.get_count())]
+        our_choices = self.sm.get_legal_state(self.match.our_role_index).to_list()
 
         # now create some stats with depth charges
         for choice in our_choices:
@@ -162,10 +150,9 @@ class MCSPlayer(MatchPlayer):
             for idx, r in enumerate(self.sm.get_roles()):
                 if idx != self.match.our_role_index:
                     ls = self.sm.get_legal_state(idx)
-                    choices = [ls.get_legal(ii) for ii in range(ls.get_count())]
 
                     # only need to set this once :)
-                    self.joint_move.set(idx, choices[random.randrange(0, ls.get_count())])
+                    self.joint_move.set(idx, ls.get_legal(random.randrange(0, ls.get_count())))
 
             # create a new state
             self.sm.next_state(self.joint_move, self.depth_charge_state)
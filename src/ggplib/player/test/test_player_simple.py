@@ -174,3 +174,28 @@ def test_speed():
     s = time.time()
     gm.play_to_end()
     print "DONE", time.time() - s
+
+
+def test_move_lookup():
+    from ggplib.player.match import SymbolTranslator
+
+    game_info = lookup.by_name("ticTacToe")
+    sm = game_info.get_sm()
+
+    move_lookup = sm.get_move_lookup(game_info.model.actions)
+    assert len(move_lookup) == len(sm.get_roles())
+    for ri, lookup_role in enumerate(move_lookup):
+        assert len(lookup_role) == len(game_info.model.actions[ri])
+        for move, choice in lookup_role.items():
+            assert sm.legal_to_move(ri, choice) == move
+
+    # only noop is legal for oplayer at the start
+    ls = sm.get_legal_state(1)
+    assert ls.contains(move_lookup[1]["noop"])
+    assert not ls.contains(move_lookup[1]["(mark 1 1)"])
+
+    translate = SymbolTranslator(dict(mark="place", x="y"))
+    assert translate("(mark 1 1)") == "(place 1 1)"
+    assert translate("(mark 1 1)") == "(place 1 1)"
+    assert translate("(marked x)") == "(marked y)"
+    assert translate("noop") == "noop"
@@ -0,0 +1,179 @@
+''' Client for the propnet conversion server (java propnet_convert.Convert --server).
+
+    Rather than starting a jvm per rulesheet (see getpropnet.load_module()), one server is
+    started on first use and kept running, so the jvm start up and jit warm up are only paid
+    once.  Requests are lines of "kif_filename<tab>props_file" written to its stdin, and the
+    replies come back in the same order on its stdout ("OK ..." or "ERROR ...").  Several requests
+    can be in flight at once (see convert_many()).
+
+    If the server can't be started, or dies/hangs, convert() returns False and the caller falls
+    back to the one shot java command. '''
+
+import os
+import time
+import atexit
+import select
+import subprocess
+
+from ggplib.util import log
+
+SERVER_CMD = "java -XX:+UseSerialGC -Xmx8G propnet_convert.Convert --server"
+
+# per conversion, same as the one shot command
+TIMEOUT = 60
+
+# the most requests in flight
+MAX_PENDING = 16
+
+
+class ConvertServerError(Exception):
+    pass
+
+
+class ConvertServer:
+    def __init__(self, cmd=SERVER_CMD):
+        log.debug("Starting conversion server: %s" % cmd)
+
+        # stderr is left alone, it is the logging of the server
+        self.proc = subprocess.Popen(cmd.split(),
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE)
+        self.pending = []
+        self.buf = ""
+
+        # replies received, if the server dies without any it is assumed broken
+        self.replies = 0
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def submit(self, kif_filename, props_file):
+        if not self.alive():
+            raise ConvertServerError("conversion server is not running")
+
+        assert "\t" not in kif_filename and "\t" not in props_file
+        try:
+            self.proc.stdin.write("%s\t%s\n" % (kif_filename, props_file))
+            self.proc.stdin.flush()
+        except IOError as exc:
+            self.close()
+            raise ConvertServerError("conversion server went away: %s" % exc)
+
+        self.pending.append(props_file)
+
+    def read_line(self, timeout):
+        fd = self.proc.stdout.fileno()
+        end_time = time.time() + timeout
+        while "\n" not in self.buf:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                self.close()
+                raise ConvertServerError("timed out waiting on conversion server")
+
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                data = os.read(fd, 4096)
+                if not data:
+                    self.close()
+                    raise ConvertServerError("conversion server exited")
+                self.buf += data
+
+        line, self.buf = self.buf.split("\n", 1)
+        return line
+
+    def result(self, timeout=TIMEOUT):
+        ' waits on the oldest request.  Returns (props_file, error message or None) '
+        assert self.pending
+        line = self.read_line(timeout)
+        props_file = self.pending.pop(0)
+        self.replies += 1
+
+        if line.startswith("OK "):
+            assert line[3:] == props_file, "out of order reply %s != %s" % (line, props_file)
+            return props_file, None
+
+        return props_file, line
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+                if self.proc.poll() is None:
+                    self.proc.kill()
+                self.proc.wait()
+            except (IOError, OSError):
+                pass
+
+        self.proc = None
+        self.pending = []
+
+
+###############################################################################
+
+the_server = None
+
+# set if the server never worked, no point starting it again
+disabled = False
+
+
+def get_server():
+    ' returns the running server, or None if it cannot be started '
+    global the_server, disabled
+    if disabled:
+        return None
+
+    if the_server is not None and not the_server.alive():
+        the_server = None
+
+    if the_server is None:
+        try:
+            the_server = ConvertServer()
+
+        except OSError as exc:
+            log.warning("Failed to start conversion server: %s" % exc)
+            disabled = True
+            return None
+
+    return the_server
+
+
+def convert_many(pairs, timeout=TIMEOUT):
+    ''' pairs of (kif_filename, props_file).  Pipelined, up to MAX_PENDING at a time.  Returns the
+        set of props_files written. '''
+    server = get_server()
+    if server is None:
+        return set()
+
+    done = set()
+    todo = list(pairs)
+    try:
+        while todo or server.pending:
+            while todo and len(server.pending) < MAX_PENDING:
+                server.submit(*todo.pop(0))
+
+            props_file, error = server.result(timeout)
+            if error is None:
+                done.add(props_file)
+            else:
+                log.warning("Failed to convert %s: %s" % (props_file, error))
+
+    except ConvertServerError as exc:
+        log.warning("Conversion server: %s" % exc)
+        if not server.replies:
+            global disabled
+            disabled = True
+
+    return done
+
+
+def convert(kif_filename, props_file, timeout=TIMEOUT):
+    ' returns True if props_file was written '
+    return props_file in convert_many([(kif_filename, props_file)], timeout=timeout)
+
+
+@atexit.register
+def shutdown():
+    global the_server
+    if the_server is not None:
+        the_server.close()
+        the_server = None
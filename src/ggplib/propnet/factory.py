@@ -8,11 +8,17 @@ TODO
 
 from __future__ import print_function
 
+from collections import deque
+
 from ggplib.propnet.constants import AND, OR, NOT, PROPOSITION, TRANSITION, CONSTANT, UNKNOWN, MAX_FAN_OUT_SIZE
 from ggplib.util import log, symbols
 
 DEBUG = False
 
+# Propnet.optimize() via WorklistOptimizer, rather than sweeping over all the components until
+# nothing changes
+INCREMENTAL_OPTIMIZE = True
+
 ###############################################################################
 # basic type hierarchy (inheritance here doesn't actually do very much)
 ###############################################################################
@@ -235,6 +241,10 @@ class Propnet:
 
         self.already_reordered = False
 
+        # optional list of cids, the order control flow components are numbered in
+        # reorder_components() (see ggplib.statemachine.locality)
+        self.component_order = None
+
     @property
     def legal_propositions(self):
         # XXX legacy - remove
@@ -508,6 +518,7 @@ class Propnet:
 
         duped_propnet.topological_size = self.topological_size
         duped_propnet.initial_state = self.get_initial_state()
+        duped_propnet.component_order = self.component_order
 
         duped_propnet.role_infos = [RoleInfo(r, idx) for idx, r in enumerate(self.roles)]
         for c in duped_propnet.components.values():
@@ -743,6 +754,16 @@ class Propnet:
             t.base_proposition = the_output
 
     def optimize(self, once=False, all_features=False, verbose=False):
+        ''' once only applies to the sweeps, the worklist always runs until there is nothing left
+            to do '''
+        if INCREMENTAL_OPTIMIZE and not verbose:
+            WorklistOptimizer(self, all_features=all_features).run()
+        else:
+            self.optimize_sweeps(once=once, all_features=all_features, verbose=verbose)
+
+        self.fixup_requires()
+
+    def optimize_sweeps(self, once=False, all_features=False, verbose=False):
 
         while True:
             total = 0
@@ -774,8 +795,6 @@ class Propnet:
             if verbose:
                 "did total stuff in optimize()... %d - restarting" % total
 
-        self.fixup_requires()
-
     def fixup_requires(self):
         # set all the requires values
         for c in self.components.values():
@@ -1590,10 +1609,16 @@ class Propnet:
                 do(i)
 
         # do these in topological order:
-        for level in self.levels:
-            for c in level:
-                if c.component_type in (AND, OR, NOT):
-                    do(c)
+        control_flow = [c for level in self.levels for c in level
+                        if c.component_type in (AND, OR, NOT)]
+
+        # or as given by component_order (anything not in it goes last, in topological order)
+        if self.component_order is not None:
+            rank = dict((cid, ii) for ii, cid in enumerate(self.component_order))
+            control_flow.sort(key=lambda c: rank.get(c.cid, len(rank)))
+
+        for c in control_flow:
+            do(c)
 
         do(self.terminal_proposition)
 
@@ -1619,6 +1644,219 @@ class Propnet:
         self.already_reordered = True
 
 
+class WorklistOptimizer:
+    ''' the same rewrites as Propnet.optimize_sweeps(), but driven by a worklist of dirty
+        components.  Each rewrite marks the neighbours it touched, so only they are looked at
+        again.  Common subexpressions are found via an index of (type, sorted input cids). '''
+
+    def __init__(self, propnet, all_features=False):
+        self.propnet = propnet
+        self.all_features = all_features
+
+        # never removed (see Propnet.all_set())
+        self.keep = propnet.all_set()
+
+        # (type, sorted input cids) -> component.  Entries can go stale, see subexpr().
+        self.index = {}
+
+        self.todo = deque()
+        self.queued = set()
+        self.total = 0
+
+        self.rules = [self.deadend, self.duplicate_links, self.passthrough, self.subexpr]
+        if all_features:
+            self.rules += [self.expr_to_expr, self.x_over_y]
+
+    def run(self):
+        self.mark(self.propnet.components[cid] for cid in sorted(self.propnet.components))
+        while self.todo:
+            c = self.todo.popleft()
+            self.queued.discard(c)
+            if not self.alive(c):
+                continue
+
+            for rule in self.rules:
+                if rule(c):
+                    self.total += 1
+                    break
+
+        if DEBUG:
+            print("WorklistOptimizer did %d rewrites" % self.total)
+        return self.total
+
+    def alive(self, c):
+        return self.propnet.components.get(c.cid) is c
+
+    def mark(self, components):
+        for c in components:
+            if c not in self.queued:
+                self.queued.add(c)
+                self.todo.append(c)
+
+    def remove(self, c):
+        self.propnet.components.pop(c.cid)
+
+    ###########################################################################
+    # the rules, each returns True if it rewrote c (and marked what it touched)
+
+    def deadend(self, c):
+        if c.outputs or c in self.keep:
+            return False
+
+        for i in c.inputs:
+            i.outputs.remove(c)
+        self.mark(c.inputs)
+        self.remove(c)
+        return True
+
+    def duplicate_links(self, c):
+        if len(c.outputs) == len(set(c.outputs)):
+            return False
+
+        old_outputs = c.outputs
+        c.outputs = list(set(c.outputs))
+        for o in c.outputs:
+            # remove only one instance
+            old_outputs.remove(o)
+        for o in old_outputs:
+            o.inputs.remove(c)
+
+        self.mark(c.outputs)
+        self.mark([c])
+        return True
+
+    def passthrough(self, c):
+        if c.component_type not in (AND, OR, PROPOSITION) or c in self.keep:
+            return False
+
+        if len(c.inputs) != 1 or not c.outputs:
+            return False
+
+        the_input = c.inputs[0]
+        for the_output in c.outputs:
+            # replace the output of the the_input with the the_output (or append)
+            for idx, o in enumerate(the_input.outputs):
+                if o == c:
+                    the_input.outputs[idx] = the_output
+                    break
+            else:
+                the_input.outputs.append(the_output)
+
+            # replace the input of the the_output with the the_input
+            idx = the_output.inputs.index(c)
+            the_output.inputs[idx] = the_input
+
+        self.mark([the_input])
+        self.mark(c.outputs)
+        self.remove(c)
+        return True
+
+    def subexpr(self, c):
+        if c.component_type not in (NOT, AND, OR) or not c.inputs:
+            return False
+
+        key = self.key(c)
+        existing = self.index.get(key)
+        if existing is None or existing is c or not self.alive(existing) or self.key(existing) != key:
+            self.index[key] = c
+            return False
+
+        # fix weird case where both c and existing have the same outputs
+        for o in c.outputs:
+            if o in existing.outputs:
+                existing.outputs.remove(o)
+                o.inputs.remove(existing)
+
+        # go through inputs of c, and remove their outputs c
+        for i in c.inputs:
+            i.outputs.remove(c)
+        for o in c.outputs:
+            existing.outputs.append(o)
+            o.inputs.remove(c)
+            o.inputs.append(existing)
+
+        self.mark([existing])
+        self.mark(c.inputs)
+        self.mark(c.outputs)
+        self.remove(c)
+        return True
+
+    def key(self, c):
+        return c.component_type, tuple(sorted(i.cid for i in c.inputs))
+
+    def expr_to_expr(self, c):
+        ' see Propnet.eliminate_expr_to_expr() '
+        t = c.component_type
+        if t not in (NOT, AND, OR) or not c.outputs:
+            return False
+
+        if any(o.component_type != t for o in c.outputs):
+            return False
+
+        # re-route all the inputs of c, to the outputs of c
+        for i in c.inputs:
+            i.outputs.remove(c)
+
+        for o in c.outputs:
+            o.inputs.remove(c)
+            for i in c.inputs:
+                if o not in i.outputs:
+                    i.outputs.append(o)
+                if i not in o.inputs:
+                    o.inputs.append(i)
+
+        self.mark(c.inputs)
+        self.mark(c.outputs)
+        self.remove(c)
+        return True
+
+    def x_over_y(self, c):
+        ' see Propnet.do_x_over_y() '
+        for X, Y in ((AND, OR), (OR, AND), (OR, OR), (AND, AND)):
+            if c.component_type != Y:
+                continue
+
+            look_for_inputs = [i for i in c.inputs
+                               if (i.component_type == X and len(i.outputs) == 1)]
+            if len(look_for_inputs) == 1 or len(look_for_inputs) != len(c.inputs):
+                continue
+
+            common_inputs = set(look_for_inputs[0].inputs)
+            for a in look_for_inputs[1:]:
+                common_inputs = common_inputs.intersection(a.inputs)
+
+            if not common_inputs:
+                continue
+
+            # remove commons from the Xs
+            for common in common_inputs:
+                assert common not in c.inputs
+                for a in look_for_inputs:
+                    common.outputs.remove(a)
+                    a.inputs.remove(common)
+
+            # a new X, with all the common inputs and c
+            new_outputs, c.outputs = c.outputs, []
+            clz = And if X == AND else Or
+            new_component = clz(self.propnet.new_component_id(), -1, list(common_inputs) + [c], new_outputs)
+            self.propnet.components[new_component.cid] = new_component
+
+            for i in new_component.inputs:
+                i.outputs.append(new_component)
+
+            for o in new_component.outputs:
+                o.inputs.remove(c)
+                o.inputs.append(new_component)
+
+            self.mark([c, new_component])
+            self.mark(look_for_inputs)
+            self.mark(common_inputs)
+            self.mark(new_outputs)
+            return True
+
+        return False
+
+
 class Trace:
     def __init__(self, propnet):
         self.propnet = propnet
@@ -8,10 +8,15 @@ from ggplib.util.runcmd import run
 from ggplib.util.util import path_back
 
 from ggplib.propnet.factory import Propnet, create_component
+from ggplib.propnet import convert, interchange
 
 rulesheet_dir = os.path.join(path_back(__file__, 3), "data", "rulesheets")
 props_dir = os.path.join(path_back(__file__, 1), "props")
 
+# keep binary propnet files (see interchange), rather than python modules.  java always writes the
+# python module, which is then converted (in python) and removed.
+USE_BINARY = False
+
 
 def kif_filename_to_propfile(kif_filename):
     basename = os.path.basename(kif_filename)
@@ -23,43 +28,131 @@ def kif_filename_to_propfile(kif_filename):
     return basename, props_file
 
 
+def kif_filename_to_binfile(kif_filename):
+    _, props_file = kif_filename_to_propfile(kif_filename)
+    return props_file.replace(".py", ".bin")
+
+
+def run_convert(kif_filename, out_file):
+    ''' runs java and uses ggp-base to create out_file (a python module).  Via the conversion
+        server if possible (see ggplib.propnet.convert), otherwise the one shot java command.
+        Returns True on success. '''
+
+    if convert.convert(kif_filename, out_file):
+        return True
+
+    for java in ["java -XX:+UseSerialGC -Xmx8G", "java"]:
+        cmd = "%s propnet_convert.Convert %s %s" % (java, kif_filename, out_file)
+        log.debug("Running: %s" % cmd)
+        return_code, out, err = run(cmd, shell=True, timeout=60)
+        if return_code != 0:
+            log.warning("Error code: %s" % err)
+        else:
+            for l in out.splitlines():
+                log.info("... %s" % l)
+
+        if os.path.exists(out_file):
+            return True
+
+    log.error("SOMETHING IS BROKEN in install ... failed to create %s" % out_file)
+    return False
+
+
 def load_module(kif_filename):
     ''' attempts to load a python module with the same filename.  If it does not exist, will run
         java and use ggp-base to create the module. '''
 
     basename, props_file = kif_filename_to_propfile(kif_filename)
-    for cmd in ["java -XX:+UseSerialGC -Xmx8G propnet_convert.Convert %s %s" % (kif_filename, props_file),
-                "java propnet_convert.Convert %s %s" % (kif_filename, props_file),
-                "SOMETHING IS BROKEN in install ..."]:
-        try:
-            # rather unsafe cache, if kif file changes underneath our feet - tough luck.
-            module = importlib.import_module("ggplib.props." + basename)
-            break
-        except ImportError:
-            # run java ggp-base to create a propnet.  The resultant propnet will be in props_dir, which can be imported.
-            log.debug("Running: %s" % cmd)
-            return_code, out, err = run(cmd, shell=True, timeout=60)
-            if return_code != 0:
-                log.warning("Error code: %s" % err)
-            else:
-                for l in out.splitlines():
-                    log.info("... %s" % l)
-
-            if "SOMETHING" in cmd:
-                raise
-
-    return module
+
+    # rather unsafe cache, if kif file changes underneath our feet - tough luck.
+    if not os.path.exists(props_file):
+        run_convert(kif_filename, props_file)
+
+    return importlib.import_module("ggplib.props." + basename)
+
+
+def load_binary(kif_filename):
+    ''' as load_module(), but for a binary propnet file (see interchange).  Returns (roles,
+        entries). '''
+
+    bin_file = kif_filename_to_binfile(kif_filename)
+    if not os.path.exists(bin_file):
+        _, props_file = kif_filename_to_propfile(kif_filename)
+        if os.path.exists(props_file):
+            interchange.convert_module(props_file, bin_file)
+
+        elif run_convert(kif_filename, props_file):
+            interchange.convert_module(props_file, bin_file)
+            _remove_module(props_file)
+
+    with open(bin_file, "rb") as f:
+        return interchange.read(f.read())
+
+
+def load_entries(kif_filename):
+    ''' returns (roles, entries).  An existing python module is used if there is one, then an
+        existing binary file.  Otherwise converts to a binary file if USE_BINARY. '''
+
+    _, props_file = kif_filename_to_propfile(kif_filename)
+    if not os.path.exists(props_file):
+        if USE_BINARY or os.path.exists(kif_filename_to_binfile(kif_filename)):
+            return load_binary(kif_filename)
+
+    module = load_module(kif_filename)
+    return module.roles, module.entries
+
+
+def convert_all(kif_filenames):
+    ''' creates the propnet files for kif_filenames (those that don't already exist) in one go,
+        pipelined through the conversion server.  Returns the number converted. '''
+    todo = []
+    for kif_filename in kif_filenames:
+        _, props_file = kif_filename_to_propfile(kif_filename)
+        if USE_BINARY and os.path.exists(kif_filename_to_binfile(kif_filename)):
+            continue
+
+        if not os.path.exists(props_file):
+            todo.append((kif_filename, props_file))
+
+    done = convert.convert_many(todo)
+    if USE_BINARY:
+        for props_file in done:
+            interchange.convert_module(props_file, props_file.replace(".py", ".bin"))
+            _remove_module(props_file)
+
+    return len(done)
+
+
+def _remove_module(props_file):
+    for fn in [props_file] + glob.glob(props_file.replace(".py", ".py[co]")):
+        os.remove(fn)
+
+
+def convert_modules():
+    ''' converts the existing python modules in props_dir to binary propnet files (and removes the
+        modules).  Returns the number converted. '''
+    count = 0
+    for props_file in glob.glob(os.path.join(props_dir, "*.py")):
+        if os.path.basename(props_file) == "__init__.py":
+            continue
+
+        interchange.convert_module(props_file, props_file.replace(".py", ".bin"))
+        _remove_module(props_file)
+        count += 1
+
+    return count
 
 
 def get_with_filename(filename):
-    module = load_module(filename)
+    roles, entries = load_entries(filename)
     symbol_factory = symbols.SymbolFactory()
     components = {}
-    for c in [create_component(e, symbol_factory) for e in module.entries]:
+    for e in entries:
+        c = create_component(e, symbol_factory)
         if c:
             components[c.cid] = c
 
-    propnet = Propnet(module.roles, components)
+    propnet = Propnet(roles, components)
     propnet.init()
     propnet.verify()
     propnet.reorder_base_propositions()
@@ -75,7 +168,10 @@ def get_with_game(game):
     return get_with_filename(filename)
 
 
-def get_with_gdl(gdl, name_hint=""):
+def get_with_gdl(gdl, name_hint="", props_store=None):
+    ''' props_store is an optional DirectoryStore to keep the propnet file in (as propnet.bin, or
+        propnet.py for python modules).  If it is already there, java isn't run. '''
+
     # create a temporary file:
     name_hint += "__" + str(uuid.uuid4())
     name_hint = name_hint.replace('-', '_')
@@ -96,14 +192,38 @@ def get_with_gdl(gdl, name_hint=""):
         print >>f, l
     f.close()
 
+    basename, props_file = kif_filename_to_propfile(fn)
+    bin_file = kif_filename_to_binfile(fn)
+
+    if props_store is not None:
+        # an older store may only have the python module
+        for store_fn, local_fn in (("propnet.bin", bin_file), ("propnet.py", props_file)):
+            if props_store.file_exists(store_fn):
+                f = open(local_fn, "wb")
+                f.write(props_store.load_contents(store_fn))
+                f.close()
+                break
+
     try:
         propnet = get_with_filename(fn)
 
+        if props_store is not None and not props_store.file_exists("propnet.bin"):
+            if USE_BINARY:
+                # also upgrades a store that only has the python module
+                if not os.path.exists(bin_file):
+                    interchange.convert_module(props_file, bin_file)
+                props_store.save_contents("propnet.bin", open(bin_file, "rb").read())
+
+            elif not props_store.file_exists("propnet.py"):
+                props_store.save_contents("propnet.py", open(props_file).read())
+
     finally:
         # cleanup temp files afterwards
-        basename, props_file = kif_filename_to_propfile(fn)
         os.remove(fn)
-        os.remove(props_file)
+        for f in [props_file, bin_file] + glob.glob(props_file.replace(".py", ".py[co]")):
+            if os.path.exists(f):
+                os.remove(f)
+
         for f in glob.glob(os.path.join(props_dir, "__pycache__", basename) + '*.pyc'):
             os.remove(str(f))
 
@@ -0,0 +1,182 @@
+''' Binary (columnar) propnet file, converted from the python module that propnet_convert.Convert
+    writes (see convert_module()).  Loading it is a matter of reading a handful of arrays, rather
+    than compiling and importing a very large python source file.
+
+    All integers are big endian.
+
+        magic          4 bytes "GGPN"
+        version        int32
+        num_strings    int32
+        strings        num_strings * (int32 length, utf-8 bytes)
+        num_roles      int32
+        roles          int32[num_roles]     (string index)
+        n              int32                (number of components)
+        cids           int32[n]
+        counts         int32[n]
+        types          int8[n]              (see constants)
+        kinds          int8[n]              (index into PROP_KINDS, -1 if not a proposition)
+        gdls           int32[n]             (string index, -1 if not a proposition)
+        in_ptr         int32[n + 1]         (inputs of ii are in_idx[in_ptr[ii]:in_ptr[ii + 1]])
+        in_idx         int32[in_ptr[n]]     (cids)
+        out_ptr        int32[n + 1]
+        out_idx        int32[out_ptr[n]]    (cids)
+
+    read() yields the entries in the same form as the python module (see create_component()),
+    so the rest of getpropnet is the same either way. '''
+
+import os
+import sys
+import struct
+from array import array
+
+from ggplib.propnet.constants import init, base, input, legal, goal, terminal, other
+
+MAGIC = "GGPN"
+VERSION = 1
+
+PROP_KINDS = (init, base, input, legal, goal, terminal, other)
+
+assert array('i').itemsize == 4
+
+
+class InterchangeError(Exception):
+    pass
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size):
+        if self.pos + size > len(self.data):
+            raise InterchangeError("truncated propnet file")
+        s = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return s
+
+    def int32(self):
+        return struct.unpack(">i", self.take(4))[0]
+
+    def array(self, typecode, count):
+        a = array(typecode)
+        a.fromstring(self.take(count * a.itemsize))
+        if sys.byteorder == "little" and a.itemsize > 1:
+            a.byteswap()
+        return a
+
+
+def read(data):
+    ''' data is the contents of a binary propnet file.  Returns (roles, entries), where entries is
+        a generator. '''
+    r = Reader(data)
+    if r.take(4) != MAGIC:
+        raise InterchangeError("not a binary propnet file")
+
+    version = r.int32()
+    if version != VERSION:
+        raise InterchangeError("unsupported version %s" % version)
+
+    strings = [r.take(r.int32()) for _ in range(r.int32())]
+    roles = [strings[i] for i in r.array('i', r.int32())]
+
+    n = r.int32()
+    cids = r.array('i', n)
+    counts = r.array('i', n)
+    types = r.array('b', n)
+    kinds = r.array('b', n)
+    gdls = r.array('i', n)
+
+    in_ptr = r.array('i', n + 1)
+    in_idx = r.array('i', in_ptr[n])
+    out_ptr = r.array('i', n + 1)
+    out_idx = r.array('i', out_ptr[n])
+
+    if r.pos != len(data):
+        raise InterchangeError("trailing data in propnet file")
+
+    def entries():
+        for ii in xrange(n):
+            inputs = in_idx[in_ptr[ii]:in_ptr[ii + 1]].tolist()
+            outputs = out_idx[out_ptr[ii]:out_ptr[ii + 1]].tolist()
+            if kinds[ii] == -1:
+                yield cids[ii], counts[ii], types[ii], inputs, outputs
+            else:
+                yield (cids[ii], counts[ii], types[ii], inputs, outputs,
+                       PROP_KINDS[kinds[ii]], strings[gdls[ii]])
+
+    return roles, entries()
+
+
+def write(f, roles, entries):
+    ' writes roles and entries (as per the python module) to the file f '
+    strings = []
+    string_index = {}
+
+    def add_string(s):
+        if s not in string_index:
+            string_index[s] = len(strings)
+            strings.append(s)
+        return string_index[s]
+
+    role_idx = array('i', [add_string(r) for r in roles])
+
+    cids, counts, gdls = array('i'), array('i'), array('i')
+    types, kinds = array('b'), array('b')
+    in_ptr, in_idx = array('i', [0]), array('i')
+    out_ptr, out_idx = array('i', [0]), array('i')
+
+    for e in entries:
+        cids.append(e[0])
+        counts.append(e[1])
+        types.append(e[2])
+        in_idx.extend(e[3])
+        in_ptr.append(len(in_idx))
+        out_idx.extend(e[4])
+        out_ptr.append(len(out_idx))
+
+        if len(e) == 7:
+            kinds.append(PROP_KINDS.index(e[5]))
+            gdls.append(add_string(e[6]))
+        else:
+            kinds.append(-1)
+            gdls.append(-1)
+
+    def int32(v):
+        f.write(struct.pack(">i", v))
+
+    def write_array(a):
+        if sys.byteorder == "little" and a.itemsize > 1:
+            a = array(a.typecode, a)
+            a.byteswap()
+        f.write(a.tostring())
+
+    f.write(MAGIC)
+    int32(VERSION)
+
+    int32(len(strings))
+    for s in strings:
+        int32(len(s))
+        f.write(s)
+
+    int32(len(role_idx))
+    write_array(role_idx)
+
+    int32(len(cids))
+    for a in (cids, counts, types, kinds, gdls, in_ptr, in_idx, out_ptr, out_idx):
+        write_array(a)
+
+
+def convert_module(py_file, bin_file):
+    ' converts an existing (python module) propnet file to the binary format '
+    module = {}
+    exec compile(open(py_file).read(), py_file, "exec") in module
+
+    f = open(bin_file + ".tmp", "wb")
+    try:
+        write(f, module["roles"], module["entries"])
+    finally:
+        f.close()
+
+    # don't leave a half written file in place
+    os.rename(bin_file + ".tmp", bin_file)
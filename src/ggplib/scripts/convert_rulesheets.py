@@ -0,0 +1,58 @@
+'''
+Creates the propnet files (in ggplib/props) for the bundled rulesheets (or those given on the
+command line), all through the one conversion server (see ggplib.propnet.convert).  Those already
+converted are skipped, unless --force is given.
+
+--modules converts existing python modules in ggplib/props to binary propnet files instead (see
+ggplib.propnet.interchange).
+
+Example usage:
+
+$ python -m ggplib.scripts.convert_rulesheets
+$ python -m ggplib.scripts.convert_rulesheets --force ticTacToe speedChess
+$ python -m ggplib.scripts.convert_rulesheets --modules
+'''
+
+import os
+import sys
+import glob
+import time
+
+from ggplib.util import log
+from ggplib.util.init import setup_once
+from ggplib.propnet import getpropnet
+
+
+def main():
+    setup_once("convert_rulesheets")
+
+    args = sys.argv[1:]
+    if "--modules" in args:
+        log.info("Converted %d python modules" % getpropnet.convert_modules())
+        return
+
+    force = "--force" in args
+    games = [a for a in args if a != "--force"]
+
+    if games:
+        kif_filenames = [os.path.join(getpropnet.rulesheet_dir, g + ".kif") for g in games]
+    else:
+        kif_filenames = sorted(glob.glob(os.path.join(getpropnet.rulesheet_dir, "*.kif")))
+
+    if force:
+        for kif_filename in kif_filenames:
+            _, props_file = getpropnet.kif_filename_to_propfile(kif_filename)
+            for fn in props_file, getpropnet.kif_filename_to_binfile(kif_filename):
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    start_time = time.time()
+    count = getpropnet.convert_all(kif_filenames)
+    log.info("Converted %d/%d rulesheets in %.2fs" % (count, len(kif_filenames),
+                                                       time.time() - start_time))
+
+
+###############################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Compares Propnet.optimize() via the worklist (WorklistOptimizer) with the old sweeps, over the
+bundled rulesheets (or those given on the command line).  For each game, reports the time taken to
+create the propnet (which optimizes a number of times) and to do a further
+optimize(all_features=True), along with the size of the resultant propnets.
+
+Example usage:
+
+$ python -m ggplib.scripts.optimize_bench
+$ python -m ggplib.scripts.optimize_bench ticTacToe speedChess
+'''
+
+import os
+import sys
+import glob
+import time
+
+from ggplib.util import log
+from ggplib.util.init import setup_once
+from ggplib.propnet import factory, getpropnet
+
+
+def size(propnet):
+    return len(propnet.components), sum(len(c.outputs) for c in propnet.components.values())
+
+
+def run(game, incremental):
+    factory.INCREMENTAL_OPTIMIZE = incremental
+
+    start_time = time.time()
+    propnet = getpropnet.get_with_game(game)
+    build_time = time.time() - start_time
+
+    propnet = propnet.dupe()
+    start_time = time.time()
+    propnet.optimize(all_features=True)
+    optimize_time = time.time() - start_time
+
+    return build_time, optimize_time, size(propnet)
+
+
+def main():
+    setup_once("optimize_bench")
+
+    games = sys.argv[1:]
+    if not games:
+        games = sorted(os.path.splitext(os.path.basename(fn))[0]
+                       for fn in glob.glob(os.path.join(getpropnet.rulesheet_dir, "*.kif")))
+
+    log.info("%-20s %10s %10s %10s %10s %18s %18s" % ("game", "build", "build(wl)",
+                                                      "optimize", "optimize(wl)",
+                                                      "components/links", "(wl)"))
+    for game in games:
+        try:
+            sweeps = run(game, False)
+            worklist = run(game, True)
+
+        except Exception as exc:
+            log.error("%s failed: %s" % (game, exc))
+            continue
+
+        finally:
+            factory.INCREMENTAL_OPTIMIZE = True
+
+        log.info("%-20s %9.3fs %9.3fs %9.3fs %9.3fs %18s %18s" % (game,
+                                                                 sweeps[0], worklist[0],
+                                                                 sweeps[1], worklist[1],
+                                                                 "%d/%d" % sweeps[2],
+                                                                 "%d/%d" % worklist[2]))
+
+        if worklist[2][0] > sweeps[2][0]:
+            log.warning("%s: worklist propnet is larger" % game)
+
+
+###############################################################################
+
+if __name__ == "__main__":
+    main()
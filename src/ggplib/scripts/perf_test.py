@@ -15,9 +15,21 @@ debug = True
 
 ###############################################################################
 
-def go(sm, seconds_to_run, rollouts_in_c=True):
+def go(sm, seconds_to_run, rollouts_in_c=True, num_workers=0):
     log.verbose("running depth charges for %s seconds %s" % (seconds_to_run, "(in c)" if rollouts_in_c else ""))
 
+    if rollouts_in_c and num_workers:
+        log.verbose("using %s threads" % num_workers)
+        msecs_taken, rollouts, num_state_changes, workers = interface.depth_charge(sm, seconds_to_run,
+                                                                                   num_workers)
+        for ii, (worker_msecs, worker_rollouts, worker_changes) in enumerate(workers):
+            log.info("thread %d: ran for %.3f seconds, state changes %s, rollouts %s, "
+                     "rollouts per second: %.1f" % (ii, worker_msecs / 1000.0, worker_changes,
+                                                    worker_rollouts,
+                                                    worker_rollouts / (worker_msecs / 1000.0)))
+
+        return msecs_taken, rollouts, num_state_changes
+
     if rollouts_in_c:
         return interface.depth_charge(sm, seconds_to_run)
 
@@ -27,6 +39,7 @@ def go(sm, seconds_to_run, rollouts_in_c=True):
         # cache some objects
         joint_move = sm.get_joint_move()
         base_state = sm.new_base_state()
+        goal_values = sm.get_goal_values()
 
         # resolution is assumed to be good enough not to cheat too much here (we return
         # msecs_taken so it is all good)
@@ -61,7 +74,7 @@ def go(sm, seconds_to_run, rollouts_in_c=True):
                 depth += 1
 
             # simulate side effect of getting the scores from the statemachine
-            scores = [sm.get_goal_value(r) for r in range(role_count)]
+            scores = sm.get_goal_values(goal_values)
 
             # stats
             rollouts += 1
@@ -75,7 +88,24 @@ def go(sm, seconds_to_run, rollouts_in_c=True):
     return msecs_taken, rollouts, num_state_changes
 
 
-def main_3(game_file, output_file, seconds_to_run):
+def go_batch(sm, seconds_to_run, bitsliced=False, batch_size=1024):
+    ''' depth charges from the initial state via BatchRollouts, batch_size at a time '''
+    batch = interface.BatchRollouts(sm, bitsliced=bitsliced)
+    initial_state = sm.get_initial_state()
+    scores = interface.new_int_buffer(batch_size, len(sm.get_roles()))
+    depths = interface.new_int_buffer(batch_size)
+
+    end_time = time.time() + seconds_to_run
+    while time.time() < end_time:
+        batch.run(initial_state, batch_size, scores, depths)
+
+    results = batch.get_result()
+    interface.dealloc_batch_rollouts(batch)
+    interface.dealloc_basestate(initial_state)
+    return results
+
+
+def main_3(game_file, output_file, seconds_to_run, num_workers=0):
     # builds without accessing database database
     _, game_info = lookup.by_gdl(open(game_file).read())
     sm = game_info.get_sm()
@@ -90,7 +120,7 @@ def main_3(game_file, output_file, seconds_to_run):
 
     print >>f, "version=%s" % VERSION
     try:
-        msecs_taken, rollouts, num_state_changes = go(sm, seconds_to_run)
+        msecs_taken, rollouts, num_state_changes = go(sm, seconds_to_run, num_workers=num_workers)
 
         # see gdl-perf (XXX do python3 print)
         print >>f, "millisecondsTaken=%s" % msecs_taken
@@ -107,14 +137,9 @@ def main_3(game_file, output_file, seconds_to_run):
     f.close()
 
 
-def main_2(game_name, seconds_to_run):
-    game_info = lookup.by_name(game_name)
-    sm = game_info.get_sm()
-
-    msecs_taken, rollouts, num_state_changes = go(sm, seconds_to_run)
-
+def report(title, msecs_taken, rollouts, num_state_changes):
     log.info("====================================================")
-    log.info("performance test game %s" % game_name)
+    log.info(title)
     log.info("ran for %.3f seconds, state changes %s, rollouts %s" % ((msecs_taken / 1000.0),
                                                                       num_state_changes,
                                                                       rollouts))
@@ -122,25 +147,127 @@ def main_2(game_name, seconds_to_run):
     log.info("====================================================")
 
 
+def report_profile(sm, seconds_to_run, top=25):
+    ''' runs depth charges (in c, single threaded) with the propagation counters on, and reports
+        the hottest components along with their gdl '''
+    assert sm.set_profiling(True), "profiling only supported on propnet statemachines"
+    msecs_taken, rollouts, num_state_changes = go(sm, seconds_to_run)
+    profile = sm.get_profile()
+    sm.set_profiling(False)
+
+    report("profiled", msecs_taken, rollouts, num_state_changes)
+
+    log.info("cascades %s, visits %s, visits per cascade %.1f, max cascade %s, max depth %s" % (
+        profile.cascade_count, profile.total_visits,
+        profile.total_visits / float(max(profile.cascade_count, 1)),
+        profile.max_cascade, profile.max_depth))
+
+    log.info("cascade sizes (log2 buckets): %s" % (
+        ", ".join("<%d: %d" % (2 ** ii, c) for ii, c in enumerate(profile.cascades) if c)))
+    log.info("visits by depth: %s" % (
+        ", ".join("%d: %d" % (ii, c) for ii, c in enumerate(profile.depths) if c)))
+
+    log.info("hottest components:")
+    log.info("%12s %12s %7s %8s  %s" % ("visits", "activations", "%", "id", "gdl"))
+    for visits, activations, cid in profile.hottest(top):
+        component_type, gdl = sm.get_component_info(cid)
+        log.info("%12d %12d %6.2f%% %8d  %s %s" % (visits, activations,
+                                                    100.0 * visits / max(profile.total_visits, 1),
+                                                    cid, component_type, gdl))
+
+
+def main_2(game_name, seconds_to_run, num_workers=0, compare_compiled=False,
+           compare_bitsliced=False, profile=False):
+    game_info = lookup.by_name(game_name)
+    sm = game_info.get_sm()
+
+    title = "performance test game %s" % game_name
+    if num_workers:
+        title += " (threads: %s)" % num_workers
+
+    results = go(sm, seconds_to_run, num_workers=num_workers)
+    report(title, *results)
+
+    if compare_compiled:
+        assert not getattr(game_info, "special_game", False), "no propnet for %s" % game_name
+
+        from ggplib.statemachine import compiled
+        the_game_store = lookup.get_database().games_store.get_directory(game_name)
+        _, compiled_sm = compiled.build_compiled_sm(game_info.gdl_str, the_game_store)
+
+        compiled_results = go(compiled_sm, seconds_to_run, num_workers=num_workers)
+        report(title + " - compiled", *compiled_results)
+
+        interpreted_rate = results[1] / (results[0] / 1000.0)
+        compiled_rate = compiled_results[1] / (compiled_results[0] / 1000.0)
+        log.info("compiled / interpreted: %.2fx" % (compiled_rate / interpreted_rate))
+
+    if compare_bitsliced:
+        batch_results = go_batch(sm, seconds_to_run)
+        report(title + " - batch", *batch_results)
+
+        bitsliced_results = go_batch(sm, seconds_to_run, bitsliced=True)
+        report(title + " - batch bitsliced", *bitsliced_results)
+
+        batch_rate = batch_results[1] / (batch_results[0] / 1000.0)
+        bitsliced_rate = bitsliced_results[1] / (bitsliced_results[0] / 1000.0)
+        log.info("bitsliced / batch: %.2fx" % (bitsliced_rate / batch_rate))
+
+    if profile:
+        assert not getattr(game_info, "special_game", False), "no propnet for %s" % game_name
+
+        # goalless/combined statemachines wrap several propnets, so profile a standard one
+        from ggplib.statemachine import builder
+        _, profile_sm = builder.build_sm(game_info.gdl_str, try_combined=False, no_goalless=True)
+        report_profile(profile_sm, seconds_to_run)
+        interface.dealloc_statemachine(profile_sm)
+
+
 def main():
     interface.initialise_k273(1, log_name_base="perf_test")
     log.initialise()
 
     args = sys.argv[1:]
 
+    # optional --threads=N, runs the depth charges on N threads
+    num_workers = 0
+    for arg in args[:]:
+        if arg.startswith("--threads="):
+            num_workers = int(arg.split("=", 1)[1])
+            args.remove(arg)
+
+    # optional --compiled, compares with the generated/compiled statemachine (see
+    # ggplib.statemachine.compiled)
+    compare_compiled = "--compiled" in args
+    if compare_compiled:
+        args.remove("--compiled")
+
+    # optional --bitsliced, compares batched depth charges with the 64 lane bitsliced version (see
+    # interface.BatchRollouts)
+    compare_bitsliced = "--bitsliced" in args
+    if compare_bitsliced:
+        args.remove("--bitsliced")
+
+    # optional --profile, reports propagation counters and the hottest components (see
+    # StateMachine.set_profiling())
+    profile = "--profile" in args
+    if profile:
+        args.remove("--profile")
+
     if len(args) == 3:
         game_file = args[0]
         output_file = args[1]
         seconds_to_run = int(args[2])
 
         # gdl-perf
-        main_3(game_file, output_file, seconds_to_run)
+        main_3(game_file, output_file, seconds_to_run, num_workers)
     else:
         # command line
         assert len(args) < 3
         game_name = args[0]
         seconds_to_run = int(args[1]) if len(args) == 2 else 10
-        main_2(game_name, seconds_to_run)
+        main_2(game_name, seconds_to_run, num_workers, compare_compiled, compare_bitsliced,
+               profile)
 
 
 ###############################################################################
@@ -0,0 +1,111 @@
+''' binary version of the statemachine descriptions produced by builder.do_build() (and friends).
+    Read by create*StateMachineFromBinary() in c++, which mmaps the file.  Everything is a little
+    endian int32, with strings length prefixed and padded to 4 bytes. '''
+
+import struct
+
+MAGIC = 0x4d534747  # "GGSM"
+VERSION = 1
+
+STANDARD = 1
+GOALLESS = 2
+COMBINED = 3
+
+
+class Writer:
+    def __init__(self):
+        self.parts = []
+
+    def ints(self, values):
+        values = list(values)
+        self.parts.append(struct.pack("<%di" % len(values), *values))
+
+    def int(self, value):
+        self.parts.append(struct.pack("<i", value))
+
+    def string(self, s):
+        if not isinstance(s, bytes):
+            s = s.encode('utf-8')
+        self.int(len(s))
+        self.parts.append(s + b"\0" * (-len(s) % 4))
+
+    def header(self, kind):
+        self.ints((MAGIC, VERSION, kind))
+
+    def sm(self, desc):
+        create = desc["create"]
+        self.ints((create["role_count"],
+                   create["num_bases"],
+                   create["num_transitions"],
+                   create["num_components"],
+                   create["num_outputs"],
+                   create["topological_size"]))
+
+        self.ints((desc["control_flows"], desc["terminal_index"]))
+
+        for r in desc["roles"]:
+            self.ints((r["role_index"],
+                       r["input_start_index"],
+                       r["legal_start_index"],
+                       r["goal_start_index"],
+                       r["num_inputs_legals"],
+                       r["num_goals"]))
+            self.string(r["name"])
+
+        assert len(desc["components"]) == create["num_components"]
+        for c in desc["components"]:
+            assert len(c) == 8
+            self.ints(c)
+
+        outputs = [-1] * create["num_outputs"]
+        for output_index, cid in desc["outputs"]:
+            outputs[output_index] = cid
+        self.ints(outputs)
+
+        self.int(len(desc["metas"]))
+        for m in desc["metas"]:
+            self.ints((m["component_id"], m["goal_value"]))
+            self.string(m["typename"])
+            self.string(m["gdl_str"])
+            self.string(m["move"])
+
+        assert len(desc["initial_state"]) == create["num_bases"]
+        self.ints(desc["initial_state"])
+
+    def getvalue(self):
+        return b"".join(self.parts)
+
+
+def standard_to_binary(desc):
+    w = Writer()
+    w.header(STANDARD)
+    w.sm(desc)
+    return w.getvalue()
+
+
+def goalless_to_binary(desc):
+    w = Writer()
+    w.header(GOALLESS)
+    w.int(desc["role_count"])
+    w.sm(desc["goal_sm"])
+    w.sm(desc["goalless_sm"])
+    return w.getvalue()
+
+
+def combined_to_binary(desc):
+    w = Writer()
+    w.header(COMBINED)
+    w.int(desc["num_controls"])
+    w.sm(desc["goal_sm"])
+
+    assert len(desc["control_sms"]) == desc["num_controls"]
+    for control_sm in desc["control_sms"]:
+        w.ints((control_sm["idx"], control_sm["control_cid"]))
+        w.sm(control_sm)
+
+    return w.getvalue()
+
+
+to_binary = dict(standard=standard_to_binary,
+                 goalless=goalless_to_binary,
+                 combined=combined_to_binary)
@@ -1,19 +1,55 @@
+import os
+import sys
+import time
+import atexit
+import random
+import shutil
+import tempfile
+import threading
 import traceback
+import subprocess
+import multiprocessing
 
 import json
 
 from ggplib.util import log
 from ggplib import interface
+from ggplib.db.store import DirectoryStore
 
 from ggplib.propnet.constants import (OR, AND, NOT, PROPOSITION,
                                       TRANSITION, MAX_FAN_OUT_SIZE)
 from ggplib.propnet import getpropnet
-from ggplib.statemachine.controls import get_and_test_control_bases
+from ggplib.statemachine.controls import (get_and_test_control_bases, get_control_bases,
+                                           MAX_CONTROL_STATES)
 from ggplib.statemachine.model import StateMachineModel
+from ggplib.statemachine import binary
+from ggplib.statemachine import locality
+
+# processes to build the networks of a combined statemachine with (see
+# build_combined_state_machine()), 0 builds them one after another in this process.  And how long
+# to wait for them, in seconds.  The pool is forked, so only opt in (PARALLEL_BUILD_WORKERS) from a
+# process without other threads.
+BUILD_WORKERS = 0
+PARALLEL_BUILD_WORKERS = min(multiprocessing.cpu_count(), MAX_CONTROL_STATES + 2)
+BUILD_TIMEOUT = 120
+
+
+class BuildError(Exception):
+    pass
+
 
 class BuilderBase:
     ''' Just prints what it would do '''
 
+    def abort(self):
+        ' called if building fails part way through '
+        pass
+
+    @staticmethod
+    def dealloc(result):
+        ' frees the result of finalise()/goalless()/combined(), if it is not wanted after all '
+        pass
+
     def create_state_machine(self, role_count, num_bases, num_transitions,
                              num_components, num_outputs, topological_size):
         print("Creating SM with role_count: %s, "
@@ -159,6 +195,188 @@ class BuilderDescription(BuilderBase):
                     control_flows=control_flows,
                     terminal_index=terminal_index)
 
+    @staticmethod
+    def goalless(role_count, goal_sm, goalless_sm):
+        return dict(role_count=role_count,
+                    goal_sm=goal_sm,
+                    goalless_sm=goalless_sm)
+
+    @staticmethod
+    def combined(goal_sm, control_sms):
+        ' control_sms is a list of (idx, control_cid, result of finalise()) '
+        control_sms_result = []
+        for idx, control_cid, sm_desc in control_sms:
+            # attach some extra info (easiest to process in c++)
+            sm_desc["idx"] = idx
+            sm_desc["control_cid"] = control_cid
+            control_sms_result.append(sm_desc)
+
+        return dict(num_controls=len(control_sms_result),
+                    goal_sm=goal_sm,
+                    control_sms=control_sms_result)
+
+
+class BuilderDirect(BuilderBase):
+    ''' Builds the c++ statemachine directly via cffi, skipping the json round trip.  Components,
+        outputs and metas are sent across in batches.  finalise() returns the raw c++
+        statemachine. '''
+
+    BATCH_SIZE = 4096
+
+    def __init__(self):
+        self.c_statemachine = None
+        self.components = []
+        self.outputs = []
+        self.meta_ints = []
+        self.meta_strs = []
+
+    def check(self, ok, what):
+        if not ok:
+            self.abort()
+            raise BuildError("%s failed (see log)" % what)
+
+    def abort(self):
+        if self.c_statemachine is not None:
+            interface.lib.StateMachine__delete(self.c_statemachine)
+            self.c_statemachine = None
+
+    @staticmethod
+    def dealloc(result):
+        if result is not None:
+            interface.lib.StateMachine__delete(result)
+
+    def create_state_machine(self, role_count, num_bases, num_transitions,
+                             num_components, num_outputs, topological_size):
+        self.num_bases = num_bases
+        c_statemachine = interface.lib.Builder__createStateMachine(role_count,
+                                                                   num_bases,
+                                                                   num_transitions,
+                                                                   num_components,
+                                                                   num_outputs,
+                                                                   topological_size)
+        if c_statemachine == interface.ffi.NULL:
+            raise BuildError("Builder__createStateMachine failed (see log)")
+        self.c_statemachine = c_statemachine
+
+    def set_role(self, role_index, name, input_start_index, legal_start_index,
+                 goal_start_index, num_inputs_legals, num_goals):
+        ok = interface.lib.Builder__setRole(self.c_statemachine, role_index, _to_bytes(name),
+                                            input_start_index, legal_start_index,
+                                            goal_start_index, num_inputs_legals, num_goals)
+        self.check(ok, "Builder__setRole")
+
+    def add_meta(self, component_id, typename, gdl_str="", move="", goal_value=-1):
+        self.meta_ints += (component_id, goal_value)
+        self.meta_strs += (_to_bytes(typename), _to_bytes(gdl_str), _to_bytes(move))
+        if len(self.meta_ints) >= 2 * self.BATCH_SIZE:
+            self.flush_metas()
+
+    def set_meta_proposition(self, component_id, typename, gdl_str, move, goal_value):
+        self.add_meta(component_id, typename, gdl_str=gdl_str, move=move, goal_value=goal_value)
+
+    def set_meta_transition(self, component_id, typename, gdl_str):
+        self.add_meta(component_id, typename, gdl_str=gdl_str)
+
+    def set_meta_component(self, component_id, typename):
+        self.add_meta(component_id, typename)
+
+    def set_component(self, component_id, required_count_false, required_count_true,
+                      output_index, number_outputs, initial_count, incr, topological_order):
+        self.components += (component_id, required_count_false, required_count_true,
+                            output_index, number_outputs, initial_count, incr, topological_order)
+        if len(self.components) >= 8 * self.BATCH_SIZE:
+            self.flush_components()
+
+    def set_output(self, output_index, component_id):
+        self.outputs += (output_index, component_id)
+        if len(self.outputs) >= 2 * self.BATCH_SIZE:
+            self.flush_outputs()
+
+    def set_initial_state(self, initial_state):
+        # python list of 0 and 1s
+        assert len(initial_state) == self.num_bases
+        self.initial_state = initial_state
+
+    def flush_components(self):
+        if self.components:
+            ok = interface.lib.Builder__setComponents(self.c_statemachine,
+                                                      interface.ffi.new("int[]", self.components),
+                                                      len(self.components) // 8)
+            self.components = []
+            self.check(ok, "Builder__setComponents")
+
+    def flush_outputs(self):
+        if self.outputs:
+            ok = interface.lib.Builder__setOutputs(self.c_statemachine,
+                                                   interface.ffi.new("int[]", self.outputs),
+                                                   len(self.outputs) // 2)
+            self.outputs = []
+            self.check(ok, "Builder__setOutputs")
+
+    def flush_metas(self):
+        if self.meta_ints:
+            strings = b"\0".join(self.meta_strs) + b"\0"
+            ok = interface.lib.Builder__setMetas(self.c_statemachine,
+                                                 interface.ffi.new("int[]", self.meta_ints),
+                                                 interface.ffi.new("char[]", strings),
+                                                 len(self.meta_ints) // 2)
+            self.meta_ints = []
+            self.meta_strs = []
+            self.check(ok, "Builder__setMetas")
+
+    def finalise(self, control_flows, terminal_index):
+        self.flush_components()
+        self.flush_outputs()
+        self.flush_metas()
+
+        ok = interface.lib.Builder__finalise(self.c_statemachine, control_flows, terminal_index,
+                                             interface.ffi.new("int[]", list(self.initial_state)))
+        self.check(ok, "Builder__finalise")
+
+        # the caller owns it now
+        c_statemachine, self.c_statemachine = self.c_statemachine, None
+        return c_statemachine
+
+    @staticmethod
+    def goalless(role_count, goal_sm, goalless_sm):
+        ' takes ownership of goal_sm and goalless_sm, even on failure '
+        c_sm = interface.lib.Builder__createGoallessStateMachine(role_count, goalless_sm, goal_sm)
+        if c_sm == interface.ffi.NULL:
+            for s in goal_sm, goalless_sm:
+                BuilderDirect.dealloc(s)
+            raise BuildError("Builder__createGoallessStateMachine failed (see log)")
+
+        return c_sm
+
+    @staticmethod
+    def combined(goal_sm, control_sms):
+        ''' control_sms is a list of (idx, control_cid, result of finalise()).  Takes ownership
+            of goal_sm and the control statemachines, even on failure. '''
+        c_combined = interface.lib.Builder__createCombinedStateMachine(len(control_sms), goal_sm)
+        if c_combined == interface.ffi.NULL:
+            BuilderDirect.dealloc(goal_sm)
+            for _, _, c_sm in control_sms:
+                BuilderDirect.dealloc(c_sm)
+            raise BuildError("Builder__createCombinedStateMachine failed (see log)")
+
+        for count, (idx, control_cid, c_sm) in enumerate(control_sms):
+            ok = interface.lib.Builder__setControlStateMachine(c_combined, idx, control_cid, c_sm)
+            if not ok:
+                # c_combined owns the goal statemachine and the controls set so far (c_sm included)
+                BuilderDirect.dealloc(c_combined)
+                for _, _, rest in control_sms[count + 1:]:
+                    BuilderDirect.dealloc(rest)
+                raise BuildError("Builder__setControlStateMachine failed (see log)")
+
+        return c_combined
+
+
+def _to_bytes(s):
+    if not isinstance(s, bytes):
+        s = s.encode('utf-8')
+    assert b"\0" not in s
+    return s
+
 
 def do_build(propnet, the_builder=None):
     ''' takes propnet and does some building (depends on the_builder) '''
@@ -166,6 +384,15 @@ def do_build(propnet, the_builder=None):
     if the_builder is None:
         the_builder = BuilderDescription()
 
+    try:
+        return _do_build(propnet, the_builder)
+
+    except Exception:
+        the_builder.abort()
+        raise
+
+
+def _do_build(propnet, the_builder):
     propnet.reorder_components()
     propnet.verify()
 
@@ -245,11 +472,11 @@ def do_build(propnet, the_builder=None):
 
 ###############################################################################
 
-def build_standard_sm(propnet):
-    return do_build(propnet.dupe())
+def build_standard_sm(propnet, builder_class=BuilderDescription):
+    return do_build(propnet.dupe(), the_builder=builder_class())
 
 
-def build_goals_only_sm(propnet):
+def build_goals_only_sm(propnet, builder_class=BuilderDescription):
     propnet = propnet.dupe()
 
     log.info("Building terminal/goal based state machine")
@@ -268,11 +495,11 @@ def build_goals_only_sm(propnet):
 
     propnet.print_summary()
 
-    return do_build(propnet)
+    return do_build(propnet, the_builder=builder_class())
 
 
-def build_goalless_sm(propnet):
-    goal_sm_result = build_goals_only_sm(propnet.dupe())
+def build_goalless_sm(propnet, builder_class=BuilderDescription):
+    goal_sm_result = build_goals_only_sm(propnet.dupe(), builder_class=builder_class)
 
     # strip goals in propnet
     propnet = propnet.dupe()
@@ -288,16 +515,23 @@ def build_goalless_sm(propnet):
             if g.cid in propnet.components:
                 r.goals.append(g)
 
-    propnet.ensure_valid()
+    try:
+        propnet.ensure_valid()
+        goalless_sm_result = do_build(propnet, the_builder=builder_class())
+
+    except Exception:
+        builder_class.dealloc(goal_sm_result)
+        raise
 
-    goalless_sm_result = do_build(propnet)
+    return builder_class.goalless(len(propnet.role_infos), goal_sm_result, goalless_sm_result)
 
-    return dict(role_count=len(propnet.role_infos),
-                goal_sm=goal_sm_result,
-                goalless_sm=goalless_sm_result)
 
+def build_combined_state_machine(propnet, builder_class=BuilderDescription, num_workers=0,
+                                 timeout=BUILD_TIMEOUT):
+    if num_workers:
+        return build_combined_state_machine_parallel(propnet, builder_class=builder_class,
+                                                     num_workers=num_workers, timeout=timeout)
 
-def build_combined_state_machine(propnet):
     control_bases = get_and_test_control_bases(propnet)
     if control_bases is None:
         return None
@@ -305,31 +539,262 @@ def build_combined_state_machine(propnet):
     log.info("Building combined based state machine")
 
     # create and add goal statemachine
-    goal_sm_result = build_goals_only_sm(propnet)
+    goal_sm_result = build_goals_only_sm(propnet, builder_class=builder_class)
+
+    control_sms_result = []
+    try:
+        for idx, p in enumerate(control_bases.networks):
+            sm_result = do_build(p, the_builder=builder_class())
+            control_sms_result.append((idx, p.fixed_base.cid, sm_result))
+
+    except Exception:
+        _dealloc_results(builder_class, goal_sm_result, control_sms_result)
+        raise
+
+    return builder_class.combined(goal_sm_result, control_sms_result)
+
+
+def _dealloc_results(builder_class, goal_sm_result, control_sms_result):
+    ' frees what was built so far, when a combined build fails part way '
+    builder_class.dealloc(goal_sm_result)
+    for _, _, sm_result in control_sms_result:
+        builder_class.dealloc(sm_result)
+
+
+def replay(desc, the_builder):
+    ' builds the result of BuilderDescription.finalise() again, with the_builder '
+    try:
+        return _replay(desc, the_builder)
+
+    except Exception:
+        the_builder.abort()
+        raise
+
+
+def _replay(desc, the_builder):
+    create = desc["create"]
+    the_builder.create_state_machine(create["role_count"], create["num_bases"],
+                                     create["num_transitions"], create["num_components"],
+                                     create["num_outputs"], create["topological_size"])
+
+    for r in desc["roles"]:
+        the_builder.set_role(r["role_index"], r["name"], r["input_start_index"],
+                             r["legal_start_index"], r["goal_start_index"],
+                             r["num_inputs_legals"], r["num_goals"])
+
+    for m in desc["metas"]:
+        if m["typename"] == "Proposition":
+            the_builder.set_meta_proposition(m["component_id"], m["typename"], m["gdl_str"],
+                                             m["move"], m["goal_value"])
+        elif m["typename"] == "Transition":
+            the_builder.set_meta_transition(m["component_id"], m["typename"], m["gdl_str"])
+        else:
+            the_builder.set_meta_component(m["component_id"], m["typename"])
+
+    for component in desc["components"]:
+        the_builder.set_component(*component)
+
+    for output in desc["outputs"]:
+        the_builder.set_output(*output)
+
+    the_builder.set_initial_state(desc["initial_state"])
+    return the_builder.finalise(desc["control_flows"], desc["terminal_index"])
+
+
+def compare_statemachines(sm, other_sm, seconds):
+    ''' plays random games with both (c++) statemachines, asserting that they agree on the legals,
+        states, terminal and goals.  Returns the number of games played. '''
+    role_count = len(sm.get_roles())
+    joint_move, other_joint_move = sm.get_joint_move(), other_sm.get_joint_move()
+    base_state, other_base_state = sm.new_base_state(), other_sm.new_base_state()
+
+    count = 0
+    end_time = time.time() + seconds
+    while time.time() < end_time:
+        sm.reset()
+        other_sm.reset()
 
+        depth = 0
+        while True:
+            assert sm.is_terminal() == other_sm.is_terminal()
+            if sm.is_terminal():
+                break
+
+            for role_index in range(role_count):
+                # the order of a LegalState depends on the order they were set/unset, so sorted
+                legals = sorted(sm.get_legal_state(role_index).to_list())
+                assert legals == sorted(other_sm.get_legal_state(role_index).to_list())
+                choice = random.choice(legals)
+                joint_move.set(role_index, choice)
+                other_joint_move.set(role_index, choice)
+
+            sm.next_state(joint_move, base_state)
+            other_sm.next_state(other_joint_move, other_base_state)
+            assert base_state.to_list() == other_base_state.to_list()
+
+            sm.update_bases(base_state)
+            other_sm.update_bases(other_base_state)
+
+            depth += 1
+            assert depth < 1000
+
+        assert list(sm.get_goal_values()) == list(other_sm.get_goal_values())
+        count += 1
+
+    for j in joint_move, other_joint_move:
+        interface.dealloc_jointmove(j)
+    for bs in base_state, other_base_state:
+        interface.dealloc_basestate(bs)
+
+    return count
+
+
+# what the workers of build_combined_state_machine_parallel() build from, inherited when forked
+_worker_state = {}
+
+
+def _build_task(task):
+    propnet = _worker_state["propnet"]
+    if task == "goals":
+        return task, build_goals_only_sm(propnet)
+
+    if task == "standard":
+        return task, build_standard_sm(propnet)
+
+    # the index of a control base
+    network = _worker_state["control_bases"].split_network(propnet, task)
+    desc = do_build(network)
+    return task, (task, network.fixed_base.cid, desc)
+
+
+def build_combined_state_machine_parallel(propnet, builder_class=BuilderDescription,
+                                          num_workers=PARALLEL_BUILD_WORKERS,
+                                          timeout=BUILD_TIMEOUT):
+    ''' same as build_combined_state_machine(), but the networks (one per control base, and the
+        goals) are built by a pool of num_workers processes, as descriptions.  Returns None if not
+        all done within timeout seconds.
+
+        The networks never come back to this process, so rather than testing the python
+        combined statemachine (see get_and_test_control_bases()), the c++ one is tested against
+        the standard statemachine (also built by the pool). '''
+
+    control_bases = get_control_bases(propnet)
+    if control_bases is None:
+        return None
+
+    log.info("Building combined based state machine, with %d workers" % num_workers)
+
+    tasks = ["goals", "standard"] + range(len(control_bases.bases))
+
+    _worker_state.update(propnet=propnet, control_bases=control_bases)
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        results = dict(pool.map_async(_build_task, tasks, chunksize=1).get(timeout))
+
+    except multiprocessing.TimeoutError:
+        log.warning("Timed out after %s seconds building combined statemachine" % timeout)
+        return None
+
+    except Exception as exc:
+        log.warning("Failed to build combined statemachine: %s" % exc)
+        return None
+
+    finally:
+        pool.terminate()
+        pool.join()
+        _worker_state.clear()
+
+    control_sms = [results[idx] for idx in range(len(control_bases.bases))]
+    desc = BuilderDescription.combined(results["goals"], control_sms)
+
+    # test it for a second
+    sm = combined_sm = None
+    try:
+        sm = interface.create_statemachine(json.dumps(results["standard"]), propnet.roles)
+        combined_sm = interface.create_combined_statemachine(json.dumps(desc), propnet.roles)
+        assert sm is not None and combined_sm is not None, "failed to create statemachines"
+        count = compare_statemachines(combined_sm, sm, 1.0)
+
+    except Exception:
+        log.warning("Failed to run sucessful rollouts in combined statemachine")
+        traceback.print_exc()
+        return None
+
+    finally:
+        for s in sm, combined_sm:
+            if s is not None:
+                interface.dealloc_statemachine(s)
+
+    log.info("Ok played for one second in combined statemachine, did %s sucessful rollouts" % count)
+
+    if builder_class is BuilderDescription:
+        return desc
+
+    goal_sm_result = replay(results["goals"], builder_class())
     control_sms_result = []
-    for idx, p in enumerate(control_bases.networks):
-        sm_desc = do_build(p)
+    try:
+        for idx, control_cid, sm_desc in control_sms:
+            control_sms_result.append((idx, control_cid, replay(sm_desc, builder_class())))
 
-        # attach some extra info (easiest to process in c++)
-        sm_desc["idx"] = idx
-        sm_desc["control_cid"] = p.fixed_base.cid
-        control_sms_result.append(sm_desc)
+    except Exception:
+        _dealloc_results(builder_class, goal_sm_result, control_sms_result)
+        raise
 
-    return dict(num_controls=len(control_sms_result),
-                goal_sm=goal_sm_result,
-                control_sms=control_sms_result)
+    return builder_class.combined(goal_sm_result, control_sms_result)
 
 
 ###############################################################################
 # the api to getting statemachine.  No propnet downwind of this.
 ###############################################################################
 
+_json_filenames = dict(standard="standard_sm.json",
+                       goalless="goalless_sm.json",
+                       combined="combined_sm.json")
+
+_binary_filenames = dict(standard="standard_sm.bin",
+                         goalless="goalless_sm.bin",
+                         combined="combined_sm.bin")
+
+_create_from_json = dict(standard=interface.create_statemachine,
+                         goalless=interface.create_goalless_statemachine,
+                         combined=interface.create_combined_statemachine)
+
+_create_from_binary = dict(standard=interface.create_statemachine_from_binary,
+                           goalless=interface.create_goalless_statemachine_from_binary,
+                           combined=interface.create_combined_statemachine_from_binary)
+
+
+def _load_from_store(the_game_store, preferred, roles):
+    assert preferred in _json_filenames, "WHAT IS THIS? %s" % preferred
+
+    # binary is much faster to load, but older stores will only have the json
+    binary_filename = _binary_filenames[preferred]
+    if not the_game_store.file_exists(binary_filename):
+        desc = json.loads(the_game_store.load_contents(_json_filenames[preferred]))
+        the_game_store.save_contents(binary_filename, binary.to_binary[preferred](desc))
+
+    path = os.path.join(the_game_store.path, binary_filename)
+    return _create_from_binary[preferred](path, roles)
+
+
 def build_sm(gdl_str,
              try_combined=True,
              no_goalless=False,
              the_game_store=None,
-             add_to_game_store=None):
+             add_to_game_store=None,
+             reorder_for_locality=None,
+             num_workers=BUILD_WORKERS,
+             build_timeout=BUILD_TIMEOUT,
+             store_propnet=False):
+    ''' reorder_for_locality profiles the propnet and renumbers its components so that hot
+        chains are contiguous (see ggplib.statemachine.locality).  Defaults to on when adding
+        to the_game_store, since it is then only done once per game.
+
+        num_workers/build_timeout are for building a combined statemachine (see
+        build_combined_state_machine()).
+
+        store_propnet also keeps the propnet file in the_game_store (see
+        getpropnet.get_with_gdl()). '''
 
     # bypasses everything below
     if the_game_store is not None:
@@ -340,66 +805,224 @@ def build_sm(gdl_str,
             model = StateMachineModel()
             model.from_description(sm_info["model"])
 
-            if preferred == "standard":
-                json_str = the_game_store.load_contents("standard_sm.json")
-                sm = interface.create_statemachine(json_str, model.roles)
+            sm = _load_from_store(the_game_store, preferred, model.roles)
+            return model, sm
 
-            elif preferred == "goalless":
-                json_str = the_game_store.load_contents("goalless_sm.json")
-                sm = interface.create_goalless_statemachine(json_str, model.roles)
 
-            elif preferred =="combined":
-                json_str = the_game_store.load_contents("combined_sm.json")
-                sm = interface.create_combined_statemachine(json_str, model.roles)
+    store = the_game_store is not None and add_to_game_store
 
-            else:
-                assert False, "WHAT IS THIS? %s" % preferred
+    propnet = getpropnet.get_with_gdl(gdl_str,
+                                      props_store=the_game_store if store and store_propnet else None)
 
-            return model, sm
+    model = StateMachineModel()
+    model.from_propnet(propnet)
 
+    # if there is nothing to store, skip the json and build directly in c++
+    builder_class = BuilderDescription if store else BuilderDirect
 
-    propnet = getpropnet.get_with_gdl(gdl_str)
-    role_count = len(propnet.role_infos)
+    if reorder_for_locality is None:
+        reorder_for_locality = store
 
-    model = StateMachineModel()
-    model.from_propnet(propnet)
+    if reorder_for_locality:
+        propnet.component_order = locality.get_component_order(propnet, the_game_store)
 
-    sm = None
-    json_str = None
+    desc = None
     preferred = None
 
     # guess and see
-    if try_combined and role_count == 2:
-        desc = build_combined_state_machine(propnet)
+    if try_combined:
+        desc = build_combined_state_machine(propnet, builder_class=builder_class,
+                                            num_workers=num_workers, timeout=build_timeout)
         if desc:
-            json_str = json.dumps(desc)
-            sm = interface.create_combined_statemachine(json_str, model.roles)
             preferred = "combined"
 
-    if sm is None:
+    if preferred is None:
         if no_goalless:
-            desc = build_standard_sm(propnet)
-            json_str = json.dumps(desc)
-            sm = interface.create_statemachine(json_str, model.roles)
+            desc = build_standard_sm(propnet, builder_class=builder_class)
             preferred = "standard"
         else:
-            desc = build_goalless_sm(propnet)
-            json_str = json.dumps(desc)
-            sm = interface.create_goalless_statemachine(json_str, model.roles)
+            desc = build_goalless_sm(propnet, builder_class=builder_class)
             preferred = "goalless"
 
+    if not store:
+        sm = interface.StateMachine(desc, model.roles)
+        return model, sm
+
+    json_str = json.dumps(desc)
+    sm = _create_from_json[preferred](json_str, model.roles)
+
     assert sm is not None and json_str is not None and preferred is not None
 
-    if the_game_store is not None and add_to_game_store:
+    _save_to_store(the_game_store, preferred, desc, json_str, model)
+    return model, sm
+
 
-        sm_info_desc = dict(preferred=preferred,
-                            model=model.to_description())
+def _save_to_store(the_game_store, preferred, desc, json_str, model):
+    sm_info_desc = dict(preferred=preferred,
+                        model=model.to_description())
 
-        filename_map = dict(standard="standard_sm.json",
-                            goalless="goalless_sm.json",
-                            combined="combined_sm.json")
+    # a previous build may have died after writing these, but before sm_info.json
+    the_game_store.save_contents(_json_filenames[preferred], json_str, overwrite=True)
+    the_game_store.save_contents(_binary_filenames[preferred], binary.to_binary[preferred](desc),
+                                 overwrite=True)
 
-        the_game_store.save_contents(filename_map[preferred], json_str)
-        the_game_store.save_json("sm_info.json", sm_info_desc)
+    # last, since its existence means the rest is there
+    the_game_store.save_json("sm_info.json", sm_info_desc)
 
-    return model, sm
+
+###############################################################################
+# tiered build, for when there is no time to wait on build_sm()
+
+def build_upgrade(gdl_str, the_game_store, try_combined=True,
+                  num_workers=PARALLEL_BUILD_WORKERS, build_timeout=BUILD_TIMEOUT,
+                  check_seconds=1.0):
+    ''' the work of StateMachineUpgrade, run in its own process (see
+        ggplib.statemachine.upgrade).  Builds a combined (or failing that a goalless)
+        statemachine, checks it plays the same as the standard statemachine and saves it to
+        the_game_store as build_sm() would.  Returns the preferred statemachine, or None. '''
+
+    propnet = getpropnet.get_with_gdl(gdl_str, props_store=the_game_store)
+
+    model = StateMachineModel()
+    model.from_propnet(propnet)
+
+    desc = None
+    preferred = "combined"
+    if try_combined:
+        desc = build_combined_state_machine(propnet, num_workers=num_workers, timeout=build_timeout)
+
+    if desc is None:
+        preferred = "goalless"
+        desc = build_goalless_sm(propnet)
+
+    json_str = json.dumps(desc)
+
+    sm = reference_sm = None
+    try:
+        sm = _create_from_json[preferred](json_str, model.roles)
+        reference_sm = interface.create_statemachine(json.dumps(build_standard_sm(propnet)),
+                                                     model.roles)
+        assert sm is not None and reference_sm is not None, "failed to create statemachines"
+        count = compare_statemachines(sm, reference_sm, check_seconds)
+
+    except Exception:
+        log.warning("Tiered build: %s statemachine failed depth charges" % preferred)
+        log.warning(traceback.format_exc())
+        return None
+
+    finally:
+        for s in sm, reference_sm:
+            if s is not None:
+                interface.dealloc_statemachine(s)
+
+    log.info("Tiered build: %s statemachine ready (%d depth charges)" % (preferred, count))
+    _save_to_store(the_game_store, preferred, desc, json_str, model)
+    return preferred
+
+
+class StateMachineUpgrade(object):
+    ''' builds a combined (or failing that a goalless) statemachine in a separate process (see
+        build_sm_tiered() and build_upgrade()), so none of the build competes with the player for
+        the GIL.  The process is started fresh rather than forked, and saves the statemachine to
+        the_game_store.  Once it is done, the statemachine is loaded and passed to on_ready() -
+        which takes ownership of it. '''
+
+    def __init__(self, gdl_str, model, the_game_store, try_combined=True,
+                 num_workers=PARALLEL_BUILD_WORKERS, build_timeout=BUILD_TIMEOUT,
+                 check_seconds=1.0, temporary=False):
+        self.gdl_str = gdl_str
+        self.model = model
+
+        # where the process saves the upgrade (along with the propnet), removed afterwards if
+        # temporary
+        self.the_game_store = the_game_store
+        self.temporary = temporary
+
+        self.try_combined = try_combined
+        self.num_workers = num_workers
+        self.build_timeout = build_timeout
+        self.check_seconds = check_seconds
+
+        # "combined"/"goalless" once ready, None if failed or still going
+        self.preferred = None
+        self.proc = None
+        self.thread = None
+
+    def start(self, on_ready):
+        cmd = [sys.executable, "-m", "ggplib.statemachine.upgrade", self.the_game_store.path,
+               str(int(self.try_combined)), str(self.num_workers), str(self.build_timeout),
+               str(self.check_seconds)]
+
+        # ggplib may only be importable because of our sys.path
+        env = dict(os.environ)
+        ggplib_path = os.path.dirname(os.path.dirname(os.path.abspath(interface.__file__)))
+        env["PYTHONPATH"] = os.pathsep.join([ggplib_path] + filter(None, [env.get("PYTHONPATH")]))
+
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, close_fds=True, env=env)
+        self.proc.stdin.write(self.gdl_str)
+        self.proc.stdin.close()
+        atexit.register(self.stop)
+
+        # only waits on the process
+        self.thread = threading.Thread(target=self.run, args=(on_ready,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.kill()
+            except OSError:
+                pass
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def run(self, on_ready):
+        try:
+            return_code = self.proc.wait()
+            if return_code != 0:
+                log.warning("Tiered build: upgrade process failed (%s)" % return_code)
+                return
+
+            sm_info = self.the_game_store.load_json("sm_info.json")
+            preferred = sm_info["preferred"]
+            sm = _load_from_store(self.the_game_store, preferred, self.model.roles)
+            if sm is None:
+                log.warning("Tiered build: failed to load %s statemachine" % preferred)
+                return
+
+            self.preferred = preferred
+            on_ready(sm)
+
+        except Exception as exc:
+            log.error("Tiered build failed: %s" % exc)
+            log.error(traceback.format_exc())
+
+        finally:
+            if self.temporary:
+                shutil.rmtree(self.the_game_store.path, ignore_errors=True)
+
+
+def build_sm_tiered(gdl_str, try_combined=True, num_workers=PARALLEL_BUILD_WORKERS,
+                    build_timeout=BUILD_TIMEOUT, the_game_store=None):
+    ''' returns (model, standard statemachine, StateMachineUpgrade).  The standard statemachine
+        is the quickest to build.  Start the upgrade (StateMachineUpgrade.start()) to build
+        a faster one in the background.  If the_game_store is given, the propnet file and the
+        upgrade are saved there (see build_sm()).  Otherwise a temporary directory is used. '''
+
+    temporary = the_game_store is None
+    if temporary:
+        the_game_store = DirectoryStore(tempfile.mkdtemp(prefix="ggplib_upgrade_"))
+
+    propnet = getpropnet.get_with_gdl(gdl_str, props_store=the_game_store)
+
+    model = StateMachineModel()
+    model.from_propnet(propnet)
+
+    sm = interface.StateMachine(build_standard_sm(propnet, builder_class=BuilderDirect), model.roles)
+    upgrade = StateMachineUpgrade(gdl_str, model, the_game_store, try_combined=try_combined,
+                                  num_workers=num_workers, build_timeout=build_timeout,
+                                  temporary=temporary)
+    return model, sm, upgrade
@@ -0,0 +1,285 @@
+''' Generates game specific c++ propagation code from a standard statemachine description (see
+    builder.build_standard_sm()), compiles it to a shared object and attaches it to a propnet
+    statemachine (see statemachine/compiled.h).  The counts stay a flat array, each component gets
+    its own function with its outputs unrolled, and there are no instruction switches or pointer
+    chasing through the outputs. '''
+
+import os
+import json
+import hashlib
+import tempfile
+
+from ggplib.util import log
+from ggplib.util.runcmd import run
+from ggplib import interface
+from ggplib.propnet import getpropnet
+from ggplib.statemachine import builder
+from ggplib.statemachine.model import StateMachineModel
+
+# see propagate.h
+SAME_N, TRIGGER_LEGAL, TRIGGER_TRANSITION, INVERT_N, NOUGHT = range(5)
+
+COMPILER_FLAGS = ["-std=c++14", "-O2", "-fPIC", "-shared"]
+
+
+class CompileFailed(Exception):
+    pass
+
+
+class Topology(object):
+    ''' instructions/outputs of each component, the same as StateMachine::setComponent() and
+        StateMachine::recordFinalise() works them out. '''
+
+    def __init__(self, desc):
+        create = desc["create"]
+        self.num_bases = create["num_bases"]
+        self.num_components = create["num_components"]
+        self.num_outputs = create["num_outputs"]
+
+        self.roles = sorted(desc["roles"], key=lambda r: r["role_index"])
+
+        output_indices = [None] * self.num_components
+        self.instructions = [None] * self.num_components
+        for cid, _, _, output_index, number_outputs, _, incr, _ in desc["components"]:
+            output_indices[cid] = output_index
+            if number_outputs == 0:
+                self.instructions[cid] = NOUGHT
+            elif incr > 0:
+                self.instructions[cid] = SAME_N
+            else:
+                self.instructions[cid] = INVERT_N
+
+        # work out where the transitions start
+        total = self.num_bases
+        total += sum(r["num_inputs_legals"] for r in self.roles)
+        total += desc["control_flows"] + 1
+        total += sum(r["num_goals"] for r in self.roles)
+        self.transitions_index = total
+
+        self.role_indices = [0] * self.num_components
+        for cid in range(self.num_components):
+            if self.transitions_index <= cid < self.transitions_index + self.num_bases:
+                assert self.instructions[cid] == NOUGHT
+                self.instructions[cid] = TRIGGER_TRANSITION
+                continue
+
+            for role_index, r in enumerate(self.roles):
+                start = r["legal_start_index"]
+                if start != -1 and start <= cid < start + r["num_inputs_legals"]:
+                    assert self.instructions[cid] == NOUGHT
+                    self.instructions[cid] = TRIGGER_LEGAL
+                    self.role_indices[cid] = role_index
+
+        # outputs, in the same order as component_outputs
+        flat_outputs = [-1] * self.num_outputs
+        for output_index, cid in desc["outputs"]:
+            flat_outputs[output_index] = cid
+
+        self.outputs = []
+        for cid in range(self.num_components):
+            index = output_indices[cid]
+            outs = []
+            while flat_outputs[index] != -1:
+                outs.append(flat_outputs[index])
+                index += 1
+            self.outputs.append(outs)
+
+    def hash(self):
+        ''' same as StateMachine::topologyHash() (FNV-1a over 32 bit words), so setCompiled()
+            can check the compiled code is for the statemachine's topology '''
+        h = 14695981039346656037
+
+        def add(h, value):
+            return ((h ^ (value & 0xffffffff)) * 1099511628211) & 0xffffffffffffffff
+
+        for cid in range(self.num_components):
+            h = add(h, self.instructions[cid])
+            h = add(h, self.role_indices[cid])
+            for o in self.outputs[cid]:
+                h = add(h, o)
+            h = add(h, -1)
+
+        return h
+
+    def entries(self):
+        ' components that propagation starts from - bases and inputs '
+        for cid in range(self.num_bases):
+            yield cid
+
+        for r in self.roles:
+            start = r["input_start_index"]
+            for cid in range(start, start + r["num_inputs_legals"]):
+                yield cid
+
+
+def _calls(fn, outputs):
+    return ["%s%d(ctx);" % (fn, o) for o in outputs]
+
+
+def generate_source(desc):
+    ' returns the c++ source, for a standard statemachine description '
+    topology = Topology(desc)
+
+    targets = set()
+    for outs in topology.outputs:
+        targets.update(outs)
+    targets = sorted(targets)
+
+    lines = ["// generated by ggplib.statemachine.compiled - do not edit",
+             "#include <cstdlib>",
+             "#include \"statemachine/compiled.h\"",
+             "",
+             "using namespace GGPLib;",
+             ""]
+
+    for cid in targets:
+        lines.append("static void P%d(CompiledContext* ctx);" % cid)
+        lines.append("static void N%d(CompiledContext* ctx);" % cid)
+    lines.append("")
+
+    for cid in targets:
+        instruction = topology.instructions[cid]
+        outs = topology.outputs[cid]
+
+        if instruction == SAME_N:
+            on_true, on_false = _calls("P", outs), _calls("N", outs)
+
+        elif instruction == INVERT_N:
+            on_true, on_false = _calls("N", outs), _calls("P", outs)
+
+        elif instruction == TRIGGER_LEGAL:
+            role_index = topology.role_indices[cid]
+            legal = cid - topology.roles[role_index]["legal_start_index"]
+            on_true = ["ctx->legal_states[%d]->insert(%d);" % (role_index, legal)]
+            on_false = ["ctx->legal_states[%d]->remove(%d);" % (role_index, legal)]
+
+        elif instruction == TRIGGER_TRANSITION:
+            index = cid - topology.transitions_index
+            on_true = ["ctx->transition_state->set(%d, true);" % index]
+            on_false = ["ctx->transition_state->set(%d, false);" % index]
+
+        else:
+            on_true, on_false = [], []
+
+        lines.append("static void P%d(CompiledContext* ctx) {" % cid)
+        if on_true:
+            lines.append("    if (++ctx->counts[%d] == 0) {" % cid)
+            lines += ["        " + l for l in on_true]
+            lines.append("    }")
+        else:
+            lines.append("    ++ctx->counts[%d];" % cid)
+        lines.append("}")
+        lines.append("")
+
+        lines.append("static void N%d(CompiledContext* ctx) {" % cid)
+        if on_false:
+            lines.append("    if (ctx->counts[%d] == 0) {" % cid)
+            lines += ["        " + l for l in on_false]
+            lines.append("    }")
+            lines.append("")
+        lines.append("    ctx->counts[%d]--;" % cid)
+        lines.append("}")
+        lines.append("")
+
+    for name, fn in (("propagate_true", "P"), ("propagate_false", "N")):
+        lines.append("static void %s(CompiledContext* ctx, int component_id) {" % name)
+        lines.append("    switch (component_id) {")
+        for cid in topology.entries():
+            outs = topology.outputs[cid]
+            if outs:
+                lines.append("    case %d:" % cid)
+                lines += ["        " + l for l in _calls(fn, outs)]
+                lines.append("        break;")
+        lines.append("    default:")
+        lines.append("        break;")
+        lines.append("    }")
+        lines.append("}")
+        lines.append("")
+
+    lines.append("static const CompiledPropnet compiled_propnet = {%d, %d, %dULL, propagate_true, propagate_false};" % (
+        topology.num_components, topology.num_outputs, topology.hash()))
+    lines.append("")
+    lines.append("extern \"C\" const CompiledPropnet* ggplib_compiled_propnet() {")
+    lines.append("    return &compiled_propnet;")
+    lines.append("}")
+    lines.append("")
+
+    return "\n".join(lines)
+
+
+def compile_source(source, so_path, timeout=600):
+    ' compiles source into the shared object so_path.  The .cpp is left next to it. '
+    cpp_path = os.path.splitext(so_path)[0] + ".cpp"
+    with open(cpp_path, "w") as f:
+        f.write(source)
+
+    # compile to a temporary name, so a partial .so is never picked up
+    tmp_path = "%s.%d.tmp" % (so_path, os.getpid())
+    cmd = ([os.environ.get("CXX", "g++")] + COMPILER_FLAGS +
+           ["-I", interface.ggplib_local_path, "-o", tmp_path, cpp_path])
+
+    log.info("compiling statemachine: %s" % " ".join(cmd))
+    return_code, _, err = run(cmd, timeout=timeout)
+    if return_code != 0:
+        raise CompileFailed("Failed to compile %s: %s" % (cpp_path, err))
+
+    os.rename(tmp_path, so_path)
+
+
+def cache_directory():
+    ''' where compiled shared objects are kept when there is no game store - shared by all
+        processes (of this user), as they are named by the hash of their source '''
+    directory = os.path.join(tempfile.gettempdir(), "ggplib_compiled_%d" % os.getuid())
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # created by someone else in the meantime
+            if not os.path.isdir(directory):
+                raise
+
+    return directory
+
+
+def get_compiled(desc, the_game_store=None):
+    ''' returns the path to the compiled shared object for desc.  Cached by the source's hash in
+        the_game_store (or cache_directory()). '''
+    source = generate_source(desc)
+    sha = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+    directory = the_game_store.path if the_game_store is not None else cache_directory()
+    so_path = os.path.join(directory, "compiled_sm_%s.so" % sha)
+    if not os.path.exists(so_path):
+        compile_source(source, so_path)
+
+    return so_path
+
+
+def build_compiled_sm(gdl_str, the_game_store=None):
+    ''' returns model, sm - where sm is a standard propnet statemachine using compiled
+        propagation.  The description and compiled code are cached in the_game_store. '''
+
+    desc_filename = "compiled_sm.json"
+    if the_game_store is not None and the_game_store.file_exists(desc_filename):
+        info = the_game_store.load_json(desc_filename)
+        model = StateMachineModel()
+        model.from_description(info["model"])
+        desc = info["desc"]
+
+    else:
+        propnet = getpropnet.get_with_gdl(gdl_str)
+        model = StateMachineModel()
+        model.from_propnet(propnet)
+        desc = builder.build_standard_sm(propnet)
+
+        if the_game_store is not None:
+            the_game_store.save_json(desc_filename, dict(model=model.to_description(),
+                                                         desc=desc))
+
+    so_path = get_compiled(desc, the_game_store)
+
+    sm = interface.create_statemachine(json.dumps(desc), model.roles)
+    compiled_sm = interface.CppStateMachines().get_compiled(sm, so_path)
+    interface.dealloc_statemachine(sm)
+
+    return model, compiled_sm
@@ -12,6 +12,9 @@ from ggplib.statemachine.forwards import FwdStateMachineAnalysis, FwdStateMachin
 
 DEBUG = False
 
+# the most networks a combined statemachine will be split into
+MAX_CONTROL_STATES = 8
+
 ###############################################################################
 
 class ControlBase:
@@ -23,77 +26,79 @@ class ControlBase:
         self.networks = []
 
     def constant_propagate(self, propnet):
-        count = 0
-        while count < len(self.bases):
-            log.info("splitting network for %s " % self.bases[count])
+        for index in range(len(self.bases)):
+            self.networks.append(self.split_network(propnet, index))
 
-            # dupe the propnet
-            split_propnet = propnet.dupe()
-            if self.strip_goals:
-                if DEBUG:
-                    print 'removing goals from network'
-                    split_propnet.print_summary()
+        assert len(self.networks) == len(self.bases)
 
-                split_propnet.unlink_deadends(split_propnet.all_set_without_goals())
-                split_propnet.ensure_valid()
-                if DEBUG:
-                    split_propnet.print_summary()
+    def split_network(self, propnet, index):
+        ''' returns a dupe of propnet with bases[index] set to true and the rest to false, constant
+            propagated and optimized.  Only depends on propnet, so can be done in any order (or
+            process, see builder.build_combined_state_machine()). '''
+        log.info("splitting network for %s " % self.bases[index])
 
-                # manually have to remove these (XXX - ughh) ZZZXXXZZZZ remove these lines.  Was
-                # this just to make the reorder_components() work?  we need to dupe_no_goals() -
-                # where goals that are dependent on something, need to be replaced with ors
-                for r in split_propnet.role_infos:
-                    old_goals = r.goals
-                    r.goals = []
-                    for g in old_goals:
-                        if g.cid in split_propnet.components:
-                            r.goals.append(g)
+        # dupe the propnet
+        split_propnet = propnet.dupe()
+        if self.strip_goals:
+            if DEBUG:
+                print 'removing goals from network'
+                split_propnet.print_summary()
 
-                split_propnet.optimize()
+            split_propnet.unlink_deadends(split_propnet.all_set_without_goals())
+            split_propnet.ensure_valid()
+            if DEBUG:
+                split_propnet.print_summary()
+
+            # manually have to remove these (XXX - ughh) ZZZXXXZZZZ remove these lines.  Was
+            # this just to make the reorder_components() work?  we need to dupe_no_goals() -
+            # where goals that are dependent on something, need to be replaced with ors
+            for r in split_propnet.role_infos:
+                old_goals = r.goals
+                r.goals = []
+                for g in old_goals:
+                    if g.cid in split_propnet.components:
+                        r.goals.append(g)
 
-            cp = ConstantPropagator(split_propnet)
+            split_propnet.optimize()
 
-            # set this one to true
-            s = split_propnet.components[self.bases[count].cid]
-            if DEBUG:
-                print 'SETTING TRUE', s
-            cp.constant_propagate(s, 1)
-            split_propnet.verify()
-            # # set the rest to false
-            index = 0
-            while index < len(self.bases):
-                if index != count:
-                    b = split_propnet.components[self.bases[index].cid]
-                    if DEBUG:
-                        print 'SETTING FALSE', b
-                    cp.constant_propagate(b, 0)
-                    split_propnet.verify()
-                    if DEBUG:
-                        print
-                index += 1
+        cp = ConstantPropagator(split_propnet)
 
-            count += 1
+        # set this one to true
+        s = split_propnet.components[self.bases[index].cid]
+        if DEBUG:
+            print 'SETTING TRUE', s
+        cp.constant_propagate(s, 1)
+        split_propnet.verify()
 
-            split_propnet.fixed_base = s
-            split_propnet.optimize(all_features=True)
-            split_propnet.breakup_large_inputs()
-            split_propnet.optimize()
+        # set the rest to false
+        for other, b in enumerate(self.bases):
+            if other != index:
+                b = split_propnet.components[b.cid]
+                if DEBUG:
+                    print 'SETTING FALSE', b
+                cp.constant_propagate(b, 0)
+                split_propnet.verify()
+                if DEBUG:
+                    print
 
-            # ugh, well ok then
-            for c in split_propnet.components.values():
-                assert len(c.inputs) <= MAX_FAN_OUT_SIZE
+        split_propnet.fixed_base = s
+        split_propnet.optimize(all_features=True)
+        split_propnet.breakup_large_inputs()
+        split_propnet.optimize()
 
-            # now we go through all our components and back_propagate everything
-            comps = [c for c in split_propnet.components.values() if not c.outputs and c.inputs]
-            split_propnet.do_backpropagate_on(comps)
+        # ugh, well ok then
+        for c in split_propnet.components.values():
+            assert len(c.inputs) <= MAX_FAN_OUT_SIZE
 
-            # need to do this again
-            split_propnet.topological_ordering()
-            split_propnet.verify()
-            split_propnet.print_summary()
-            self.networks.append(split_propnet)
+        # now we go through all our components and back_propagate everything
+        comps = [c for c in split_propnet.components.values() if not c.outputs and c.inputs]
+        split_propnet.do_backpropagate_on(comps)
 
-        assert len(self.networks) == len(self.bases)
+        # need to do this again
+        split_propnet.topological_ordering()
+        split_propnet.verify()
+        split_propnet.print_summary()
+        return split_propnet
 
 
 def do_we_have_control_bases(propnet, most_used_props, strip_goals=True):
@@ -140,6 +145,97 @@ def do_we_have_control_bases(propnet, most_used_props, strip_goals=True):
     return best
 
 
+class ExclusiveBasesWatcher:
+    ''' watches the states of depth charges (see forwards.depth_charges()) for groups of mutually
+        exclusive bases (see candidate_exclusive_bases()).  Counts how often the true one changes,
+        the group that changes the most is the best to split the network on. '''
+
+    def __init__(self, propnet, groups):
+        index = dict((b, ii) for ii, b in enumerate(propnet.base_propositions))
+        self.groups = [(bases, [index[b] for b in bases]) for bases in groups]
+        self.exclusive = [True] * len(groups)
+        self.changes = [0] * len(groups)
+        self.last = [None] * len(groups)
+
+        self(propnet.get_initial_state())
+
+    def __call__(self, base_map):
+        for ii, (_, indices) in enumerate(self.groups):
+            if not self.exclusive[ii]:
+                continue
+
+            true_indices = [idx for idx in indices if base_map[idx]]
+            if len(true_indices) != 1:
+                self.exclusive[ii] = False
+                continue
+
+            if self.last[ii] is not None and self.last[ii] != true_indices[0]:
+                self.changes[ii] += 1
+            self.last[ii] = true_indices[0]
+
+    def best(self):
+        best = None
+        for ii, (bases, _) in enumerate(self.groups):
+            if self.exclusive[ii] and self.changes[ii]:
+                if best is None or self.changes[ii] > self.changes[best]:
+                    best = ii
+
+        if best is None:
+            return None
+
+        log.info("exclusive bases %s, changed %d times" % (self.groups[best][0], self.changes[best]))
+        return self.groups[best][0]
+
+
+def provably_exclusive(propnet, bases):
+    ''' True if exactly one of bases is true in every reachable state.  Proven by induction:
+        exactly one is true in the initial state, and the transition of each is fed directly by
+        one of the others (one to one) - so the next values are a permutation of the current ones.
+        Alternating (control ?role) bases are like this, (step ?n) bases are not. '''
+    group = set(bases)
+    initial = dict(zip(propnet.base_propositions, propnet.get_initial_state()))
+    if sum(1 for b in bases if initial[b]) != 1:
+        return False
+
+    feeds = set()
+    for b, t in zip(propnet.base_propositions, propnet.transitions):
+        if b not in group:
+            continue
+
+        if len(t.inputs) != 1:
+            return False
+
+        i = t.inputs[0]
+        if i not in group or i in feeds:
+            return False
+        feeds.add(i)
+
+    return len(feeds) == len(group)
+
+
+def candidate_exclusive_bases(propnet):
+    ''' groups of bases that are mutually exclusive (see provably_exclusive()), from those with
+        the same name (such as (control ?role)), and all the bases without arguments (such as
+        (whiteToMove) (blackToMove)).  Only groups of 2 - MAX_CONTROL_STATES are returned. '''
+
+    by_name = {}
+    atoms = []
+    for b in propnet.base_propositions:
+        gdl = b.meta.gdl
+        if not isinstance(gdl, symbols.ListTerm) or len(gdl) != 2:
+            continue
+
+        base_gdl = gdl[1]
+        if isinstance(base_gdl, symbols.ListTerm):
+            by_name.setdefault(base_gdl[0], []).append(b)
+        else:
+            atoms.append(b)
+
+    groups = by_name.values() + [atoms]
+    return [bases for bases in groups
+            if 2 <= len(bases) <= MAX_CONTROL_STATES and provably_exclusive(propnet, bases)]
+
+
 # ok, bucket the loops into seperate maps
 class ControlFlowLoop:
     def __init__(self):
@@ -263,17 +359,27 @@ def get_control_bases(propnet):
 
     # fall back to statistical methods
     test_sm = FwdStateMachineAnalysis(propnet)
+    watcher = ExclusiveBasesWatcher(propnet, candidate_exclusive_bases(propnet))
 
     # run for 1 second
     if DEBUG:
         print 'Start', test_sm
-    depth_charges(test_sm, 1)
+    depth_charges(test_sm, 1, state_watcher=watcher)
 
     # determine most used props
     most_used_props = [(sum(visits for visits, _ in x.store_propagates), x)
                        for x in propnet.base_propositions + propnet.input_propositions]
     most_used_props.sort(reverse=True)
     control_bases = do_we_have_control_bases(propnet, most_used_props, strip_goals=True)
+    if control_bases is not None:
+        return control_bases
+
+    # otherwise any small set of mutually exclusive bases
+    bases = watcher.best()
+    if bases is not None:
+        return ControlBase(list(bases), strip_goals=True)
+
+    return None
 
 
 def get_and_test_control_bases(propnet):
@@ -15,6 +15,7 @@ def depth_charges(sm, seconds):
     # cache some objects
     joint_move = sm.get_joint_move()
     base_state = sm.new_base_state()
+    goal_values = sm.get_goal_values()
 
     # resolution is assumed to be good enough not to cheat too much here (we return
     # msecs_taken so it is all good)
@@ -51,8 +52,9 @@ def depth_charges(sm, seconds):
             depth += 1
 
         # simulate side effect of getting the scores from the statemachine
+        sm.get_goal_values(goal_values)
         for ri in range(role_count):
-            all_scores[ri].append(sm.get_goal_value(ri))
+            all_scores[ri].append(int(goal_values[ri]))
 
         # stats
         rollouts += 1
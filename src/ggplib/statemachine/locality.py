@@ -0,0 +1,131 @@
+''' Renumbers the control flow components (AND/OR/NOT) of a propnet, so that components which
+    fire together are next to each other in the c++ components/counts arrays.
+
+    A standard statemachine is built from a dupe of the propnet and profiled over some sample
+    depth charges (see StateMachine.set_profiling()).  Every time a component is activated all its
+    outputs are visited, so the activations are the co-activation counts along the edges of the
+    propnet.  Hot chains are then laid out greedily: starting from the most visited component not
+    yet placed, follow the most visited output while the current component is activated.
+    Components which were never visited go last, in topological order.
+
+    The result is a list of cids, set as propnet.component_order (and copied by dupe()), which
+    reorder_components() then uses.  Only the control flow block moves, the bases, inputs,
+    terminal, goals, transitions and legals keep their fixed ranges (see
+    StateMachine::recordFinalise()).  The order is saved in the game store, keyed by a signature of
+    the propnet, so it is computed once per game. '''
+
+import json
+import hashlib
+
+from ggplib.util import log
+from ggplib import interface
+from ggplib.propnet.constants import OR, AND, NOT
+
+PROFILE_ROLLOUTS = 200
+
+ORDER_FILENAME = "component_order.json"
+
+
+def is_control_flow(c):
+    return c.component_type in (AND, OR, NOT)
+
+
+def signature(propnet):
+    ' identifies the propnet (and its cids) that an order is for '
+    sha = hashlib.sha1()
+    for cid in sorted(propnet.components):
+        c = propnet.components[cid]
+        inputs = ",".join(str(i) for i in sorted(i.cid for i in c.inputs))
+        sha.update(("%d:%d:%s;" % (cid, c.component_type, inputs)).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+def profile_propnet(propnet, rollouts=PROFILE_ROLLOUTS):
+    ''' runs depth charges on a standard statemachine built from propnet.  Returns two dicts
+        {cid: count} of the visits and activations, keyed by propnet's cids. '''
+
+    # avoid circular import
+    from ggplib.statemachine import builder
+
+    # do_build() renumbers the dupe, so remember the cids before that
+    dupe = propnet.dupe()
+    dupe.component_order = None
+    original_cids = dict((id(c), c.cid) for c in dupe.components.values())
+
+    sm = interface.StateMachine(builder.do_build(dupe, the_builder=builder.BuilderDirect()),
+                                propnet.roles)
+    assert sm.set_profiling(True)
+
+    initial_state = sm.get_initial_state()
+    interface.depth_charge_batch(sm, initial_state, rollouts)
+    profile = sm.get_profile()
+
+    visits, activations = {}, {}
+    for c in dupe.components.values():
+        cid = original_cids[id(c)]
+        visits[cid] = int(profile.visits[c.cid])
+        activations[cid] = int(profile.activations[c.cid])
+
+    log.info("locality: profiled %d rollouts, %d cascades, %d visits" % (rollouts,
+                                                                        profile.cascade_count,
+                                                                        profile.total_visits))
+
+    interface.dealloc_basestate(initial_state)
+    interface.dealloc_statemachine(sm)
+    return visits, activations
+
+
+def hot_chain_order(propnet, visits, activations):
+    ' returns the cids of the control flow components of propnet, hot chains first '
+
+    # topological order, which is also the tie breaker and the order of the cold components
+    control_flow = [c for level in propnet.levels for c in level if is_control_flow(c)]
+    position = dict((c.cid, ii) for ii, c in enumerate(control_flow))
+
+    def heat(c):
+        return (-visits.get(c.cid, 0), position[c.cid])
+
+    order = []
+    placed = set()
+    for seed in sorted(control_flow, key=heat):
+        if seed.cid in placed or not visits.get(seed.cid, 0):
+            continue
+
+        c = seed
+        while c is not None:
+            order.append(c.cid)
+            placed.add(c.cid)
+
+            candidates = []
+            if activations.get(c.cid, 0):
+                candidates = [o for o in c.outputs
+                              if is_control_flow(o) and o.cid not in placed and visits.get(o.cid, 0)]
+
+            c = min(candidates, key=heat) if candidates else None
+
+    # cold
+    order += [c.cid for c in control_flow if c.cid not in placed]
+    return order
+
+
+def get_component_order(propnet, the_game_store=None, rollouts=PROFILE_ROLLOUTS):
+    ' returns the component order for propnet, from the_game_store if it was computed already '
+
+    sig = signature(propnet)
+    if the_game_store is not None and the_game_store.file_exists(ORDER_FILENAME):
+        info = the_game_store.load_json(ORDER_FILENAME)
+        if info["signature"] == sig:
+            return info["order"]
+
+        log.warning("locality: %s is for a different propnet, recomputing" % ORDER_FILENAME)
+
+    visits, activations = profile_propnet(propnet, rollouts=rollouts)
+    order = hot_chain_order(propnet, visits, activations)
+
+    if the_game_store is not None:
+        the_game_store.save_contents(ORDER_FILENAME,
+                                     json.dumps(dict(signature=sig, order=order)),
+                                     overwrite=True)
+
+    return order
@@ -38,7 +38,6 @@ class StateMachineModel(object):
 
     def basestate_to_str(self, bs):
         ' from basestate to string '
-        if isinstance(bs, (list, tuple)):
-            return " ".join([self.bases[i] for i in range(len(bs)) if bs[i]])
-        else:
-            return " ".join([self.bases[i] for i in range(bs.len()) if bs.get(i)])
+        if not isinstance(bs, (list, tuple)):
+            bs = bs.unpack()
+        return " ".join([self.bases[i] for i in range(len(bs)) if bs[i]])
@@ -1,3 +1,5 @@
+import os
+import json
 import pprint
 from ggplib.util import log
 from ggplib.propnet import getpropnet
@@ -44,3 +46,172 @@ def test_building_desc_variations():
 
         desc = builder.build_goalless_sm(propnet)
         pprint.pprint(desc)
+
+
+def replay_direct(desc):
+    ' builds the c++ statemachine for desc (from any of the build functions) with BuilderDirect '
+    if "create" in desc:
+        return builder.replay(desc, builder.BuilderDirect())
+
+    if "goalless_sm" in desc:
+        return builder.BuilderDirect.goalless(desc["role_count"],
+                                              replay_direct(desc["goal_sm"]),
+                                              replay_direct(desc["goalless_sm"]))
+
+    return builder.BuilderDirect.combined(replay_direct(desc["goal_sm"]),
+                                          [(d["idx"], d["control_cid"], replay_direct(d))
+                                           for d in desc["control_sms"]])
+
+
+def test_building_direct():
+    import json
+    from ggplib import interface
+    from ggplib.statemachine.model import StateMachineModel
+
+    for game, propnet in get_propnets():
+        log.warning("test_building_direct() for: %s" % game)
+        model = StateMachineModel()
+        model.from_propnet(propnet)
+
+        for build, create in ((builder.build_standard_sm, interface.create_statemachine),
+                              (builder.build_goalless_sm, interface.create_goalless_statemachine),
+                              (builder.build_combined_state_machine,
+                               interface.create_combined_statemachine)):
+
+            # build once, so both statemachines come from the same built propnet
+            desc = build(propnet)
+            if desc is None:
+                continue
+
+            sm = create(json.dumps(desc), model.roles)
+            sm_direct = interface.StateMachine(replay_direct(desc), model.roles)
+
+            assert sm.get_initial_state().equals(sm_direct.get_initial_state())
+            for ri in range(len(model.roles)):
+                legals = sorted(sm.get_legal_state(ri).to_list())
+                assert legals == sorted(sm_direct.get_legal_state(ri).to_list())
+
+            interface.depth_charge(sm_direct, 1)
+
+            interface.dealloc_statemachine(sm)
+            interface.dealloc_statemachine(sm_direct)
+
+
+def test_exclusive_bases():
+    from ggplib.statemachine import controls, forwards
+
+    propnet = getpropnet.get_with_game("ticTacToe")
+    groups = controls.candidate_exclusive_bases(propnet)
+    assert all(2 <= len(bases) <= controls.MAX_CONTROL_STATES for bases in groups)
+
+    # the cells are not exclusive
+    cells = [b for b in propnet.base_propositions if b.meta.gdl[1][0] == "cell"]
+    assert not controls.provably_exclusive(propnet, cells[:3])
+
+    watcher = controls.ExclusiveBasesWatcher(propnet, groups)
+    forwards.depth_charges(forwards.FwdStateMachineAnalysis(propnet), 0.25, state_watcher=watcher)
+
+    # (control xplayer) / (control oplayer) alternate every move
+    bases = watcher.best()
+    assert bases is not None and len(bases) == 2
+    assert all(b.meta.gdl[1][0] == "control" for b in bases)
+
+
+def test_worklist_optimize():
+    from ggplib import interface
+    from ggplib.propnet import factory
+
+    for game, propnet in get_propnets():
+        log.warning("test_worklist_optimize() for: %s" % game)
+
+        sweeps, worklist = propnet.dupe(), propnet.dupe()
+        sweeps.optimize_sweeps()
+        factory.WorklistOptimizer(worklist).run()
+        log.info("%s sweeps: %d, worklist: %d" % (game, len(sweeps.components),
+                                                   len(worklist.components)))
+        assert len(worklist.components) <= len(sweeps.components)
+
+        # nothing left for the sweeps to do
+        for p in sweeps, worklist:
+            p = p.dupe()
+            assert p.unlink_deadends(p.all_set()) == 0
+            assert p.subexpr_elimination() == 0
+            assert p.unlink_passthrough_components() == 0
+
+        # and plays the same as the sweeps
+        for p in sweeps, worklist:
+            p.fixup_requires()
+
+        roles = propnet.roles
+        sweeps_sm = interface.create_statemachine(json.dumps(builder.build_standard_sm(sweeps)), roles)
+        worklist_sm = interface.create_statemachine(json.dumps(builder.build_standard_sm(worklist)), roles)
+        assert builder.compare_statemachines(worklist_sm, sweeps_sm, 0.25) > 0
+
+        for s in sweeps_sm, worklist_sm:
+            interface.dealloc_statemachine(s)
+
+
+def check_interchange(kif_filename):
+    from cStringIO import StringIO
+    from ggplib.propnet import interchange
+
+    roles, entries = getpropnet.load_binary(kif_filename)
+    entries = list(entries)
+
+    # round trip
+    f = StringIO()
+    interchange.write(f, roles, entries)
+    roles2, entries2 = interchange.read(f.getvalue())
+    assert roles2 == roles
+    assert list(entries2) == entries
+
+    # same as the python module
+    module = getpropnet.load_module(kif_filename)
+    assert module.roles == roles
+    assert sorted(module.entries) == sorted(entries)
+
+
+def test_interchange():
+    for game in games:
+        log.warning("test_interchange() for: %s" % game)
+        kif_filename = os.path.join(getpropnet.rulesheet_dir, game + ".kif")
+
+        # remove whatever this creates afterwards, otherwise later loads will use it
+        _, props_file = getpropnet.kif_filename_to_propfile(kif_filename)
+        bin_file = getpropnet.kif_filename_to_binfile(kif_filename)
+        created = [fn for fn in (props_file, props_file + "c", bin_file) if not os.path.exists(fn)]
+
+        try:
+            check_interchange(kif_filename)
+
+        finally:
+            for fn in created:
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+
+def test_building_combined_parallel():
+    from ggplib import interface
+
+    for game in ("ticTacToe", "connectFour", "breakthrough"):
+        log.warning("test_building_combined_parallel() for: %s" % game)
+        propnet = getpropnet.get_with_game(game)
+
+        desc = builder.build_combined_state_machine(propnet, num_workers=2)
+        if desc is None:
+            continue
+
+        roles = propnet.roles
+        combined_sm = interface.create_combined_statemachine(json.dumps(desc), roles)
+        sm = interface.create_statemachine(json.dumps(builder.build_standard_sm(propnet)), roles)
+        assert builder.compare_statemachines(combined_sm, sm, 0.25) > 0
+
+        # and directly
+        direct = builder.build_combined_state_machine(propnet, builder_class=builder.BuilderDirect,
+                                                      num_workers=2)
+        assert direct is not None
+        direct_sm = interface.StateMachine(direct, roles)
+        assert builder.compare_statemachines(direct_sm, sm, 0.25) > 0
+
+        for s in combined_sm, sm, direct_sm:
+            interface.dealloc_statemachine(s)
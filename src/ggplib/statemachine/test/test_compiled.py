@@ -0,0 +1,107 @@
+import copy
+import json
+import random
+
+import pytest
+
+from ggplib.util import log
+from ggplib import interface
+from ggplib.db import helper
+from ggplib.db.store import DirectoryStore
+from ggplib.propnet import getpropnet
+from ggplib.statemachine import builder, compiled
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+def play_side_by_side(sm, compiled_sm, steps=500):
+    role_count = len(sm.get_roles())
+    sms = [sm, compiled_sm]
+
+    base_states = [s.new_base_state() for s in sms]
+    joint_moves = [s.get_joint_move() for s in sms]
+
+    for s in sms:
+        s.reset()
+
+    def sorted_legals(s):
+        # the order of a LegalState depends on the order legals were set/unset
+        return [sorted(s.get_legal_state(ri).to_list()) for ri in range(role_count)]
+
+    for _ in range(steps):
+        assert compiled_sm.is_terminal() == sm.is_terminal()
+
+        if sm.is_terminal():
+            # both goals, before resetting either
+            goals = [[s.get_goal_value(ri) for ri in range(role_count)] for s in sms]
+            assert goals[0] == goals[1]
+            for s in sms:
+                s.reset()
+            continue
+
+        legals = sorted_legals(sm)
+        assert sorted_legals(compiled_sm) == legals
+
+        choices = [random.choice(l) for l in legals]
+        for s, bs, jm in zip(sms, base_states, joint_moves):
+            for ri, choice in enumerate(choices):
+                jm.set(ri, choice)
+            s.next_state(jm, bs)
+            s.update_bases(bs)
+
+        assert base_states[0].equals(base_states[1])
+
+    for bs in base_states:
+        interface.dealloc_basestate(bs)
+    for jm in joint_moves:
+        interface.dealloc_jointmove(jm)
+
+
+def test_compiled(tmpdir):
+    for game in ("ticTacToe", "connectFour", "breakthrough"):
+        gdl_str = helper.get_gdl_for_game(game)
+        store = DirectoryStore(str(tmpdir.mkdir(game)))
+
+        _, sm = builder.build_sm(gdl_str, try_combined=False, no_goalless=True)
+        _, compiled_sm = compiled.build_compiled_sm(gdl_str, the_game_store=store)
+        assert store.listdir("compiled_sm_*.so")
+
+        play_side_by_side(sm, compiled_sm)
+
+        # cached second time around, and dupes keep the compiled propagation
+        _, compiled_sm2 = compiled.build_compiled_sm(gdl_str, the_game_store=store)
+        dupe_sm = compiled_sm2.dupe()
+        play_side_by_side(sm, dupe_sm)
+
+        msecs_taken, rollouts, _ = interface.depth_charge(compiled_sm, 1)
+        log.info("%s compiled rollouts per second %.2f" % (game, rollouts / (msecs_taken / 1000.0)))
+
+        for s in (sm, compiled_sm, compiled_sm2, dupe_sm):
+            interface.dealloc_statemachine(s)
+
+
+def test_compiled_mismatch(tmpdir):
+    propnet = getpropnet.get_with_game("ticTacToe")
+    desc = builder.build_standard_sm(propnet)
+
+    # same number of components and outputs, but two outputs swapped
+    other_desc = copy.deepcopy(desc)
+    outputs = other_desc["outputs"] = [list(o) for o in desc["outputs"]]
+    a = next(o for o in outputs if o[1] != -1)
+    b = next(o for o in outputs if o[1] not in (-1, a[1]))
+    a[1], b[1] = b[1], a[1]
+
+    store = DirectoryStore(str(tmpdir))
+    so_path = compiled.get_compiled(other_desc, store)
+
+    sm = interface.create_statemachine(json.dumps(desc), propnet.roles)
+    with pytest.raises(AssertionError):
+        interface.CppStateMachines().get_compiled(sm, so_path)
+
+    # and is accepted for its own topology
+    compiled_sm = interface.CppStateMachines().get_compiled(sm, compiled.get_compiled(desc, store))
+    for s in sm, compiled_sm:
+        interface.dealloc_statemachine(s)
@@ -0,0 +1,75 @@
+from ggplib import interface
+from ggplib.propnet import getpropnet
+from ggplib.propnet.constants import OR, AND, NOT
+from ggplib.statemachine import builder, locality
+from ggplib.db.store import DirectoryStore
+from ggplib.db import helper
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+def test_hot_chain_order():
+    propnet = getpropnet.get_with_game("connectFour")
+    control_flow = set(c.cid for c in propnet.components.values()
+                       if c.component_type in (AND, OR, NOT))
+
+    visits, activations = locality.profile_propnet(propnet, rollouts=50)
+    assert set(visits) == set(propnet.components)
+    assert sum(visits.values()) > 0
+
+    order = locality.hot_chain_order(propnet, visits, activations)
+    assert len(order) == len(control_flow)
+    assert set(order) == control_flow
+
+    # hottest first, cold last
+    assert visits[order[0]] == max(visits[cid] for cid in control_flow)
+    assert visits[order[-1]] <= visits[order[0]]
+
+
+def test_reordered_builds():
+    propnet = getpropnet.get_with_game("ticTacToe")
+    propnet.component_order = locality.get_component_order(propnet, rollouts=50)
+
+    # the reordered dupes have the control flow block as given
+    dupe = propnet.dupe()
+    original = dict((id(c), c.cid) for c in dupe.components.values())
+    builder.do_build(dupe, the_builder=builder.BuilderDescription())
+
+    control_flow = sorted((c for c in dupe.components.values()
+                           if c.component_type in (AND, OR, NOT)), key=lambda c: c.cid)
+    assert [original[id(c)] for c in control_flow] == propnet.component_order
+
+    # and still plays the game
+    for desc in (builder.build_standard_sm(propnet),
+                 builder.build_goalless_sm(propnet)):
+        assert desc is not None
+
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str, no_goalless=True, try_combined=False,
+                             reorder_for_locality=True)
+    scores, depths = interface.depth_charge_batch(sm, sm.get_initial_state(), 20)
+    for ii in range(20):
+        assert 5 <= int(depths[ii]) <= 9
+
+    interface.dealloc_statemachine(sm)
+
+
+def test_order_persisted(tmpdir, monkeypatch):
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    store = DirectoryStore(str(tmpdir))
+
+    _, sm = builder.build_sm(gdl_str, the_game_store=store, add_to_game_store=True)
+    assert store.file_exists(locality.ORDER_FILENAME)
+    interface.dealloc_statemachine(sm)
+
+    # computed once for a propnet, then loaded from the store
+    propnet = getpropnet.get_with_gdl(gdl_str)
+    order = locality.get_component_order(propnet, store, rollouts=50)
+    assert store.load_json(locality.ORDER_FILENAME)["order"] == order
+
+    # no profiling this time
+    monkeypatch.setattr(locality, "profile_propnet", None)
+    assert locality.get_component_order(propnet, store) == order
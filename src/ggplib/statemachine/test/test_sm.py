@@ -134,3 +134,456 @@ def test_dupes_deallocs():
     for game in ("ticTacToe", "connectFour", "breakthrough"):
         gdl_str = helper.get_gdl_for_game(game)
         go(gdl_str)
+
+
+def test_depth_charge_threaded():
+    gdl_str = helper.get_gdl_for_game("connectFour")
+    _, sm = builder.build_sm(gdl_str)
+
+    num_workers = 4
+    msecs_taken, rollouts, num_state_changes, workers = interface.depth_charge(sm, 1, num_workers)
+    log.info("%s threads, rollouts per second %.2f" % (num_workers,
+                                                       (rollouts / float(msecs_taken)) * 1000))
+
+    assert len(workers) == num_workers
+    assert rollouts == sum(w[1] for w in workers)
+    assert num_state_changes == sum(w[2] for w in workers)
+    assert msecs_taken == max(w[0] for w in workers)
+    for _, worker_rollouts, _ in workers:
+        assert worker_rollouts > 0
+
+    interface.dealloc_statemachine(sm)
+
+
+def test_depth_charge_batch():
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str)
+
+    count = 100
+    role_count = len(sm.get_roles())
+    initial_state = sm.get_initial_state()
+
+    scores, depths = interface.depth_charge_batch(sm, initial_state, count)
+    flat_scores = [int(s) for s in interface.ffi.unpack(interface.int_ptr(scores),
+                                                         count * role_count)]
+    flat_depths = [int(d) for d in interface.ffi.unpack(interface.int_ptr(depths), count)]
+
+    for ii in range(count):
+        # tictactoe is fixed sum and ends after 5 to 9 moves
+        assert sum(flat_scores[ii * role_count:(ii + 1) * role_count]) == 100
+        assert 5 <= flat_depths[ii] <= 9
+
+    # reuse caller provided buffers
+    batch = interface.BatchRollouts(sm)
+    scores2 = interface.new_int_buffer(count, role_count)
+    depths2 = interface.new_int_buffer(count)
+    res = batch.run(initial_state, count, scores2, depths2)
+    assert res[0] is scores2 and res[1] is depths2
+    interface.dealloc_batch_rollouts(batch)
+
+    interface.dealloc_basestate(initial_state)
+    interface.dealloc_statemachine(sm)
+
+
+def tictactoe_rollouts(sm, count, bitsliced):
+    ''' runs count rollouts via BatchRollouts, checking the scores/depths are valid for
+        tictactoe.  Returns (bitsliced, scores, depths) - scores is a list per role. '''
+    role_count = len(sm.get_roles())
+    initial_state = sm.get_initial_state()
+
+    batch = interface.BatchRollouts(sm, bitsliced=bitsliced)
+    scores, depths = batch.run(initial_state, count)
+    flat_scores = [int(s) for s in interface.ffi.unpack(interface.int_ptr(scores),
+                                                         count * role_count)]
+    flat_depths = [int(d) for d in interface.ffi.unpack(interface.int_ptr(depths), count)]
+
+    for ii in range(count):
+        assert sum(flat_scores[ii * role_count:(ii + 1) * role_count]) == 100
+        assert 5 <= flat_depths[ii] <= 9
+
+    _, rollouts, num_state_changes = batch.get_result()
+    assert rollouts == count
+    assert num_state_changes == sum(flat_depths)
+
+    res = batch.bitsliced, [flat_scores[ri::role_count] for ri in range(role_count)], flat_depths
+    interface.dealloc_batch_rollouts(batch)
+    interface.dealloc_basestate(initial_state)
+    return res
+
+
+def test_depth_charge_batch_bitsliced():
+    import json
+
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str, no_goalless=True, try_combined=False)
+
+    # not a multiple of the 64 lanes
+    bitsliced, _, _ = tictactoe_rollouts(sm, 150, True)
+    assert bitsliced
+
+    # goalless statemachines do the rollouts on the goalless network, and goals on the goal network
+    _, goalless_sm = builder.build_sm(gdl_str, try_combined=False)
+    bitsliced, _, _ = tictactoe_rollouts(goalless_sm, 150, True)
+    assert bitsliced
+    interface.dealloc_statemachine(goalless_sm)
+
+    # combined statemachines fall back to one rollout at a time
+    propnet = getpropnet.get_with_game("ticTacToe")
+    desc = builder.build_combined_state_machine(propnet)
+    assert desc is not None
+    combined_sm = interface.create_combined_statemachine(json.dumps(desc), propnet.roles)
+
+    count = 2000
+    bitsliced, scores, _ = tictactoe_rollouts(combined_sm, count, True)
+    assert not bitsliced
+    interface.dealloc_statemachine(combined_sm)
+
+    # and play the same game as the scalar path on the standard statemachine (random play, so
+    # compare the mean score of each role)
+    _, scalar_scores, _ = tictactoe_rollouts(sm, count, False)
+    for role_scores, role_scalar_scores in zip(scores, scalar_scores):
+        assert abs(sum(role_scores) - sum(role_scalar_scores)) / float(count) < 10
+
+    interface.dealloc_statemachine(sm)
+
+
+def test_profiling():
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str, no_goalless=True, try_combined=False)
+
+    assert sm.get_profile() is None
+    assert sm.set_profiling(True)
+
+    profile = sm.get_profile()
+    assert profile.cascade_count == 0 and profile.total_visits == 0
+
+    msecs_taken, rollouts, num_state_changes = interface.depth_charge(sm, 1)
+    profile = sm.get_profile()
+
+    # update_bases() + next_state() per move, plus 2 per reset()
+    assert profile.cascade_count >= 2 * num_state_changes
+    assert profile.total_visits == sum(profile.visits)
+    assert sum(profile.depths) == profile.total_visits
+    assert sum(profile.cascades) == profile.cascade_count
+    assert all(a <= v for v, a in zip(profile.visits, profile.activations))
+
+    hot = profile.hottest(5)
+    assert len(hot) == 5
+    assert hot[0][0] >= hot[-1][0]
+    component_type, gdl = sm.get_component_info(hot[0][2])
+    assert component_type
+
+    # profiled statemachine still plays the game
+    create_and_play(sm)
+
+    # turning it on again clears the counters, and dupes are not profiled
+    assert sm.set_profiling(True)
+    assert sm.get_profile().total_visits == 0
+    dupe = sm.dupe()
+    assert dupe.get_profile() is None
+    interface.dealloc_statemachine(dupe)
+
+    sm.set_profiling(False)
+    assert sm.get_profile() is None
+
+    # only standard propnet statemachines are supported
+    _, goalless_sm = builder.build_sm(gdl_str, try_combined=False)
+    assert not goalless_sm.set_profiling(True)
+    interface.dealloc_statemachine(goalless_sm)
+
+    interface.dealloc_statemachine(sm)
+
+
+def test_zobrist_hashing():
+    import random
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str, no_goalless=True, try_combined=False)
+    _, goalless_sm = builder.build_sm(gdl_str, try_combined=False)
+    _, combined_sm = builder.build_sm(gdl_str)
+
+    for s in (sm, goalless_sm, combined_sm):
+        assert s.get_current_hash() == 0
+        assert s.set_zobrist_hashing(True)
+        s.reset()
+
+    base_state = sm.new_base_state()
+    joint_move = sm.get_joint_move()
+    role_count = len(sm.get_roles())
+
+    initial_hash = sm.get_current_hash()
+    assert initial_hash == sm.zobrist_hash(sm.get_initial_state())
+
+    # hashes are the same across statemachines built from the same game
+    for _ in range(10):
+        for s in (sm, goalless_sm, combined_sm):
+            s.reset()
+            assert s.get_current_hash() == initial_hash
+
+        while not sm.is_terminal():
+            for ri in range(role_count):
+                ls = sm.get_legal_state(ri)
+                joint_move.set(ri, ls.get_legal(random.randrange(ls.get_count())))
+
+            sm.next_state(joint_move, base_state)
+            next_hash = sm.get_next_hash()
+            assert next_hash == sm.zobrist_hash(base_state)
+
+            for s in (sm, goalless_sm, combined_sm):
+                s.update_bases(base_state)
+                assert s.get_current_hash() == next_hash
+
+    # carried over to dupes (which are reset)
+    dupe = sm.dupe()
+    assert dupe.get_current_hash() == initial_hash
+    interface.dealloc_statemachine(dupe)
+
+    assert sm.set_zobrist_hashing(False)
+    assert sm.get_current_hash() == 0
+
+    interface.dealloc_basestate(base_state)
+    for s in (sm, goalless_sm, combined_sm):
+        interface.dealloc_statemachine(s)
+
+
+def test_basestate_buffer():
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str)
+
+    bs = sm.get_initial_state()
+    values = bs.to_list()
+    assert values == [int(v) for v in bs.unpack()]
+    assert len(values) == bs.len()
+
+    # flip everything via pack, and check via get()
+    flipped = [0 if v else 1 for v in values]
+    bs.from_list(flipped)
+    assert [bs.get(ii) for ii in range(bs.len())] == flipped
+
+    # round trip the raw string format
+    other = sm.new_base_state()
+    other.from_string(bs.to_string())
+    assert other.equals(bs)
+
+    # writing through the memoryview writes through to c++
+    view = bs.as_memoryview()
+    view[0:1] = b"\x00"
+    for ii in range(min(8, bs.len())):
+        assert bs.get(ii) == 0
+
+    interface.dealloc_basestate(bs)
+    interface.dealloc_basestate(other)
+    interface.dealloc_statemachine(sm)
+
+
+def test_basestate_words():
+    ' bases span several (padded) 64 bit words '
+    gdl_str = helper.get_gdl_for_game("connectFour")
+    _, sm = builder.build_sm(gdl_str)
+
+    bs = sm.get_initial_state()
+    assert bs.len() > 64
+    assert bs.num_bytes == (bs.len() + 7) // 8
+
+    other = sm.new_base_state()
+    other.assign(bs)
+    assert other.equals(bs) and other.hash_code() == bs.hash_code()
+
+    # a difference in the first and last word
+    for index in (0, bs.len() - 1):
+        other.set(index, not bs.get(index))
+        assert not other.equals(bs)
+        assert other.hash_code() != bs.hash_code()
+        other.set(index, bs.get(index))
+        assert other.equals(bs) and other.hash_code() == bs.hash_code()
+
+    # update_bases() sees changes in every word, playing the same as via next_state()
+    sm.reset()
+    joint_move = sm.get_joint_move()
+    for _ in range(5):
+        for ri in range(len(sm.get_roles())):
+            joint_move.set(ri, sm.get_legal_state(ri).get_legal(0))
+        sm.next_state(joint_move, other)
+        sm.update_bases(other)
+        assert sm.get_current_state().equals(other)
+
+    sm.update_bases(bs)
+    assert sm.get_current_state().equals(bs)
+
+    interface.dealloc_basestate(bs)
+    interface.dealloc_basestate(other)
+    interface.dealloc_statemachine(sm)
+
+
+def test_bulk_legals():
+    gdl_str = helper.get_gdl_for_game("connectFour")
+    _, sm = builder.build_sm(gdl_str)
+    sm.reset()
+
+    role_count = len(sm.get_roles())
+    offsets, indices = sm.get_all_legals()
+    assert int(offsets[0]) == 0
+
+    for ri in range(role_count):
+        ls = sm.get_legal_state(ri)
+        expect = [ls.get_legal(ii) for ii in range(ls.get_count())]
+        assert ls.to_list() == expect
+
+        start, end = int(offsets[ri]), int(offsets[ri + 1])
+        assert [int(x) for x in indices[start:end]] == expect
+
+        buf = interface.new_int_buffer(ls.get_count())
+        assert ls.copy_legals(buf) == len(expect)
+        assert [int(x) for x in buf] == expect
+
+    # too small a buffer, is grown internally
+    sm._legals_capacity = 1
+    _, indices2 = sm.get_all_legals()
+    assert list(indices2[:int(offsets[role_count])]) == list(indices[:int(offsets[role_count])])
+
+    interface.dealloc_statemachine(sm)
+
+
+def test_binary_store(tmpdir):
+    from ggplib.db.store import DirectoryStore
+
+    for game in ("ticTacToe", "connectFour"):
+        gdl_str = helper.get_gdl_for_game(game)
+        store = DirectoryStore(str(tmpdir.mkdir(game)))
+
+        _, sm = builder.build_sm(gdl_str, the_game_store=store, add_to_game_store=True)
+        assert store.listdir("*.bin")
+
+        # second time around, is loaded from the binary
+        _, sm2 = builder.build_sm(gdl_str, the_game_store=store)
+
+        for s in (sm, sm2):
+            s.reset()
+
+        assert sm.get_initial_state() == sm2.get_initial_state()
+        for ri in range(len(sm.get_roles())):
+            assert sm.get_legal_state(ri).to_list() == sm2.get_legal_state(ri).to_list()
+
+        msecs_taken, rollouts, _ = interface.depth_charge(sm2, 1)
+        assert rollouts > 0
+
+        interface.dealloc_statemachine(sm)
+        interface.dealloc_statemachine(sm2)
+
+
+def test_lazy():
+    import random
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str, no_goalless=True, try_combined=False)
+
+    lazy_sm = interface.CppStateMachines().get_lazy(sm)
+    assert lazy_sm is not None
+
+    role_count = len(sm.get_roles())
+    joint_move = sm.get_joint_move()
+    base_state = sm.new_base_state()
+    lazy_base_state = lazy_sm.new_base_state()
+
+    def legals(s, ri):
+        # the order of a legal state depends on its history, so compare sorted
+        ls = s.get_legal_state(ri)
+        return sorted(ls.get_legal(ii) for ii in range(ls.get_count()))
+
+    for _ in range(10):
+        sm.reset()
+        lazy_sm.reset()
+
+        while True:
+            assert sm.is_terminal() == lazy_sm.is_terminal()
+            if sm.is_terminal():
+                break
+
+            for ri in range(role_count):
+                choices = legals(sm, ri)
+                assert choices == legals(lazy_sm, ri)
+                joint_move.set(ri, random.choice(choices))
+
+            sm.next_state(joint_move, base_state)
+            lazy_sm.next_state(joint_move, lazy_base_state)
+            assert base_state.to_string() == lazy_base_state.to_string()
+
+            sm.update_bases(base_state)
+            lazy_sm.update_bases(base_state)
+
+        for ri in range(role_count):
+            assert sm.get_goal_value(ri) == lazy_sm.get_goal_value(ri)
+
+    # dupes are reset
+    sm.reset()
+    dupe = lazy_sm.dupe()
+    assert not dupe.is_terminal()
+    for ri in range(role_count):
+        assert legals(dupe, ri) == legals(sm, ri)
+
+    interface.dealloc_statemachine(dupe)
+    interface.dealloc_statemachine(lazy_sm)
+
+
+def test_lazy_speed():
+    ' lazy vs eager propagation, on the same propnet statemachine '
+    for game in ("ticTacToe", "connectFour", "breakthrough"):
+        gdl_str = helper.get_gdl_for_game(game)
+        _, sm = builder.build_sm(gdl_str, no_goalless=True, try_combined=False)
+
+        lazy_sm = interface.CppStateMachines().get_lazy(sm)
+        assert lazy_sm is not None
+
+        per_second = []
+        for s in (sm, lazy_sm):
+            msecs_taken, rollouts, num_state_changes = interface.depth_charge(s, 2)
+            assert rollouts > 0
+            per_second.append(rollouts / (msecs_taken / 1000.0))
+            log.info("%s %s rollouts per second %.2f, average depth %.1f" %
+                     (game, "lazy" if s is lazy_sm else "eager", per_second[-1],
+                      num_state_changes / float(rollouts)))
+
+        log.info("%s lazy/eager %.2f" % (game, per_second[1] / per_second[0]))
+
+        interface.dealloc_statemachine(lazy_sm)
+        interface.dealloc_statemachine(sm)
+
+
+def test_goal_values():
+    import random
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str, no_goalless=True, try_combined=False)
+    _, goalless_sm = builder.build_sm(gdl_str, try_combined=False)
+
+    assert not sm.set_goal_cache(64)
+    assert goalless_sm.set_goal_cache(64)
+
+    role_count = len(sm.get_roles())
+    joint_move = sm.get_joint_move()
+    base_state = sm.new_base_state()
+    values = sm.get_goal_values()
+
+    for _ in range(50):
+        sm.reset()
+        while not sm.is_terminal():
+            for ri in range(role_count):
+                ls = sm.get_legal_state(ri)
+                joint_move.set(ri, ls.get_legal(random.randrange(ls.get_count())))
+
+            sm.next_state(joint_move, base_state)
+            sm.update_bases(base_state)
+
+        expect = [sm.get_goal_value(ri) for ri in range(role_count)]
+        assert list(sm.get_goal_values(values)) == expect
+
+        # twice, the second time from the cache
+        goalless_sm.update_bases(base_state)
+        assert list(goalless_sm.get_goal_values()) == expect
+        assert list(goalless_sm.get_goal_values()) == expect
+
+    # dupes get their own cache
+    dupe = goalless_sm.dupe()
+    dupe.update_bases(base_state)
+    assert list(dupe.get_goal_values()) == expect
+    interface.dealloc_statemachine(dupe)
+
+    assert goalless_sm.set_goal_cache(0)
+    assert list(goalless_sm.get_goal_values()) == expect
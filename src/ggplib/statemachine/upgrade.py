@@ -0,0 +1,31 @@
+'''
+The process started by builder.StateMachineUpgrade.  Reads the gdl from stdin, and builds the
+upgrade into the given store (see builder.build_upgrade()).  Exits with 0 on success.
+
+$ python -m ggplib.statemachine.upgrade <store path> <try combined> <num workers> <build timeout> <check seconds>
+'''
+
+import sys
+
+from ggplib.util.init import setup_once
+from ggplib.db.store import DirectoryStore
+from ggplib.statemachine import builder
+
+
+def main():
+    path, try_combined, num_workers, build_timeout, check_seconds = sys.argv[1:]
+    gdl_str = sys.stdin.read()
+
+    setup_once("upgrade")
+    preferred = builder.build_upgrade(gdl_str, DirectoryStore(path),
+                                      try_combined=bool(int(try_combined)),
+                                      num_workers=int(num_workers),
+                                      build_timeout=float(build_timeout),
+                                      check_seconds=float(check_seconds))
+    sys.exit(0 if preferred is not None else 1)
+
+
+###############################################################################
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,10 @@ package propnet_convert;
 
 import java.io.File;
 import java.io.IOException;
+import java.io.PrintStream;
 import java.io.PrintWriter;
-import java.io.FileNotFoundException;
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
 
 import java.util.Map;
 
@@ -16,56 +18,117 @@ import org.ggp.base.util.statemachine.Role;
 public final class Convert {
 
     public static void main(String[] args) {
+        if (args.length == 1 && args[0].equals("--server")) {
+            serve();
+            return;
+        }
+
         String in_filename = args[0];
         String out_filename = args[1];
-        PropnetConvert propnet_convert = new PropnetConvert();
-
-        System.out.println("Building statemachine for " + in_filename);
 
         try {
-            String infile_contents = new String(Files.readAllBytes(Paths.get(in_filename)));
-            Game game = Game.createEphemeralGame(Game.preprocessRulesheet(infile_contents));
-            propnet_convert.translate(game);
+            convert(in_filename, out_filename);
         } catch (IOException e) {
             System.out.println("Failed to translate to propnet: ");
             e.printStackTrace();
             throw new RuntimeException();
         }
+    }
 
-        // write to file
+    // Stays running (so the jvm is warm), converting one rulesheet per line of stdin:
+    //
+    //     <in_filename>\t<out_filename>
+    //
+    // And replying in the same order, one line per request, on stdout:
+    //
+    //     OK <out_filename>
+    //     ERROR <message>
+    //
+    // Requests may be sent before the replies to earlier ones are read (see
+    // ggplib.propnet.convert).  Everything else that would go to stdout goes to stderr.
+    public static void serve() {
+        PrintStream replies = System.out;
+        System.setOut(System.err);
+
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in));
         try {
-            File out_file = new File(out_filename);
-            PrintWriter writer = new PrintWriter(out_file);
-            writer.println("# dumping propnet for " + in_filename);
-            writer.println("# number of roles " + propnet_convert.role_count);
-            writer.println("");
-            writer.println("from ggplib.propnet.constants import *");
-            writer.println("");
-
-            writer.println("roles = [");
-            for (Role role : propnet_convert.roles) {
-                writer.println("    '" + role + "',");
+            String line;
+            while ((line = requests.readLine()) != null) {
+                String[] filenames = line.split("\t");
+                if (filenames.length != 2) {
+                    replies.println("ERROR bad request: " + line);
+                    replies.flush();
+                    continue;
+                }
+
+                try {
+                    convert(filenames[0], filenames[1]);
+                    replies.println("OK " + filenames[1]);
+
+                } catch (Exception e) {
+                    e.printStackTrace();
+                    replies.println("ERROR " + e.toString().replace('\n', ' '));
+
+                } catch (OutOfMemoryError e) {
+                    // nothing good will come of carrying on
+                    replies.println("ERROR " + e.toString());
+                    replies.flush();
+                    return;
+                }
+
+                replies.flush();
             }
 
-            writer.println("]");
-            writer.println("");
+        } catch (IOException e) {
+            e.printStackTrace();
+        }
+    }
+
+    public static void convert(String in_filename, String out_filename) throws IOException {
+        PropnetConvert propnet_convert = new PropnetConvert();
 
-            writer.println("entries = (");
+        System.out.println("Building statemachine for " + in_filename);
 
-            for (Map.Entry <Integer, MetaComponent> entry : propnet_convert.metas_map.entrySet()) {
-                writer.println("    " + entry.getValue().toPython() + ",");
-            }
+        String infile_contents = new String(Files.readAllBytes(Paths.get(in_filename)));
+        Game game = Game.createEphemeralGame(Game.preprocessRulesheet(infile_contents));
+        propnet_convert.translate(game);
+
+        // write to a temporary file, and move it into place once complete (the module is imported
+        // as soon as it exists)
+        File out_file = new File(out_filename);
+        File tmp_file = new File(out_filename + ".tmp");
+        PrintWriter writer = new PrintWriter(tmp_file);
+        writer.println("# dumping propnet for " + in_filename);
+        writer.println("# number of roles " + propnet_convert.role_count);
+        writer.println("");
+        writer.println("from ggplib.propnet.constants import *");
+        writer.println("");
+
+        writer.println("roles = [");
+        for (Role role : propnet_convert.roles) {
+            writer.println("    '" + role + "',");
+        }
 
-            writer.println(")");
-            writer.println("");
-            writer.println("# DONE");
+        writer.println("]");
+        writer.println("");
 
-            writer.close();
+        writer.println("entries = (");
 
-        } catch (FileNotFoundException e) {
-            System.out.println("FileNotFoundException: ");
-            e.printStackTrace();
-            throw new RuntimeException();
+        for (Map.Entry <Integer, MetaComponent> entry : propnet_convert.metas_map.entrySet()) {
+            writer.println("    " + entry.getValue().toPython() + ",");
+        }
+
+        writer.println(")");
+        writer.println("");
+        writer.println("# DONE");
+
+        writer.close();
+        if (writer.checkError()) {
+            throw new IOException("Failed writing " + tmp_file);
+        }
+
+        if (!tmp_file.renameTo(out_file)) {
+            throw new IOException("Failed to rename " + tmp_file + " to " + out_file);
         }
     }
 }